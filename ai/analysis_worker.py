@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Exoplanet Analysis Worker
+=========================
+
+Long-lived process that loads the catalog and model once and then answers
+newline-delimited JSON requests, either on stdin/stdout or on a local Unix
+socket.
+
+Request:   {"id": 1, "op": "analyze", "user_inputs": {...}, "selected_columns": [...]}
+Response:  {"id": 1, "result": {...}}
+
+Supported ops: analyze, columns, health, status, metrics, shutdown.
+
+A request with "timings": true (or every request, with EXOPLANET_TIMINGS=1)
+gets a per-stage timings block in its result. An analyze or columns request
+with "profile": true (or a sampled one, see profiling.py) writes a profile
+tagged with its "request_id". The metrics op returns the
+worker's counters and latency histograms in the Prometheus text format;
+--metrics-port serves the same on http://127.0.0.1:<port>/metrics and
+--metrics-file rewrites it into a file every few seconds.
+
+With --batch-wait-ms (or EXOPLANET_BATCH_WAIT_MS) analyze requests that
+arrive together on the socket are answered in micro-batches of up to
+--max-batch requests, one forest pass and one neighbour query per batch
+(see micro_batch.py).
+
+With --watch the worker also follows the training CSV and retrains on
+changes (in a separate process); the status op reports the retrain jobs.
+
+The socket listens with a backlog of SOMAXCONN (EXOPLANET_WORKER_BACKLOG)
+so bursts of one-connection-per-request clients queue instead of being
+refused; WorkerClient also retries a refused connection briefly before
+try_worker_request gives up and the caller runs the analysis in process.
+
+Usage:
+    python analysis_worker.py --stdio
+    python analysis_worker.py --socket /tmp/exoplanet_worker.sock --watch --metrics-port 9464
+    python analysis_worker.py --socket --batch-wait-ms 2 --max-batch 256
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import instrumentation
+from micro_batch import MicroBatcher, batch_wait_from_env, max_batch_from_env
+from profiling import profile
+
+DEFAULT_SOCKET_PATH = os.environ.get('EXOPLANET_WORKER_SOCKET', '/tmp/exoplanet_worker.sock')
+PROFILED_OPS = ('analyze', 'columns')
+# Pending connections the socket queues; socketserver's default of 5 refuses bursts of one-shot clients
+LISTEN_BACKLOG = int(os.environ.get('EXOPLANET_WORKER_BACKLOG', socket.SOMAXCONN))
+# Seconds a client keeps retrying a connection the worker refuses (queue full), and its first pause
+CONNECT_PATIENCE = 2.0
+CONNECT_BACKOFF = 0.005
+
+
+class AnalysisWorker:
+    def __init__(self, watch=False, batch_wait=None, max_batch=None):
+        self.watch = watch
+        # Seconds an analyze request may wait for others to batch with; None: no batching
+        self.batch_wait = batch_wait
+        self.max_batch = max_batch or max_batch_from_env()
+        self.batcher = None
+        self.started_at = time.time()
+        self.ready = False
+        self.stopping = threading.Event()
+        self._system = None
+
+    def start(self):
+        """Load data and model once; return an error message on failure"""
+        import new_exoplanet_system
+        self._system = new_exoplanet_system
+
+        error = new_exoplanet_system.prepare_system()
+        if error is None:
+            if self.batch_wait is not None:
+                self.start_batching()
+            self.ready = True
+            if self.watch:
+                new_exoplanet_system.start_watcher()
+        return error
+
+    def start_batching(self):
+        """Answer analyze requests through a MicroBatcher (its thread starts here)"""
+        self.batcher = MicroBatcher(self._system.analyze_exoplanet_batch, self.batch_wait, self.max_batch)
+
+    def warm_up(self):
+        """Serve one columns and one analyze request, so state built on first use exists"""
+        self._system.get_columns()
+        snapshot = self._system.data_handler.snapshot
+        row = snapshot.df.iloc[0]
+        user_inputs = {col: float(row[col]) * 1.01 for col in snapshot.feature_columns if row[col] == row[col]}
+        self._system.analyze_exoplanet(user_inputs, list(user_inputs))
+
+    def ready_message(self):
+        """Message announced once the worker can serve requests"""
+        return {
+            'type': 'ready',
+            'pid': os.getpid(),
+            'records': self._record_count()
+        }
+
+    def _handle(self, message):
+        """(response, the request's timings or None when not asked for)"""
+        request_id = message.get('id')
+        op = message.get('op', 'analyze')
+
+        if op in PROFILED_OPS:
+            profiling = profile(f'worker-{op}', request_id=message.get('request_id', request_id),
+                                requested=message.get('profile'))
+        else:
+            profiling = contextlib.nullcontext()
+        with profiling, instrumentation.request(op, enabled=message.get('timings') or None) as timings:
+            result = self._dispatch(op, message)
+        instrumentation.count_result(op, result)
+        return {'id': request_id, 'result': result}, timings
+
+    def _dispatch(self, op, message):
+        try:
+            if op == 'health':
+                result = {
+                    'status': 'ok' if self.ready else 'starting',
+                    'ready': self.ready,
+                    'pid': os.getpid(),
+                    'records': self._record_count(),
+                    'uptime': time.time() - self.started_at
+                }
+            elif op == 'status':
+                result = self._system.retrain_status() if self._system is not None else {'state': 'starting'}
+            elif op == 'metrics':
+                result = {'content_type': 'text/plain; version=0.0.4', 'text': self.render_metrics()}
+            elif op == 'shutdown':
+                self.stopping.set()
+                result = {'status': 'stopping'}
+            elif not self.ready:
+                result = {'type': 'error', 'error': 'Worker not ready'}
+            elif op == 'columns':
+                result = self._system.get_columns()
+            elif op == 'analyze':
+                user_inputs = message.get('user_inputs', {})
+                selected_columns = message.get('selected_columns', [])
+                if not user_inputs or not selected_columns:
+                    result = {
+                        'error': 'Missing user_inputs or selected_columns',
+                        'type': 'error'
+                    }
+                elif self.batcher is not None:
+                    result = self.batcher.submit((user_inputs, selected_columns))
+                else:
+                    result = self._system.analyze_exoplanet(user_inputs, selected_columns)
+            else:
+                result = {'type': 'error', 'error': f'Unknown op: {op}'}
+        except Exception as e:
+            result = {'type': 'error', 'error': f'Request failed: {str(e)}'}
+
+        return result
+
+    def render_metrics(self):
+        """Prometheus text of the worker's metrics, with its gauges brought up to date"""
+        metrics = instrumentation.metrics
+        metrics.set('exoplanet_worker_ready', int(self.ready), 'Whether the worker serves analysis requests')
+        metrics.set('exoplanet_worker_uptime_seconds', time.time() - self.started_at, 'Seconds since start')
+        metrics.set('exoplanet_catalog_records', self._record_count(), 'Rows in the served catalog')
+        if self.batcher is not None:
+            self.batcher.record_depth()
+        return instrumentation.render_metrics()
+
+    def handle_line(self, line):
+        """Decode one request line and return the encoded response line"""
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError('request must be a JSON object')
+        except ValueError as e:
+            response = {'id': None, 'result': {'type': 'error', 'error': f'Invalid request: {e}'}}
+            return encode_json(response) + '\n'
+
+        response, timings = self._handle(message)
+        if timings is None:
+            return encode_json(response) + '\n'
+        # The result is encoded separately so its serialization shows up in the timings
+        result = instrumentation.encode_timed(response['result'], timings, encode_json)
+        return f'{{"id": {json.dumps(response["id"])}, "result": {result}}}\n'
+
+    def _record_count(self):
+        snapshot = None if self._system is None else self._system.data_handler.snapshot
+        return 0 if snapshot is None else int(snapshot.n_rows)
+
+
+def _json_default(value):
+    """Serialize numpy scalars that leak out of pandas records"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def encode_json(payload):
+    """Encode a response, tolerating numpy values in analysis results"""
+    return json.dumps(payload, default=_json_default)
+
+
+def serve_stdio(worker):
+    """Serve requests from stdin, one JSON object per line"""
+    # Keep stdout clean for the protocol; diagnostics go to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    error = worker.start()
+    if error:
+        protocol_out.write(json.dumps({'type': 'error', 'error': error}) + '\n')
+        protocol_out.flush()
+        return 1
+
+    protocol_out.write(encode_json(worker.ready_message()) + '\n')
+    protocol_out.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        protocol_out.write(worker.handle_line(line))
+        protocol_out.flush()
+        if worker.stopping.is_set():
+            break
+
+    return 0
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        worker = self.server.worker
+        for raw in self.rfile:
+            line = raw.decode('utf-8')
+            if not line.strip():
+                continue
+            self.wfile.write(worker.handle_line(line).encode('utf-8'))
+            self.wfile.flush()
+            if worker.stopping.is_set():
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                break
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+def serve_socket(worker, socket_path):
+    """Serve requests on a Unix socket until shutdown"""
+    # As with stdio, stdout carries only the ready (or error) line; diagnostics go to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    error = worker.start()
+    if error:
+        protocol_out.write(json.dumps({'type': 'error', 'error': error}) + '\n')
+        protocol_out.flush()
+        return 1
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    server = _UnixServer(socket_path, _RequestHandler)
+    server.worker = worker
+
+    def _stop(signum, frame):
+        worker.stopping.set()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    ready = worker.ready_message()
+    ready['socket'] = socket_path
+    protocol_out.write(encode_json(ready) + '\n')
+    protocol_out.flush()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("Analysis worker stopped")
+
+    return 0
+
+
+class WorkerClient:
+    """Minimal client for a worker listening on a Unix socket"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def available(self):
+        return os.path.exists(self.socket_path)
+
+    def connect(self):
+        """Connected socket; a full listen queue is retried with backoff for CONNECT_PATIENCE seconds"""
+        deadline = time.monotonic() + CONNECT_PATIENCE
+        pause = CONNECT_BACKOFF
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except (BlockingIOError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() + pause > deadline:
+                    raise
+                time.sleep(pause)
+                pause = min(pause * 2, 0.1)
+            except BaseException:
+                sock.close()
+                raise
+
+    def request(self, op, **payload):
+        """Send one request and return the worker's result"""
+        message = dict(payload, op=op, id=os.getpid())
+        with self.connect() as sock:
+            sock.sendall((json.dumps(message) + '\n').encode('utf-8'))
+            with sock.makefile('r', encoding='utf-8') as reader:
+                line = reader.readline()
+        if not line:
+            raise ConnectionError('Worker closed the connection without a response')
+        return json.loads(line)['result']
+
+
+def try_worker_request(op, **payload):
+    """Forward a request to a running worker, or return None if none is reachable"""
+    client = WorkerClient()
+    if not client.available():
+        return None
+    try:
+        return client.request(op, **payload)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Analysis worker at {client.socket_path} unreachable ({e!r}); running in process", file=sys.stderr)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-lived exoplanet analysis worker')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--stdio', action='store_true', help='serve requests on stdin/stdout (default)')
+    mode.add_argument('--socket', nargs='?', const=DEFAULT_SOCKET_PATH, help='serve requests on a Unix socket')
+    parser.add_argument('--watch', action='store_true', help='retrain when the training CSV changes')
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this local HTTP port')
+    parser.add_argument('--metrics-file', default=os.environ.get(instrumentation.METRICS_FILE_ENV),
+                        help='rewrite Prometheus metrics into this file periodically')
+    parser.add_argument('--batch-wait-ms', type=float,
+                        default=None if batch_wait_from_env() is None else batch_wait_from_env() * 1000,
+                        help='micro-batch analyze requests arriving within this many ms (0: only those queued)')
+    parser.add_argument('--max-batch', type=int, default=max_batch_from_env(), help='requests per micro-batch')
+    args = parser.parse_args()
+
+    batch_wait = None if args.batch_wait_ms is None else args.batch_wait_ms / 1000
+    worker = AnalysisWorker(watch=args.watch, batch_wait=batch_wait, max_batch=args.max_batch)
+    if args.metrics_port:
+        instrumentation.start_metrics_server(args.metrics_port, render=worker.render_metrics)
+    if args.metrics_file:
+        instrumentation.start_metrics_writer(args.metrics_file, render=worker.render_metrics)
+    if args.socket:
+        return serve_socket(worker, args.socket)
+    return serve_stdio(worker)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
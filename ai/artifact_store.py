@@ -0,0 +1,168 @@
+"""
+Fingerprinting of training data and location of the model artifacts
+trained from it.
+
+Artifacts live in one directory per fingerprint, so a process can tell
+from the data alone whether a previously trained model is still valid.
+Each save is written to a temporary directory, renamed to a new version
+directory inside it, and then named by a CURRENT file that is replaced
+atomically, so a reader never opens a half-written set of artifacts.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+MODELS_DIR = 'models'
+DEFAULT_CSV_PATH = 'training_data.csv'
+CURRENT_POINTER = 'CURRENT'
+KEEP_VERSIONS = 2
+
+# Unfinished version directories (writer crashed or was cancelled) older
+# than this are removed when versions are pruned
+STALE_TMP_SECONDS = 3600
+
+# (path, size, mtime_ns) -> digest, so one process hashes each file version once
+_digest_memo = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    stamp = source_stamp(path)
+    key = (stamp['path'], stamp['size'], stamp['mtime_ns'])
+    if key in _digest_memo:
+        return _digest_memo[key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    _digest_memo[key] = digest.hexdigest()
+    return _digest_memo[key]
+
+
+def source_stamp(path):
+    """Cheap identity of a file version: absolute path, size and mtime"""
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+def stamp_matches(recorded, path):
+    """Whether a recorded stamp (with digest) still describes the file at path.
+
+    Unchanged size and mtime are trusted without rehashing; otherwise the
+    content digest decides, so a touched but identical file still matches.
+    """
+    current = source_stamp(path)
+    if recorded.get('path') != current['path']:
+        return False
+    if recorded.get('size') == current['size'] and recorded.get('mtime_ns') == current['mtime_ns']:
+        return True
+    return recorded.get('digest') == file_digest(path)
+
+
+def digest_stamp(path):
+    """source_stamp plus the content digest, for recording next to derived files"""
+    stamp = source_stamp(path)
+    stamp['digest'] = file_digest(path)
+    return stamp
+
+
+def data_fingerprint(content_digest, feature_columns, target_column, feature_dtype=None, forest_params=None,
+                     backend=None, imputation=None, sampling=None):
+    """Fingerprint of the training data content plus its inferred schema"""
+    schema = {
+        'content': content_digest,
+        'feature_columns': list(feature_columns),
+        'target_column': target_column
+    }
+    if feature_dtype is not None:
+        # Models trained on narrowed features are kept apart from the default ones
+        schema['feature_dtype'] = feature_dtype
+    if forest_params is not None:
+        # So are models trained with parameters selected by a search
+        schema['forest_params'] = forest_params
+    if backend is not None:
+        # And models of a non-default estimator backend
+        schema['backend'] = backend
+    if imputation is not None:
+        # And models trained on features imputed with estimated medians
+        schema['imputation'] = imputation
+    if sampling is not None:
+        # And models trained out of core, on samples of the rows
+        schema['sampling'] = sampling
+    payload = json.dumps(schema, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def artifact_dir(fingerprint, root=MODELS_DIR):
+    """Directory holding the artifacts trained for a fingerprint"""
+    return os.path.join(root, fingerprint)
+
+
+def new_version_dir(fingerprint, root=MODELS_DIR):
+    """Fresh directory name for the next save under a fingerprint"""
+    version = f'v{time.time_ns():020d}-{os.getpid()}'
+    return os.path.join(artifact_dir(fingerprint, root), version)
+
+
+def publish_version(version_dir):
+    """Atomically make version_dir the fingerprint's current version"""
+    parent = os.path.dirname(version_dir)
+    tmp_path = os.path.join(parent, f'{CURRENT_POINTER}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(os.path.basename(version_dir) + '\n')
+    os.replace(tmp_path, os.path.join(parent, CURRENT_POINTER))
+
+
+def current_version_dir(fingerprint, root=MODELS_DIR):
+    """Directory of the current version, or the fingerprint directory itself
+    for artifacts saved before versioning"""
+    directory = artifact_dir(fingerprint, root)
+    try:
+        with open(os.path.join(directory, CURRENT_POINTER), 'r') as f:
+            return os.path.join(directory, f.read().strip())
+    except OSError:
+        return directory
+
+
+def prune_versions(fingerprint, keep=KEEP_VERSIONS, root=MODELS_DIR):
+    """Remove all but the newest keep versions; the current one always stays.
+
+    Processes that already mapped files of a removed version keep working;
+    unlinked files stay readable until unmapped. Abandoned temporary
+    version directories are removed once they are STALE_TMP_SECONDS old.
+    """
+    directory = artifact_dir(fingerprint, root)
+    current = os.path.basename(current_version_dir(fingerprint, root))
+    names = [
+        name for name in os.listdir(directory)
+        if name.startswith('v') and os.path.isdir(os.path.join(directory, name))
+    ]
+
+    versions = sorted(name for name in names if not name.endswith('.tmp'))
+    for name in versions[:-keep] if keep else versions:
+        if name != current:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    now = time.time()
+    for name in names:
+        path = os.path.join(directory, name)
+        if name.endswith('.tmp') and now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def read_metadata(directory):
+    """Load metadata.json from an artifact directory, or None if absent"""
+    path = os.path.join(directory, 'metadata.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
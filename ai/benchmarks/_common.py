@@ -0,0 +1,79 @@
+"""
+Shared helpers for the ai/ benchmark scripts.
+
+Importing this module puts the ai/ directory on sys.path so benchmarks can
+import the analysis modules when run as `python benchmarks/<script>.py`.
+"""
+
+import os
+import sys
+import time
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AI_DIR not in sys.path:
+    sys.path.insert(0, AI_DIR)
+
+
+def time_calls(fn, repeat):
+    """Run fn repeat times and return the wall time of each call in seconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    """Median / p95 / mean of a list of timings"""
+    ordered = sorted(samples)
+    return {
+        'median': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'mean': sum(ordered) / len(ordered)
+    }
+
+
+def process_memory_kb(pid='self'):
+    """Resident, peak resident, anonymous (private heap) and file-backed memory of a process, in kB"""
+    fields = {'VmRSS': 'rss_kb', 'VmHWM': 'peak_kb', 'RssAnon': 'anon_kb', 'RssFile': 'file_kb'}
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                key = line.split(':', 1)[0]
+                if key in fields:
+                    memory[fields[key]] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+def parse_sizes(text):
+    """Parse '1k,10k,1M' style catalog sizes"""
+    multipliers = {'k': 1000, 'm': 1000000}
+    sizes = []
+    for item in text.split(','):
+        item = item.strip().lower()
+        if item[-1] in multipliers:
+            sizes.append(int(float(item[:-1]) * multipliers[item[-1]]))
+        else:
+            sizes.append(int(item))
+    return sizes
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as an aligned text table"""
+    widths = {
+        col: max(len(col), *(len(_format(row.get(col))) for row in rows))
+        for col in columns
+    }
+    print('  '.join(col.rjust(widths[col]) for col in columns))
+    for row in rows:
+        print('  '.join(_format(row.get(col)).rjust(widths[col]) for col in columns))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f'{value:.4g}'
+    return '' if value is None else str(value)
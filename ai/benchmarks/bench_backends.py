@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Estimator backend shootout
+==========================
+
+Trains every estimator backend (see estimator_backends.py) on the same
+stratified 80/20 split of the KOI cumulative catalog and tabulates fit
+time, held-out accuracy, single-row and batch predict latency through
+the backend's serving engine, artifact size on disk and load time
+(joblib load plus engine construction).
+
+Falls back to a synthetic catalog with the same seven features when the
+KOI CSV is missing.
+
+Usage:
+    python benchmarks/bench_backends.py [--csv cumulative_2025.10.04_03.33.35.csv] [--backends random_forest,hist_gradient_boosting]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import _common
+import joblib
+import numpy as np
+
+from bench_forest_engine import DEFAULT_CSV, load_training_data
+from estimator_backends import BACKENDS, tree_count
+
+
+def measure_backend(backend, X_train, y_train, X_test, y_test, batch_rows, repeat, workdir):
+    """Train one backend and measure it; returns a result row"""
+    model = backend.build(random_state=42, class_weight='balanced')
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    engine = backend.engine(model)
+    accuracy = float(np.mean(engine.predict(X_test) == y_test))
+
+    row = X_test[:1]
+    batch = X_test[np.arange(batch_rows) % len(X_test)]
+    engine.predict_with_proba(row)
+    single = _common.summarize(_common.time_calls(lambda: engine.predict_with_proba(row), repeat))
+    batch_seconds = min(_common.time_calls(lambda: engine.predict_with_proba(batch), 3))
+
+    path = os.path.join(workdir, f'{backend.name}.pkl')
+    joblib.dump(model, path)
+    load_seconds = min(_common.time_calls(lambda: backend.engine(joblib.load(path)), 3))
+
+    return {
+        'backend': backend.name,
+        'trees': tree_count(model) or getattr(model, 'n_iter_', None),
+        'fit_s': fit_seconds,
+        'accuracy': accuracy,
+        'row_p50_ms': single['median'] * 1000,
+        'row_p95_ms': single['p95'] * 1000,
+        'batch_us_per_row': batch_seconds / batch_rows * 1e6,
+        'artifact_kb': os.path.getsize(path) / 1024,
+        'load_ms': load_seconds * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare estimator backends on latency, size and accuracy')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='KOI cumulative CSV (synthetic data if missing)')
+    parser.add_argument('--rows', type=int, default=10000, help='synthetic rows when no CSV is available')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='comma-separated backend names')
+    parser.add_argument('--batch-rows', type=int, default=4096)
+    parser.add_argument('--repeat', type=int, default=200, help='single-row predict calls per backend')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    X, y, source = load_training_data(args.csv, args.rows)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    scaler = StandardScaler().fit(X_train)
+    X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+    print(f"Data: {source} ({len(X_train)} training rows, {len(X_test)} held out)")
+
+    names = [name.strip() for name in args.backends.split(',') if name.strip()]
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        print(f"Unknown backends: {unknown} (available: {', '.join(BACKENDS)})", file=sys.stderr)
+        return 2
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            results.append(measure_backend(BACKENDS[name], X_train, y_train, X_test, y_test,
+                                           args.batch_rows, args.repeat, workdir))
+
+    _common.print_table(results, ['backend', 'trees', 'fit_s', 'accuracy', 'row_p50_ms', 'row_p95_ms',
+                                  'batch_us_per_row', 'artifact_kb', 'load_ms'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'data': source, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
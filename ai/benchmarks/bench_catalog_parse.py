@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Catalog parse benchmark
+=======================
+
+Checks that catalog_cache.parse_csv (pyarrow's reader when installed)
+returns the same frame as pandas' default C engine, and compares their
+parse times.
+
+Runs on the KOI cumulative catalog when it is present and on a synthetic
+planetary-systems catalog of --rows rows with the export's date columns
+(rowupdate, releasedate: ISO dates and timestamps pyarrow would infer;
+pl_pubdate: year-month text), some of them missing. Exits non-zero if
+any frame differs.
+
+Usage:
+    python benchmarks/bench_catalog_parse.py [--csv cumulative_2025.10.04_03.33.35.csv] [--rows 100000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import _common
+import numpy as np
+
+from bench_forest_engine import DEFAULT_CSV
+from catalog_cache import _has_pyarrow, parse_csv
+
+
+def dated_catalog(rows, seed=42):
+    """Synthetic catalog with the planetary-systems export's date columns"""
+    import pandas as pd
+    from bench_dtype_plan import synthetic_catalog
+
+    rng = np.random.default_rng(seed)
+    df = synthetic_catalog(rows, seed)
+    days = pd.Timestamp('2014-05-14') + pd.to_timedelta(rng.integers(0, 4000, rows), unit='D')
+    df['rowupdate'] = days.strftime('%Y-%m-%d')
+    df['releasedate'] = (days + pd.to_timedelta(rng.integers(0, 86400, rows), unit='s')).strftime('%Y-%m-%d %H:%M')
+    df['pl_pubdate'] = days.strftime('%Y-%m')
+    for col in ('rowupdate', 'releasedate'):
+        df.loc[rng.random(rows) < 0.05, col] = np.nan
+    return df
+
+
+def check(csv_path, comment, repeat):
+    """Parse times of both engines and the first difference between their frames, if any"""
+    import pandas as pd
+
+    def c_engine():
+        return pd.read_csv(csv_path, comment=comment)
+
+    def pyarrow_engine():
+        return parse_csv(csv_path, comment=comment)
+
+    try:
+        pd.testing.assert_frame_equal(pyarrow_engine(), c_engine())
+        difference = None
+    except AssertionError as e:
+        difference = str(e).strip().splitlines()[0]
+
+    return {
+        'catalog': os.path.basename(csv_path),
+        'c_engine_ms': _common.summarize(_common.time_calls(c_engine, repeat))['median'] * 1000,
+        'parse_csv_ms': _common.summarize(_common.time_calls(pyarrow_engine, repeat))['median'] * 1000,
+        'equal': difference is None,
+        'difference': difference
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parity and speed of the pyarrow catalog parse')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='KOI cumulative CSV')
+    parser.add_argument('--rows', type=int, default=100000, help='rows of the synthetic dated catalog')
+    parser.add_argument('--repeat', type=int, default=3, help='timed parses per engine')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    if not _has_pyarrow():
+        print("pyarrow is not installed; parse_csv uses the C engine")
+        return 0
+
+    results = []
+    if os.path.exists(args.csv):
+        results.append(check(args.csv, '#', args.repeat))
+    with tempfile.TemporaryDirectory(prefix='bench_catalog_parse_') as workdir:
+        csv_path = os.path.join(workdir, 'training_data.csv')
+        dated_catalog(args.rows).to_csv(csv_path, index=False)
+        results.append(check(csv_path, None, args.repeat))
+
+    _common.print_table(results, ['catalog', 'c_engine_ms', 'parse_csv_ms', 'equal'])
+    for row in results:
+        if not row['equal']:
+            print(f"{row['catalog']}: {row['difference']}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'results': results}, f, indent=2)
+    return 0 if all(row['equal'] for row in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Lean dtype plan benchmark
+=========================
+
+Loads and trains the same catalog twice through ExoplanetDataHandler,
+once with the default float64/object dtypes and once with the lean plan
+(float32 features, downcast integers, categorical strings), each in a
+fresh process. Reports the memory held after every stage and the peak
+RSS, and checks accuracy parity: held-out accuracy, predicted classes,
+nearest neighbours and exact matches for sampled catalog rows.
+
+Uses a synthetic catalog shaped like the NASA planetary systems table
+unless --csv points at a real one. Exits non-zero when the lean path
+loses more than --max-accuracy-drop accuracy.
+
+Usage:
+    python benchmarks/bench_dtype_plan.py --rows 200000 [--csv training_data.csv]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import _common
+import numpy as np
+
+METHODS = ['Transit', 'Radial Velocity', 'Microlensing', 'Imaging', 'Transit Timing Variations']
+
+
+def synthetic_catalog(rows, seed=42):
+    """Planetary-systems-like frame: float measurements, flags and string labels"""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'pl_name': [f'Planet-{i} b' for i in range(rows)],
+        'hostname': [f'Star-{i // 3}' for i in range(rows)],
+        'disc_facility': rng.choice([f'Facility {i}' for i in range(25)], rows),
+        'pl_orbper': rng.exponential(100, rows),
+        'pl_rade': rng.lognormal(0, 1, rows),
+        'pl_bmasse': rng.lognormal(2, 1.5, rows),
+        'st_teff': rng.normal(5500, 1000, rows),
+        'st_rad': rng.lognormal(0, 0.5, rows),
+        'st_mass': rng.lognormal(0, 0.3, rows),
+        'sy_dist': rng.exponential(300, rows),
+        'pl_insol': rng.exponential(1000, rows),
+        'pl_eqt': rng.normal(900, 300, rows),
+        'st_met': rng.normal(0, 0.3, rows),
+        'ra': rng.uniform(0, 360, rows),
+        'dec': rng.uniform(-90, 90, rows),
+        'sy_snum': rng.integers(1, 4, rows),
+        'sy_pnum': rng.integers(1, 8, rows),
+        'default_flag': rng.integers(0, 2, rows)
+    })
+
+    # Discovery method depends on the measurements, with label noise
+    score = np.log(df['pl_orbper']) - np.log(df['pl_rade']) + rng.normal(0, 0.3, rows)
+    method = np.digitize(score, [1.0, 3.5, 5.0, 6.0])
+    df['discoverymethod'] = np.asarray(METHODS)[method]
+
+    # Sparse measurements, filled with medians at load time
+    for col in ('pl_bmasse', 'st_met', 'pl_eqt'):
+        df.loc[rng.random(rows) < 0.3, col] = np.nan
+    return df
+
+
+def probe(csv_path, queries_path, lean, workdir):
+    """Run in a child process: load, train and answer queries with one dtype mode"""
+    import new_exoplanet_system
+    from dtype_plan import MemoryReport
+
+    os.chdir(workdir)
+    handler = new_exoplanet_system.ExoplanetDataHandler(csv_path=csv_path, lean_dtypes=lean)
+    handler.memory_report = MemoryReport(enabled=True)
+    if not handler.load_data() or not handler.train_model():
+        print(json.dumps({'error': 'load or train failed'}))
+        return
+
+    with open(queries_path, 'r') as f:
+        queries = json.load(f)
+
+    predictions, neighbors, matches = [], [], []
+    for user_inputs in queries:
+        predictions.append(handler.predict_classification(user_inputs, []).get('classification'))
+        result = handler.find_nearest_neighbors(user_inputs, [])
+        neighbors.append([neighbor['index'] for neighbor in result.get('neighbors', [])])
+        match = handler.find_exact_match(user_inputs, list(user_inputs))
+        matches.append(match.get('index') if match.get('found') else None)
+
+    print(json.dumps({
+        'accuracy': handler.accuracy,
+        'stages': handler.memory_report.stages,
+        'peak_kb': _common.process_memory_kb().get('peak_kb', 0),
+        'predictions': predictions,
+        'neighbors': neighbors,
+        'matches': matches
+    }, default=str))
+
+
+def run_probe(csv_path, queries_path, lean):
+    workdir = tempfile.mkdtemp(prefix='bench_dtype_')
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--probe', csv_path, queries_path,
+             '--lean' if lean else '--default'],
+            capture_output=True, text=True, check=True, cwd=workdir
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def sample_queries(csv_path, n_queries, seed=0):
+    """Feature values of random catalog rows, as float64 request inputs"""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    numeric = df.select_dtypes(include=[np.number])
+    rows = np.random.default_rng(seed).choice(len(df), min(n_queries, len(df)), replace=False)
+    return [
+        {col: float(value) for col, value in numeric.iloc[row].items() if value == value}
+        for row in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare default and lean catalog dtypes')
+    parser.add_argument('--csv', help='catalog CSV (synthetic when omitted)')
+    parser.add_argument('--rows', type=int, default=50000, help='synthetic catalog rows')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--probe', nargs=2, metavar=('CSV', 'QUERIES'), help=argparse.SUPPRESS)
+    parser.add_argument('--lean', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--default', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe[0], args.probe[1], args.lean, os.getcwd())
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix='bench_dtype_data_')
+    try:
+        csv_path = os.path.abspath(args.csv) if args.csv else os.path.join(workdir, 'catalog.csv')
+        if not args.csv:
+            synthetic_catalog(args.rows).to_csv(csv_path, index=False)
+
+        queries_path = os.path.join(workdir, 'queries.json')
+        with open(queries_path, 'w') as f:
+            json.dump(sample_queries(csv_path, args.queries), f)
+
+        default = run_probe(csv_path, queries_path, lean=False)
+        lean = run_probe(csv_path, queries_path, lean=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in (default, lean):
+        if 'error' in result:
+            print(f"Probe failed: {result['error']}", file=sys.stderr)
+            return 1
+
+    # The default run has no 'dtype plan' stage; it holds the parsed frame there
+    default_bytes = {stage['stage']: stage['bytes'] for stage in default['stages']}
+    default_bytes.setdefault('dtype plan', default_bytes.get('parse'))
+
+    rows = []
+    for lean_stage in lean['stages']:
+        baseline = default_bytes.get(lean_stage['stage'])
+        rows.append({
+            'stage': lean_stage['stage'],
+            'default_mb': None if baseline is None else baseline / 1e6,
+            'lean_mb': lean_stage['bytes'] / 1e6,
+            'ratio': None if not baseline else lean_stage['bytes'] / baseline
+        })
+    rows.append({
+        'stage': 'peak rss',
+        'default_mb': default['peak_kb'] / 1024,
+        'lean_mb': lean['peak_kb'] / 1024,
+        'ratio': lean['peak_kb'] / max(1, default['peak_kb'])
+    })
+
+    n_queries = len(default['predictions'])
+    parity = {
+        'default_accuracy': default['accuracy'],
+        'lean_accuracy': lean['accuracy'],
+        'prediction_agreement': sum(
+            a == b for a, b in zip(default['predictions'], lean['predictions'])
+        ) / n_queries,
+        'neighbor_overlap': sum(
+            len(set(a) & set(b)) / max(1, len(a)) for a, b in zip(default['neighbors'], lean['neighbors'])
+        ) / n_queries,
+        'exact_match_agreement': sum(
+            a == b for a, b in zip(default['matches'], lean['matches'])
+        ) / n_queries
+    }
+
+    _common.print_table(rows, ['stage', 'default_mb', 'lean_mb', 'ratio'])
+    print(f"Parity: {json.dumps(parity)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'memory': rows, 'parity': parity}, f, indent=2)
+
+    if default['accuracy'] - lean['accuracy'] > args.max_accuracy_drop:
+        print("Lean dtypes lost accuracy beyond the allowed drop", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Flattened forest engine benchmark
+=================================
+
+Checks FlatForest against sklearn (probabilities and predicted classes,
+with and without the scaler folded into the thresholds) and compares
+predict latency for single rows and batches.
+
+Trains on the KOI cumulative catalog when it is present, otherwise on a
+synthetic catalog with the same seven features. Exits non-zero if the
+parity check fails.
+
+Usage:
+    python benchmarks/bench_forest_engine.py [--csv cumulative_2025.10.04_03.33.35.csv]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import _common
+import numpy as np
+
+from forest_engine import FlatForest
+
+KOI_FEATURES = ['koi_period', 'koi_duration', 'koi_prad', 'koi_depth',
+                'koi_steff', 'koi_srad', 'koi_slogg']
+DEFAULT_CSV = os.path.join(_common.AI_DIR, 'cumulative_2025.10.04_03.33.35.csv')
+
+
+def load_training_data(csv_path, rows):
+    """KOI features and labels, or a synthetic stand-in"""
+    if csv_path and os.path.exists(csv_path):
+        import pandas as pd
+        df = pd.read_csv(csv_path, comment='#')
+        X = df[KOI_FEATURES].fillna(df[KOI_FEATURES].median()).to_numpy(dtype=np.float64)
+        y = df['koi_disposition'].astype('category').cat.codes.to_numpy()
+        return X, y, os.path.basename(csv_path)
+
+    rng = np.random.default_rng(42)
+    X = rng.lognormal(0, 1, (rows, len(KOI_FEATURES))) * [10, 3, 1, 1000, 5778, 1, 4.4]
+    y = (X[:, 0] > 10).astype(int) + (X[:, 2] > 2).astype(int)
+    return X, y, 'synthetic'
+
+
+def check_parity(model, scaler, X_scaled, X_raw):
+    """Compare engine output with sklearn; return a summary dict"""
+    reference_proba = model.predict_proba(X_scaled)
+    reference_class = model.predict(X_scaled)
+
+    engine = FlatForest.from_forest(model)
+    proba, predicted = engine.predict_with_proba(X_scaled)
+
+    folded = FlatForest.from_forest(model, scaler)
+    folded_proba, folded_predicted = folded.predict_with_proba(X_raw)
+
+    return {
+        'rows': len(X_scaled),
+        'max_abs_proba_diff': float(np.abs(proba - reference_proba).max()),
+        'class_mismatches': int((predicted != reference_class).sum()),
+        'folded_max_abs_proba_diff': float(np.abs(folded_proba - reference_proba).max()),
+        'folded_class_mismatches': int((folded_predicted != reference_class).sum())
+    }
+
+
+def parity_failed(parity):
+    return any((
+        parity['max_abs_proba_diff'] > 1e-9, parity['class_mismatches'],
+        parity['folded_max_abs_proba_diff'] > 1e-9, parity['folded_class_mismatches']
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the flattened forest engine against sklearn')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='KOI cumulative CSV (synthetic data if missing)')
+    parser.add_argument('--rows', type=int, default=10000, help='synthetic rows when no CSV is available')
+    parser.add_argument('--batch-sizes', default='1,16,256,4096')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    X, y, source = load_training_data(args.csv, args.rows)
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+
+    model = RandomForestClassifier(
+        n_estimators=100, max_depth=10, random_state=42, class_weight='balanced'
+    ).fit(X_scaled, y)
+
+    parity = check_parity(model, scaler, X_scaled, X)
+    print(f"Data: {source} ({len(X)} rows)")
+    print(f"Parity: {json.dumps(parity)}")
+
+    engine = FlatForest.from_forest(model)
+    export_seconds = min(_common.time_calls(lambda: FlatForest.from_forest(model), 5))
+
+    results = []
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        batch = X_scaled[:batch_size]
+        repeat = max(3, args.repeat // max(1, batch_size // 256))
+
+        sklearn_times = _common.time_calls(
+            lambda: (model.predict_proba(batch), model.predict(batch)), repeat
+        )
+        engine_times = _common.time_calls(lambda: engine.predict_with_proba(batch), repeat)
+
+        sklearn_ms = _common.summarize(sklearn_times)['median'] * 1000
+        engine_ms = _common.summarize(engine_times)['median'] * 1000
+        results.append({
+            'batch': batch_size,
+            'sklearn_ms': sklearn_ms,
+            'engine_ms': engine_ms,
+            'speedup': sklearn_ms / engine_ms,
+            'engine_us_per_row': engine_ms * 1000 / batch_size
+        })
+
+    print(f"Export: {export_seconds * 1000:.2f} ms for {engine.n_estimators} trees")
+    _common.print_table(results, ['batch', 'sklearn_ms', 'engine_ms', 'speedup', 'engine_us_per_row'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'parity': parity, 'latency': results}, f, indent=2)
+
+    if parity_failed(parity):
+        print("Parity check FAILED", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Analysis hot path benchmark
+===========================
+
+Times every ExoplanetDataHandler path a request or a retrain goes
+through, on synthetic catalogs of increasing size (the planetary systems
+schema of training_data.csv, see bench_dtype_plan.synthetic_catalog):
+
+    load_data               first load: CSV parse and catalog cache write
+    load_data_cached        later loads, from the catalog cache
+    train_model             fit, similarity index, save and publish
+    find_exact_match        lookup of a catalog row
+    find_nearest_neighbors  k=6 query for a row that is not in the catalog
+    predict_classification  forest prediction for the same rows
+    get_column_info         first call (statistics computed) and cached calls
+    analyze_exoplanet       end to end, exact match and ML analysis requests
+
+Each size runs in a fresh process. Every stage is timed without tracing,
+then run once more under tracemalloc for its peak traced memory above
+the starting point, the memory it still holds afterwards and the net
+number of memory blocks it allocated. The peak RSS of the process is
+reported per size.
+
+Results are written as JSON (--output). --compare checks them against a
+baseline file from an earlier commit and exits non-zero when a stage got
+slower or hungrier than --threshold allows; --current compares two
+existing files without running anything.
+
+Usage:
+    python benchmarks/bench_hot_paths.py --sizes 1k,10k,100k,1M --output hot_paths.json
+    python benchmarks/bench_hot_paths.py --sizes 1k,10k --compare hot_paths.json
+    python benchmarks/bench_hot_paths.py --compare old.json --current new.json
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import _common
+import numpy as np
+
+DEFAULT_SIZES = '1k,10k,100k,1M'
+QUERY_STAGES = ['find_exact_match', 'find_nearest_neighbors', 'predict_classification',
+                'get_column_info_cached', 'analyze_exoplanet_exact', 'analyze_exoplanet_ml']
+# Metrics compared against a baseline; memory below the floor is noise
+COMPARED_METRICS = {'median_ms': 0.05, 'peak_kb': 256}
+
+
+def trace_call(fn):
+    """Peak and retained traced memory (kB) and net allocated blocks of one call"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_kb': (peak - start_bytes) / 1024,
+        'retained_kb': (current - start_bytes) / 1024,
+        'alloc_blocks': sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    }
+
+
+def measure(stage, fn, repeat, setup=None):
+    """Timing over repeat calls plus one traced call; setup runs untimed before every call"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    summary = _common.summarize(samples)
+    return dict({
+        'stage': stage,
+        'calls': repeat,
+        'median_ms': summary['median'] * 1000,
+        'p95_ms': summary['p95'] * 1000
+    }, **trace_call(fn))
+
+
+def make_queries(df, feature_columns, n_queries, seed=0):
+    """(catalog rows as requests, perturbed rows that match nothing)"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(df), min(n_queries, len(df)), replace=False)
+    exact = []
+    for row in rows:
+        record = df.iloc[row]
+        exact.append({col: float(record[col]) for col in feature_columns if record[col] == record[col]})
+    misses = [{col: value * 1.013 + 0.5 for col, value in query.items()} for query in exact]
+    return exact, misses
+
+
+def probe(csv_path, repeat, n_queries):
+    """Run in a child process (cwd: a scratch directory); prints the results as JSON"""
+    import new_exoplanet_system
+    from catalog_cache import CACHE_DIR
+
+    results = []
+    with contextlib.redirect_stdout(sys.stderr):
+        def cold_load():
+            new_exoplanet_system.ExoplanetDataHandler(csv_path=csv_path).load_data()
+
+        def drop_cache():
+            shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+        results.append(measure('load_data', cold_load, 1, setup=drop_cache))
+        results.append(measure('load_data_cached', cold_load, max(1, repeat // 50)))
+
+        handler = new_exoplanet_system.ExoplanetDataHandler(csv_path=csv_path)
+        if not handler.load_data():
+            raise RuntimeError(f'could not load {csv_path}')
+        results.append(measure('train_model', handler.train_model, 1))
+
+        # analyze_exoplanet serves from the process-wide handler
+        new_exoplanet_system._data_handler = handler
+        exact, misses = make_queries(handler.df, handler.feature_columns, n_queries)
+        selected = list(exact[0])
+        exact_cycle, miss_cycle = itertools.cycle(exact), itertools.cycle(misses)
+
+        stages = {
+            'find_exact_match': lambda: handler.find_exact_match(next(exact_cycle), selected),
+            'find_nearest_neighbors': lambda: handler.find_nearest_neighbors(next(miss_cycle), selected),
+            'predict_classification': lambda: handler.predict_classification(next(miss_cycle), selected),
+            'get_column_info_cached': handler.get_column_info,
+            'analyze_exoplanet_exact': lambda: new_exoplanet_system.analyze_exoplanet(next(exact_cycle), selected),
+            'analyze_exoplanet_ml': lambda: new_exoplanet_system.analyze_exoplanet(next(miss_cycle), selected)
+        }
+
+        def forget_column_stats():
+            handler.snapshot._column_stats[0] = None
+
+        results.append(measure('get_column_info', handler.get_column_info, 1, setup=forget_column_stats))
+        for stage in QUERY_STAGES:
+            results.append(measure(stage, stages[stage], repeat))
+
+    print(json.dumps({
+        'results': results,
+        'peak_rss_kb': _common.process_memory_kb().get('peak_kb', 0)
+    }))
+
+
+def run_size(rows, repeat, n_queries, workdir):
+    from bench_dtype_plan import synthetic_catalog
+
+    size_dir = os.path.join(workdir, str(rows))
+    os.makedirs(size_dir)
+    csv_path = os.path.join(size_dir, 'training_data.csv')
+    synthetic_catalog(rows).to_csv(csv_path, index=False)
+
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--probe', csv_path,
+         '--repeat', str(repeat), '--queries', str(n_queries)],
+        capture_output=True, text=True, cwd=size_dir
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'{rows} rows failed:\n{result.stderr}')
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    for row in measured['results']:
+        row['rows'] = rows
+    return measured
+
+
+def environment():
+    """What the numbers were measured on, to tell code changes from machine changes"""
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except ImportError:
+            return None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_common.AI_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': version('numpy'),
+        'pandas': version('pandas'),
+        'sklearn': version('sklearn'),
+        'cpus': os.cpu_count(),
+        'machine': platform.machine()
+    }
+
+
+def compare(baseline, current, threshold):
+    """Rows of (rows, stage, metric) changes; the second value says whether any regressed"""
+    base = {(row['rows'], row['stage']): row for row in baseline['results']}
+    rows, regressed = [], False
+    for row in current['results']:
+        old = base.get((row['rows'], row['stage']))
+        if old is None:
+            continue
+        for metric, floor in COMPARED_METRICS.items():
+            before, after = old.get(metric), row.get(metric)
+            if before is None or after is None or max(before, after) < floor:
+                continue
+            ratio = after / max(before, floor)
+            worse = ratio > 1 + threshold
+            regressed = regressed or worse
+            rows.append({'rows': row['rows'], 'stage': row['stage'], 'metric': metric,
+                         'baseline': before, 'current': after, 'ratio': ratio,
+                         'status': 'REGRESSED' if worse else 'ok'})
+    return rows, regressed
+
+
+def report_comparison(baseline_path, current, threshold):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    rows, regressed = compare(baseline, current, threshold)
+    print(f"\nAgainst {baseline_path} (commit {baseline.get('environment', {}).get('commit')}), "
+          f"threshold +{threshold:.0%}:")
+    if rows:
+        _common.print_table(rows, ['rows', 'stage', 'metric', 'baseline', 'current', 'ratio', 'status'])
+    else:
+        print("No stages in common")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and trace the analysis hot paths at several catalog sizes')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='catalog sizes, e.g. 1k,10k,100k,1M')
+    parser.add_argument('--repeat', type=int, default=200, help='timed calls per request-path stage')
+    parser.add_argument('--queries', type=int, default=50, help='distinct request inputs to cycle through')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--compare', metavar='BASELINE', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--current', metavar='RESULTS', help='compare this results JSON instead of running')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative increase before failing')
+    parser.add_argument('--probe', metavar='CSV', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.repeat, args.queries)
+        return 0
+
+    if args.current:
+        if not args.compare:
+            parser.error('--current needs --compare')
+        with open(args.current, 'r') as f:
+            return report_comparison(args.compare, json.load(f), args.threshold)
+
+    results, peaks = [], []
+    with tempfile.TemporaryDirectory(prefix='bench_hot_paths_') as workdir:
+        for rows in _common.parse_sizes(args.sizes):
+            print(f"{rows} rows...", flush=True)
+            measured = run_size(rows, args.repeat, args.queries, workdir)
+            results.extend(measured['results'])
+            peaks.append({'rows': rows, 'peak_rss_kb': measured['peak_rss_kb']})
+
+    _common.print_table(results, ['rows', 'stage', 'calls', 'median_ms', 'p95_ms', 'peak_kb', 'retained_kb',
+                                  'alloc_blocks'])
+    print()
+    _common.print_table(peaks, ['rows', 'peak_rss_kb'])
+
+    current = {'environment': environment(), 'repeat': args.repeat, 'results': results, 'processes': peaks}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        return report_comparison(args.compare, current, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
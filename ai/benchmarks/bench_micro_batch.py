@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Micro-batching throughput benchmark
+===================================
+
+Starts the analysis worker on a Unix socket over a synthetic catalog,
+once per batching setting (--waits: "off" for one request at a time,
+otherwise a batch window in milliseconds; see micro_batch.py), and
+drives it with --clients concurrent client processes. Each client keeps
+one connection and sends ML analysis requests (inputs that match no
+catalog row) back to back for --duration seconds.
+
+Reports requests per second, client-side latency percentiles and the
+mean batch size the worker saw (from its metrics op).
+
+Each setting also gets a burst of --one-shot-clients processes that
+start together and open one connection per request, as the thin clients
+(inference.py, new_predict.py) do through WorkerClient. A request whose
+connection fails counts as a fallback (those clients would analyze in
+process instead); the benchmark exits non-zero if there is any.
+
+Usage:
+    python benchmarks/bench_micro_batch.py [--rows 100000] [--clients 1,8,32] [--waits off,0,2] [--duration 5]
+                                           [--one-shot-clients 64] [--one-shot-requests 5]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import _common
+
+from analysis_worker import WorkerClient
+from bench_hot_paths import make_queries
+
+FEATURES = ['pl_orbper', 'pl_rade', 'pl_bmasse', 'st_teff', 'st_rad', 'st_mass', 'sy_dist', 'pl_insol',
+            'pl_eqt', 'st_met']
+
+
+def start_worker(workdir, socket_path, wait_ms, max_batch):
+    command = [sys.executable, os.path.join(_common.AI_DIR, 'analysis_worker.py'), '--socket', socket_path,
+               '--max-batch', str(max_batch)]
+    if wait_ms != 'off':
+        command += ['--batch-wait-ms', wait_ms]
+    env = dict(os.environ)
+    env.pop('EXOPLANET_BATCH_WAIT_MS', None)
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True)
+    # Training output comes first; the ready message is the JSON line announcing the socket
+    for line in process.stdout:
+        if line.startswith('{'):
+            message = json.loads(line)
+            if message.get('type') != 'ready':
+                raise RuntimeError(f'worker failed: {message}')
+            # Keep reading, so worker output never fills the pipe
+            threading.Thread(target=process.stdout.read, daemon=True).start()
+            return process
+    raise RuntimeError('worker exited before it was ready')
+
+
+def request(sock_file, message):
+    sock_file.write(json.dumps(message) + '\n')
+    sock_file.flush()
+    return json.loads(sock_file.readline())['result']
+
+
+def client(socket_path, queries, duration, seconds_out):
+    """Send queries back to back on one connection for duration seconds; put the latencies"""
+    latencies = []
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rw', encoding='utf-8') as sock_file:
+            deadline = time.perf_counter() + duration
+            i = 0
+            while time.perf_counter() < deadline:
+                user_inputs = queries[i % len(queries)]
+                start = time.perf_counter()
+                result = request(sock_file, {'id': i, 'op': 'analyze', 'user_inputs': user_inputs,
+                                             'selected_columns': list(user_inputs)})
+                latencies.append(time.perf_counter() - start)
+                if result.get('type') != 'ml_analysis':
+                    raise RuntimeError(f'unexpected result: {result}')
+                i += 1
+    seconds_out.put(latencies)
+
+
+def batch_sizes(socket_path):
+    """(sum, count) of the worker's batch size histogram"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rw', encoding='utf-8') as sock_file:
+            text = request(sock_file, {'id': 0, 'op': 'metrics'})['text']
+    values = {}
+    for line in text.splitlines():
+        for suffix in ('_sum', '_count'):
+            if line.startswith(f'exoplanet_batch_size{suffix}'):
+                values[suffix] = float(line.rsplit(' ', 1)[1])
+    return values.get('_sum', 0.0), values.get('_count', 0.0)
+
+
+def one_shot_client(socket_path, queries, barrier, results_out):
+    """Send each query on a connection of its own, starting with the others; put (latencies, fallbacks)"""
+    client = WorkerClient(socket_path)
+    latencies = []
+    fallbacks = 0
+    barrier.wait()
+    for user_inputs in queries:
+        start = time.perf_counter()
+        try:
+            result = client.request('analyze', user_inputs=user_inputs, selected_columns=list(user_inputs))
+        except (OSError, ValueError, KeyError):
+            # try_worker_request gives up on these and the caller analyzes in process
+            fallbacks += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        if result.get('type') != 'ml_analysis':
+            raise RuntimeError(f'unexpected result: {result}')
+    results_out.put((latencies, fallbacks))
+
+
+def run_one_shot(socket_path, queries, clients, requests):
+    """Burst of clients sending requests one-connection-per-request requests each"""
+    context = multiprocessing.get_context('fork')
+    results_out = context.Queue()
+    barrier = context.Barrier(clients)
+    processes = [context.Process(target=one_shot_client, args=(
+                     socket_path, [queries[(i * requests + j) % len(queries)] for j in range(requests)],
+                     barrier, results_out))
+                 for i in range(clients)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    latencies = []
+    fallbacks = 0
+    for _ in processes:
+        client_latencies, client_fallbacks = results_out.get()
+        latencies.extend(client_latencies)
+        fallbacks += client_fallbacks
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError('a client failed')
+
+    ordered = sorted(latencies) or [float('nan')]
+    return {
+        'requests_per_s': len(latencies) / elapsed,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        'fallbacks': fallbacks
+    }
+
+
+def run_load(socket_path, queries, clients, duration):
+    context = multiprocessing.get_context('fork')
+    seconds_out = context.Queue()
+    before = batch_sizes(socket_path)
+    processes = [context.Process(target=client, args=(socket_path, queries[i::clients] or queries, duration,
+                                                       seconds_out))
+                 for i in range(clients)]
+    for process in processes:
+        process.start()
+    latencies = []
+    for _ in processes:
+        latencies.extend(seconds_out.get())
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError('a client failed')
+    after = batch_sizes(socket_path)
+
+    summary = _common.summarize(latencies)
+    ordered = sorted(latencies)
+    batches = after[1] - before[1]
+    return {
+        'requests_per_s': len(latencies) / duration,
+        'p50_ms': summary['median'] * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        'mean_batch': (after[0] - before[0]) / batches if batches else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker throughput with and without micro-batching')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic catalog rows')
+    parser.add_argument('--clients', default='1,8,32', help='concurrent client processes to try')
+    parser.add_argument('--waits', default='off,0,2', help='batch windows in ms ("off": no batching)')
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of load per measurement')
+    parser.add_argument('--one-shot-clients', type=int, default=64,
+                        help='client processes in the one-connection-per-request burst')
+    parser.add_argument('--one-shot-requests', type=int, default=5, help='requests per one-shot client')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    from bench_dtype_plan import synthetic_catalog
+
+    results = []
+    one_shot = []
+    with tempfile.TemporaryDirectory(prefix='bench_micro_batch_') as workdir:
+        catalog = synthetic_catalog(args.rows)
+        catalog.to_csv(os.path.join(workdir, 'training_data.csv'), index=False)
+        _, queries = make_queries(catalog, FEATURES, 200)
+        socket_path = os.path.join(workdir, 'worker.sock')
+
+        for wait_ms in args.waits.split(','):
+            print(f"Batch window {wait_ms}...", flush=True)
+            worker = start_worker(workdir, socket_path, wait_ms, args.max_batch)
+            try:
+                for clients in (int(n) for n in args.clients.split(',')):
+                    row = run_load(socket_path, queries, clients, args.duration)
+                    results.append(dict({'wait_ms': wait_ms, 'clients': clients}, **row))
+                row = run_one_shot(socket_path, queries, args.one_shot_clients, args.one_shot_requests)
+                one_shot.append(dict({'wait_ms': wait_ms, 'clients': args.one_shot_clients}, **row))
+            finally:
+                worker.terminate()
+                worker.wait()
+
+    _common.print_table(results, ['wait_ms', 'clients', 'requests_per_s', 'p50_ms', 'p99_ms', 'mean_batch'])
+    print("\nOne connection per request:")
+    _common.print_table(one_shot, ['wait_ms', 'clients', 'requests_per_s', 'p50_ms', 'p99_ms', 'fallbacks'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'duration': args.duration, 'results': results, 'one_shot': one_shot},
+                      f, indent=2)
+
+    fallbacks = sum(row['fallbacks'] for row in one_shot)
+    if fallbacks:
+        print(f"{fallbacks} one-shot requests could not reach the worker", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Out-of-core training accuracy
+=============================
+
+Compares out-of-core training (see out_of_core.py) with in-memory
+training on the KOI cumulative catalog. The catalog is split 80/20,
+stratified, once; in-memory training fits on the whole training part,
+while out-of-core training streams the same rows from a CSV in chunks
+of --chunk-rows, samples at most --capacities rows per class and fits
+one forest or --shards merged sub-forests. Every model is scored on the
+same held-out rows, imputed and scaled the way its own pipeline does
+(out-of-core training keeps no test sample of its own here).
+
+Reports accuracy, the difference to in-memory training, fit time and
+the rows trained on, averaged over --seeds random states.
+
+Usage:
+    python benchmarks/bench_out_of_core.py [--csv cumulative_2025.10.04_03.33.35.csv] [--capacities all,2000,500] [--shards 1,4]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import _common
+import numpy as np
+
+from bench_forest_engine import DEFAULT_CSV, KOI_FEATURES
+from estimator_backends import get_backend
+from out_of_core import train_from_csv
+from train_exoplanet_model_simple import FOREST_OVERRIDES
+
+TARGET = 'koi_disposition'
+
+
+def in_memory(train, test, classes, seed):
+    from sklearn.preprocessing import StandardScaler
+
+    medians = train[KOI_FEATURES].median()
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(train[KOI_FEATURES].fillna(medians).to_numpy(dtype=np.float64))
+    X_test = scaler.transform(test[KOI_FEATURES].fillna(medians).to_numpy(dtype=np.float64))
+    y_train = np.searchsorted(classes, train[TARGET].to_numpy(dtype=object))
+
+    model = get_backend().build(seed, **FOREST_OVERRIDES)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    return model.predict(X_test), time.perf_counter() - start, len(y_train)
+
+
+def out_of_core(csv_path, test, capacity, shards, chunk_rows, seed):
+    start = time.perf_counter()
+    trainer, model, classes, medians = train_from_csv(
+        csv_path, KOI_FEATURES, TARGET, get_backend(), capacity=capacity, n_shards=shards, rows=chunk_rows,
+        test_size=0.0, random_state=seed, **FOREST_OVERRIDES
+    )
+    seconds = time.perf_counter() - start
+    X_test = test[KOI_FEATURES].to_numpy(dtype=np.float64, na_value=np.nan)
+    X_test = np.where(np.isnan(X_test), medians, X_test)
+    sampled = sum(shard.size(label) for shard in trainer.shards for label in shard.labels)
+    return model.predict(trainer.scaler.transform(X_test)), seconds, sampled
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare out-of-core with in-memory training accuracy')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='KOI cumulative CSV')
+    parser.add_argument('--capacities', default='all,2000,500', help='sampled training rows per class ("all": no cap)')
+    parser.add_argument('--shards', default='1,4', help='sub-forest counts to try')
+    parser.add_argument('--chunk-rows', type=int, default=500, help='rows per streamed chunk')
+    parser.add_argument('--seeds', type=int, default=3, help='random states to average over')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(args.csv, comment='#', usecols=KOI_FEATURES + [TARGET])
+    df = df[df[TARGET].notna()]
+    train, test = train_test_split(df, test_size=0.2, random_state=42, stratify=df[TARGET])
+    classes = np.array(sorted(df[TARGET].unique()), dtype=object)
+    y_test = np.searchsorted(classes, test[TARGET].to_numpy(dtype=object))
+    print(f"{os.path.basename(args.csv)}: {len(train)} training rows, {len(test)} held out")
+
+    configs = [('in_memory', None, 1)]
+    for capacity in args.capacities.split(','):
+        for shards in (int(n) for n in args.shards.split(',')):
+            configs.append(('out_of_core', None if capacity == 'all' else int(capacity), shards))
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_out_of_core_') as workdir:
+        csv_path = os.path.join(workdir, 'train.csv')
+        train.to_csv(csv_path, index=False)
+        for mode, capacity, shards in configs:
+            runs = []
+            for seed in range(args.seeds):
+                if mode == 'in_memory':
+                    predicted, seconds, rows = in_memory(train, test, classes, seed)
+                else:
+                    predicted, seconds, rows = out_of_core(csv_path, test, capacity or len(train), shards,
+                                                           args.chunk_rows, seed)
+                runs.append((float(np.mean(predicted == y_test)), seconds, rows))
+            accuracy, seconds, rows = (float(np.mean(values)) for values in zip(*runs))
+            results.append({'mode': mode, 'per_class': capacity or 'all', 'shards': shards,
+                            'train_rows': int(rows), 'fit_s': seconds, 'accuracy': accuracy})
+
+    baseline = results[0]['accuracy']
+    for row in results:
+        row['vs_in_memory'] = row['accuracy'] - baseline
+    _common.print_table(results, ['mode', 'per_class', 'shards', 'train_rows', 'fit_s', 'accuracy', 'vs_in_memory'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'csv': os.path.basename(args.csv), 'chunk_rows': args.chunk_rows, 'seeds': args.seeds,
+                       'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
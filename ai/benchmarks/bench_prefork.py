@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Pre-fork server scaling benchmark
+=================================
+
+Starts prefork_server.py over a synthetic catalog with an increasing
+number of worker processes (--workers) and drives each setting with
+--clients concurrent client processes sending ML analysis requests back
+to back (the load of bench_micro_batch.py). Reports requests per second
+and latency percentiles per setting, then the memory of the parent and
+of every worker after the load: resident, proportional (Pss: shared
+pages split between the processes mapping them) and private memory.
+Private memory is what each extra worker really costs.
+
+Each setting also takes a burst of --one-shot-clients clients opening
+one connection per request, like the thin clients (run_one_shot in
+bench_micro_batch.py); the benchmark exits non-zero if any of those
+requests could not reach a worker.
+
+With --compare-freeze the largest setting runs once more without
+gc.freeze() before the fork, to show the pages collections copy.
+
+Throughput only scales up to the number of cores the host has (and the
+clients run on the same cores).
+
+Usage:
+    python benchmarks/bench_prefork.py [--rows 100000] [--workers 1,2,4] [--clients 16] [--duration 5] [--compare-freeze]
+                                       [--one-shot-clients 64] [--one-shot-requests 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+import _common
+
+from bench_hot_paths import make_queries
+from bench_micro_batch import FEATURES, run_load, run_one_shot
+from prefork_server import memory_kb
+
+
+def start_server(workdir, socket_path, workers, freeze):
+    command = [sys.executable, os.path.join(_common.AI_DIR, 'prefork_server.py'), '--socket', socket_path,
+               '--workers', str(workers)]
+    if not freeze:
+        command.append('--no-gc-freeze')
+    env = dict(os.environ)
+    env.pop('EXOPLANET_BATCH_WAIT_MS', None)
+    env.pop('EXOPLANET_WORKER_MAX_PRIVATE_MB', None)
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True)
+    for line in process.stdout:
+        if line.startswith('{'):
+            ready = json.loads(line)
+            if ready.get('type') != 'ready':
+                raise RuntimeError(f'server failed: {ready}')
+            threading.Thread(target=process.stdout.read, daemon=True).start()
+            return process, ready['workers']
+    raise RuntimeError('server exited before it was ready')
+
+
+def memory_rows(label, parent_pid, worker_pids):
+    rows = []
+    for role, pid in [('parent', parent_pid)] + [(f'worker {i}', pid) for i, pid in enumerate(worker_pids)]:
+        memory = memory_kb(pid)
+        rows.append({'setting': label, 'process': role, 'rss_mb': memory.get('rss_kb', 0) / 1024,
+                     'pss_mb': memory.get('pss_kb', 0) / 1024, 'private_mb': memory.get('private_kb', 0) / 1024})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput and memory of the pre-fork server by worker count')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic catalog rows')
+    parser.add_argument('--workers', default='1,2,4', help='worker counts to try')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of load per setting')
+    parser.add_argument('--one-shot-clients', type=int, default=64,
+                        help='client processes in the one-connection-per-request burst')
+    parser.add_argument('--one-shot-requests', type=int, default=5, help='requests per one-shot client')
+    parser.add_argument('--compare-freeze', action='store_true', help='also run the largest setting without gc.freeze')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    from bench_dtype_plan import synthetic_catalog
+
+    settings = [(int(n), True) for n in args.workers.split(',')]
+    if args.compare_freeze:
+        settings.append((settings[-1][0], False))
+
+    throughput, memory, one_shot = [], [], []
+    with tempfile.TemporaryDirectory(prefix='bench_prefork_') as workdir:
+        catalog = synthetic_catalog(args.rows)
+        catalog.to_csv(os.path.join(workdir, 'training_data.csv'), index=False)
+        _, queries = make_queries(catalog, FEATURES, 200)
+        socket_path = os.path.join(workdir, 'server.sock')
+
+        for workers, freeze in settings:
+            label = f'{workers} workers' + ('' if freeze else ', no gc.freeze')
+            print(f"{label}...", flush=True)
+            server, worker_pids = start_server(workdir, socket_path, workers, freeze)
+            try:
+                row = run_load(socket_path, queries, args.clients, args.duration)
+                throughput.append({'setting': label, 'requests_per_s': row['requests_per_s'],
+                                   'p50_ms': row['p50_ms'], 'p99_ms': row['p99_ms']})
+                row = run_one_shot(socket_path, queries, args.one_shot_clients, args.one_shot_requests)
+                one_shot.append(dict({'setting': label, 'clients': args.one_shot_clients}, **row))
+                memory.extend(memory_rows(label, server.pid, worker_pids))
+            finally:
+                server.terminate()
+                server.wait()
+
+    _common.print_table(throughput, ['setting', 'requests_per_s', 'p50_ms', 'p99_ms'])
+    print("\nOne connection per request:")
+    _common.print_table(one_shot, ['setting', 'clients', 'requests_per_s', 'p50_ms', 'p99_ms', 'fallbacks'])
+    print()
+    _common.print_table(memory, ['setting', 'process', 'rss_mb', 'pss_mb', 'private_mb'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'clients': args.clients, 'cpus': os.cpu_count(),
+                       'throughput': throughput, 'one_shot': one_shot, 'memory': memory}, f, indent=2)
+
+    fallbacks = sum(row['fallbacks'] for row in one_shot)
+    if fallbacks:
+        print(f"{fallbacks} one-shot requests could not reach a worker", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Similarity index benchmark
+==========================
+
+Compares brute / KD-tree / ball-tree indexes on synthetic catalogs:
+build time, single-row query latency, on-disk size, and the memory a
+fresh process spends mapping the saved index.
+
+Usage:
+    python benchmarks/bench_similarity_index.py --sizes 1k,10k,100k,1M
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import _common
+import numpy as np
+
+from similarity_index import ALGORITHMS, SimilarityIndex
+
+
+def _directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def probe_load(directory, queries_path, k):
+    """Run in a child process: map the index and report memory after loading it"""
+    # Import sklearn up front so its own footprint is not charged to the index
+    import sklearn.neighbors  # noqa: F401
+
+    before = _common.process_memory_kb()
+    start = time.perf_counter()
+    index = SimilarityIndex.load(directory)
+    load_seconds = time.perf_counter() - start
+    after_load = _common.process_memory_kb()
+
+    index.query(np.load(queries_path)[:1], k=k)
+    after_query = _common.process_memory_kb()
+
+    print(json.dumps({
+        'load_ms': load_seconds * 1000,
+        'load_anon_kb': after_load.get('anon_kb', 0) - before.get('anon_kb', 0),
+        'query_anon_kb': after_query.get('anon_kb', 0) - before.get('anon_kb', 0),
+        'query_file_kb': after_query.get('file_kb', 0) - before.get('file_kb', 0)
+    }))
+
+
+def bench_one(features, queries, algorithm, k, workdir):
+    import sklearn.neighbors  # noqa: F401
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SimilarityIndex(algorithm).build(features)
+    build_seconds = time.perf_counter() - start
+    _, build_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [
+        _common.time_calls(lambda q=q: index.query(q[None, :], k=k), 1)[0]
+        for q in queries
+    ]
+    latency = _common.summarize(latencies)
+
+    directory = os.path.join(workdir, algorithm)
+    index.save(directory)
+    queries_path = os.path.join(workdir, 'queries.npy')
+
+    probe = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--probe', directory, queries_path, '--k', str(k)],
+        capture_output=True, text=True, check=True
+    )
+
+    row = {
+        'rows': len(features),
+        'algorithm': algorithm,
+        'build_s': build_seconds,
+        'build_peak_mb': build_peak / 1024 ** 2,
+        'query_p50_ms': latency['median'] * 1000,
+        'query_p95_ms': latency['p95'] * 1000,
+        'disk_mb': _directory_size(directory) / 1024 ** 2
+    }
+    row.update(json.loads(probe.stdout.strip().splitlines()[-1]))
+    shutil.rmtree(directory)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nearest-neighbour index algorithms')
+    parser.add_argument('--sizes', default='1k,10k,100k,1M', help='catalog sizes, e.g. 1k,10k,1M')
+    parser.add_argument('--features', type=int, default=10, help='feature columns per row')
+    parser.add_argument('--algorithms', default=','.join(ALGORITHMS))
+    parser.add_argument('--queries', type=int, default=200, help='single-row queries per case')
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--probe', nargs=2, metavar=('INDEX_DIR', 'QUERIES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe_load(args.probe[0], args.probe[1], args.k)
+        return
+
+    rng = np.random.default_rng(42)
+    results = []
+
+    for size in _common.parse_sizes(args.sizes):
+        features = rng.standard_normal((size, args.features))
+        queries = rng.standard_normal((args.queries, args.features))
+        workdir = tempfile.mkdtemp(prefix='simidx-')
+        np.save(os.path.join(workdir, 'queries.npy'), queries)
+
+        try:
+            for algorithm in args.algorithms.split(','):
+                row = bench_one(features, queries, algorithm, args.k, workdir)
+                results.append(row)
+                print(f"{size:>9} rows  {algorithm:<9}  build {row['build_s']:.3f}s  "
+                      f"query p50 {row['query_p50_ms']:.3f}ms", file=sys.stderr)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    _common.print_table(results, [
+        'rows', 'algorithm', 'build_s', 'build_peak_mb', 'query_p50_ms', 'query_p95_ms',
+        'disk_mb', 'load_ms', 'load_anon_kb', 'query_anon_kb', 'query_file_kb'
+    ])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
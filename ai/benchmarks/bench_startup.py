@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark
+====================
+
+Measures, for each per-request CLI (predict.py, new_predict.py,
+get_columns.py) and for the inference facade, in fresh interpreters:
+
+- import time of the entry module and which heavy libraries the import
+  pulled in (pandas, scikit-learn, joblib, scipy, matplotlib, watchdog),
+- whether importing it wrote anything to the working directory,
+- wall time of a full run up to its printed result.
+
+Bare interpreter startup is reported alongside as the floor. The runs
+happen in a scratch directory holding a KOI model trained with
+train_exoplanet_model_simple.py and a synthetic catalog for the handler,
+both prepared (and the handler model trained) before timing starts. No
+analysis worker is reachable, so new_predict.py and get_columns.py load
+in-process.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--rows 5000] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import _common
+
+from bench_forest_engine import DEFAULT_CSV
+
+HEAVY_MODULES = ['pandas', 'sklearn', 'joblib', 'scipy', 'matplotlib', 'watchdog']
+
+KOI_INPUT = {
+    'orbital_period': 9.49, 'transit_duration': 2.96, 'planetary_radius': 2.26,
+    'transit_depth': 616.0, 'stellar_temperature': 5455.0, 'stellar_radius': 0.93,
+    'stellar_surface_gravity': 4.47
+}
+
+IMPORT_PROBE = """
+import json, os, sys, time
+sys.path.insert(0, {ai_dir!r})
+before = set(os.listdir('.'))
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': seconds, 'heavy': heavy, 'created': sorted(set(os.listdir('.')) - before)}}))
+"""
+
+
+def entry_points(ai_dir):
+    """(name, module, argv) of every timed entry point"""
+    catalog_input = os.path.join(ai_dir, 'test_input.json')
+    with open(catalog_input, 'r') as f:
+        catalog_request = f.read()
+    return [
+        ('predict.py', 'predict', [os.path.join(ai_dir, 'predict.py'), json.dumps(KOI_INPUT)]),
+        ('new_predict.py', 'new_predict', [os.path.join(ai_dir, 'new_predict.py'), catalog_request]),
+        ('get_columns.py', 'get_columns', [os.path.join(ai_dir, 'get_columns.py')]),
+        ('inference', 'inference', None)
+    ]
+
+
+def run(argv, workdir, env):
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable] + argv, cwd=workdir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed:\n{completed.stderr}")
+    return seconds, completed.stdout
+
+
+def prepare_workdir(workdir, csv_path, rows, env):
+    """KOI model and handler catalog in workdir, with the handler model already trained"""
+    from bench_dtype_plan import synthetic_catalog
+
+    os.symlink(os.path.abspath(csv_path), os.path.join(workdir, os.path.basename(DEFAULT_CSV)))
+    print("Training the KOI model...")
+    run([os.path.join(_common.AI_DIR, 'train_exoplanet_model_simple.py')], workdir, env)
+
+    synthetic_catalog(rows).to_csv(os.path.join(workdir, 'training_data.csv'), index=False)
+    print("Training the catalog model...")
+    for _, _, argv in entry_points(_common.AI_DIR):
+        if argv is not None:
+            run(argv, workdir, env)
+
+
+def measure(name, module, argv, workdir, env, runs):
+    probe = IMPORT_PROBE.format(ai_dir=_common.AI_DIR, module=module, heavy=HEAVY_MODULES)
+    imports = []
+    for _ in range(runs):
+        _, output = run(['-c', probe], workdir, env)
+        imports.append(json.loads(output.strip().splitlines()[-1]))
+
+    row = {
+        'entry': name,
+        'import_ms': _common.summarize([item['seconds'] for item in imports])['median'] * 1000,
+        'heavy_imports': ','.join(imports[0]['heavy']) or '-',
+        'import_writes': ','.join(imports[0]['created']) or '-'
+    }
+    if argv is not None:
+        samples = [run(argv, workdir, env)[0] for _ in range(runs)]
+        row['first_result_ms'] = _common.summarize(samples)['median'] * 1000
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import and first-result time of the CLI entry points')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='KOI cumulative CSV used to train predict.py\'s model')
+    parser.add_argument('--rows', type=int, default=5000, help='rows of the synthetic handler catalog')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per measurement')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"KOI CSV not found: {args.csv}", file=sys.stderr)
+        return 2
+
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONDONTWRITEBYTECODE='1')
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # Never reach a worker left running on the default socket
+        env['EXOPLANET_WORKER_SOCKET'] = os.path.join(workdir, 'no-worker.sock')
+        prepare_workdir(workdir, args.csv, args.rows, env)
+
+        interpreter = [run(['-c', 'pass'], workdir, env)[0] for _ in range(args.runs)]
+        results.append({'entry': 'python -c pass', 'first_result_ms': _common.summarize(interpreter)['median'] * 1000})
+        for name, module, argv in entry_points(_common.AI_DIR):
+            results.append(measure(name, module, argv, workdir, env, args.runs))
+
+    _common.print_table(results, ['entry', 'import_ms', 'first_result_ms', 'heavy_imports', 'import_writes'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': args.runs, 'rows': args.rows, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Streaming load benchmark
+========================
+
+Loads the same catalog through ExoplanetDataHandler.load_data() twice,
+each in a fresh process with the catalog cache disabled: once whole
+(parse, impute, then the training feature matrix from the frame) and
+once streaming (chunked scan and impute into a memory-mapped frame;
+see streaming.py). Reports wall time, peak RSS, peak and held anonymous
+memory (the private heap; pages of the mapped frame files are
+file-backed and reclaimable, so they show up in RSS but not here), plus
+how far the streamed medians are from the exact ones (as a rank error:
+the fraction of values between the two).
+
+Run at several catalog sizes, the streaming rows' peak anonymous memory
+should stay roughly flat while the whole loads grow with the catalog.
+
+Usage:
+    python benchmarks/bench_streaming.py --sizes 200k,1M [--chunk-rows 100000] [--output streaming.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import _common
+import numpy as np
+
+
+class AnonSampler:
+    """Highest anonymous memory of this process, sampled every interval seconds"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, _common.process_memory_kb().get('anon_kb', 0))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, _common.process_memory_kb().get('anon_kb', 0))
+
+
+def probe(csv_path, streaming):
+    """Run in a child process: one load, then the training matrix, with one mode"""
+    import contextlib
+
+    import new_exoplanet_system
+
+    handler = new_exoplanet_system.ExoplanetDataHandler(csv_path=csv_path, streaming=streaming)
+    with AnonSampler() as sampler:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            if not handler.load_data():
+                raise RuntimeError(f'could not load {csv_path}')
+        load_seconds = time.perf_counter() - start
+
+        if handler.feature_matrix is not None:
+            X = handler.feature_matrix
+        else:
+            X = handler.df[handler.feature_columns].to_numpy(dtype=handler.feature_dtype)
+        checksum = float(np.asarray(X[:, 0], dtype=np.float64).sum())
+
+    memory = _common.process_memory_kb()
+    print(json.dumps({
+        'mode': 'streaming' if streaming else 'whole',
+        'load_s': load_seconds,
+        'peak_rss_mb': memory.get('peak_kb', 0) / 1024,
+        'peak_anon_mb': sampler.peak_kb / 1024,
+        'anon_mb': memory.get('anon_kb', 0) / 1024,
+        'features': handler.feature_columns,
+        'medians': handler.feature_medians.tolist(),
+        'checksum': checksum
+    }))
+
+
+def run_probe(csv_path, streaming, chunk_rows, workdir):
+    env = dict(os.environ, EXOPLANET_CATALOG_CACHE='0', EXOPLANET_CHUNK_ROWS=str(chunk_rows))
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--probe', csv_path] + (['--streaming'] if streaming else []),
+        capture_output=True, text=True, cwd=workdir, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_rank_errors(csv_path, features, exact, estimated):
+    """|rank(estimate) - rank(exact)| per feature, over the non-null values"""
+    import pandas as pd
+
+    errors = {}
+    for col, true_median, estimate in zip(features, exact, estimated):
+        values = pd.read_csv(csv_path, usecols=[col])[col].dropna().to_numpy(dtype=np.float64)
+        low, high = sorted((true_median, estimate))
+        errors[col] = float(np.mean((values > low) & (values < high)))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare whole and streaming catalog loads')
+    parser.add_argument('--csv', help='catalog CSV (synthetic catalogs of --sizes rows when omitted)')
+    parser.add_argument('--sizes', default='200k,1M', help='synthetic catalog rows, e.g. 200k,1M')
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--probe', metavar='CSV', help=argparse.SUPPRESS)
+    parser.add_argument('--streaming', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.streaming)
+        return 0
+
+    columns = ['rows', 'mode', 'load_s', 'peak_rss_mb', 'peak_anon_mb', 'anon_mb']
+    results = []
+    errors = {}
+    with tempfile.TemporaryDirectory(prefix='bench_streaming_') as workdir:
+        for rows in [None] if args.csv else _common.parse_sizes(args.sizes):
+            if rows is None:
+                csv_path = os.path.abspath(args.csv)
+            else:
+                from bench_dtype_plan import synthetic_catalog
+
+                csv_path = os.path.join(workdir, f'catalog_{rows}.csv')
+                synthetic_catalog(rows).to_csv(csv_path, index=False)
+            print(f"Catalog: {csv_path} ({os.path.getsize(csv_path) / 1e6:.0f} MB)")
+
+            whole = run_probe(csv_path, False, args.chunk_rows, workdir)
+            streamed = run_probe(csv_path, True, args.chunk_rows, workdir)
+            errors[rows] = median_rank_errors(csv_path, whole['features'], whole['medians'], streamed['medians'])
+            for run in (whole, streamed):
+                results.append(dict({key: run[key] for key in columns[1:]}, rows=rows))
+            print(f"Same features: {whole['features'] == streamed['features']}; "
+                  f"largest median rank error: {max(errors[rows].values()):.5f} "
+                  f"({max(errors[rows], key=errors[rows].get)})")
+
+    _common.print_table(results, columns)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'chunk_rows': args.chunk_rows, 'results': results,
+                       'median_rank_errors': {str(rows): e for rows, e in errors.items()}}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Columnar on-disk cache for the training catalogs.
+
+The first load of a CSV parses it (with pyarrow's multi-threaded reader
+when available), drops fully empty rows and writes the frame to a
+columnar cache entry keyed on the CSV content digest and the parse
+options (comment). Later loads of the same content with the same options
+read the cache instead of parsing text:
+
+- Feather (Arrow IPC), memory-mapped on read, when pyarrow is installed
+- otherwise one .npy file per column; numeric columns are memory-mapped
+
+Set EXOPLANET_CATALOG_CACHE=0 to always parse the CSV.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+
+from artifact_store import MODELS_DIR, digest_stamp
+
+CACHE_DIR = os.path.join(MODELS_DIR, 'catalog_cache')
+
+# Strings pandas reads as missing by default
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def cache_enabled():
+    return os.environ.get('EXOPLANET_CATALOG_CACHE', '1') != '0'
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.feather  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_csv(csv_path, comment=None):
+    """Parse a catalog CSV, using the multi-threaded pyarrow engine when possible.
+
+    The frame matches what the default C engine returns. pyarrow infers
+    ISO dates, timestamps and times (e.g. rowupdate and releasedate in the
+    planetary-systems export) where the C engine keeps the text, so those
+    columns are read back as text.
+    """
+    import pandas as pd
+
+    if not _has_pyarrow():
+        return pd.read_csv(csv_path, comment=comment)
+
+    # The pyarrow engine has no comment support; skip the leading comment block instead
+    with open(csv_path, 'rb') as f:
+        if comment is not None:
+            marker = comment.encode('utf-8')
+            while True:
+                position = f.tell()
+                line = f.readline()
+                if not line.startswith(marker):
+                    f.seek(position)
+                    break
+            if _contains(f, marker):
+                # Comments further down (whole lines or trailing) are only stripped by the C engine
+                return pd.read_csv(csv_path, comment=comment)
+        start = f.tell()
+        temporal = _temporal_columns(f)
+        f.seek(start)
+        df = pd.read_csv(f, engine='pyarrow')
+        if temporal:
+            f.seek(start)
+            _read_as_text(df, f, temporal)
+    return df
+
+
+def _contains(f, marker):
+    """Whether marker occurs in f after its current position (which is kept)"""
+    position = f.tell()
+    size = os.fstat(f.fileno()).st_size
+    if size <= position:
+        return False
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped.find(marker, position) != -1
+
+
+def _temporal_columns(f):
+    """Columns pyarrow infers as dates, timestamps or times in the first block of f.
+
+    A column is only inferred temporal for the whole file when every block
+    is, so the first block finds all of them (and maybe a few more).
+    """
+    import pyarrow as pa
+    import pyarrow.csv
+
+    try:
+        reader = pyarrow.csv.open_csv(f, read_options=pyarrow.csv.ReadOptions(use_threads=False))
+    except pa.ArrowInvalid:
+        # Let the full parse report the problem
+        return []
+    return [field.name for field in reader.schema if pa.types.is_temporal(field.type)]
+
+
+def _read_as_text(df, f, columns):
+    """Replace columns of df with their text in f, missing values as the C engine reads them"""
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv
+
+    table = pyarrow.csv.read_csv(f, convert_options=pyarrow.csv.ConvertOptions(
+        include_columns=columns,
+        column_types={col: pa.string() for col in columns},
+        null_values=PANDAS_NA_VALUES,
+        strings_can_be_null=True
+    ))
+    # The dtype the C engine gives text columns (str on pandas 3, object before)
+    text_dtype = pd.Series(['']).dtype
+    for col in columns:
+        values = pd.Series(table.column(col).to_numpy(zero_copy_only=False), index=df.index, dtype=object)
+        df[col] = values.where(values.notna(), np.nan).astype(text_dtype)
+
+
+def _entry_dir(csv_path, digest, options, cache_dir):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    tag = hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cache_dir, f'{stem}-{digest[:16]}-{tag}')
+
+
+def read_catalog(csv_path, comment=None, cache_dir=CACHE_DIR):
+    """Catalog frame for csv_path with fully empty rows removed, cached by content"""
+    if not cache_enabled():
+        return parse_csv(csv_path, comment=comment).dropna(how='all')
+
+    source = digest_stamp(csv_path)
+    # Parse options that change the frame are part of the key, and checked against the manifest
+    options = {'comment': comment}
+    entry = _entry_dir(csv_path, source['digest'], options, cache_dir)
+
+    if os.path.exists(os.path.join(entry, 'manifest.json')):
+        try:
+            return _read_entry(entry, options)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable catalog cache {entry}: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+
+    df = parse_csv(csv_path, comment=comment).dropna(how='all')
+
+    try:
+        _write_entry(df, entry, source, options)
+        _remove_stale_entries(csv_path, source['digest'], cache_dir)
+    except OSError as e:
+        print(f"Could not write catalog cache {entry}: {e}")
+
+    return df
+
+
+def _write_entry(df, entry, source, options):
+    """Write the frame to a temporary directory and rename it into place"""
+    import numpy as np
+
+    tmp_entry = f'{entry}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+
+    df = df.reset_index(drop=True)
+    manifest = {
+        'source': source,
+        'parse_options': options,
+        'columns': [str(col) for col in df.columns],
+        'n_rows': len(df)
+    }
+
+    if _has_pyarrow():
+        manifest['format'] = 'feather'
+        df.to_feather(os.path.join(tmp_entry, 'frame.feather'))
+    else:
+        manifest['format'] = 'npy'
+        manifest['numeric'] = []
+        for position, col in enumerate(df.columns):
+            values = df[col].to_numpy()
+            is_numeric = values.dtype.kind in 'biuf'
+            manifest['numeric'].append(is_numeric)
+            np.save(
+                os.path.join(tmp_entry, f'col_{position}.npy'),
+                values if is_numeric else values.astype(object),
+                allow_pickle=not is_numeric
+            )
+
+    with open(os.path.join(tmp_entry, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(entry):
+        # Another process finished the same entry first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    else:
+        os.rename(tmp_entry, entry)
+
+
+def _read_entry(entry, options):
+    import numpy as np
+    import pandas as pd
+
+    with open(os.path.join(entry, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('parse_options') != options:
+        raise ValueError(f"parsed with {manifest.get('parse_options')}, not {options}")
+
+    if manifest['format'] == 'feather':
+        import pyarrow.feather as feather
+        table = feather.read_table(os.path.join(entry, 'frame.feather'), memory_map=True)
+        return table.to_pandas()
+
+    columns = {}
+    for position, col in enumerate(manifest['columns']):
+        path = os.path.join(entry, f'col_{position}.npy')
+        if manifest['numeric'][position]:
+            columns[col] = np.load(path, mmap_mode='r')
+        else:
+            columns[col] = np.load(path, allow_pickle=True)
+    return pd.DataFrame(columns, columns=manifest['columns'])
+
+
+def _remove_stale_entries(csv_path, digest, cache_dir):
+    """Drop cache entries for earlier versions of the same CSV (entries of other parse options stay)"""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if (name.startswith(f'{stem}-') and not name.startswith(f'{stem}-{digest[:16]}-')
+                and not name.endswith('.tmp') and os.path.isdir(path)):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,140 @@
+"""
+Column statistics for the /api/columns endpoint.
+
+Statistics are computed with vectorized reductions over the numeric block
+of the frame and persisted as a small JSON sidecar keyed on the CSV
+fingerprint. Reading the sidecar needs neither pandas nor numpy, so a
+caller can answer without loading the catalog when the CSV is unchanged.
+"""
+
+import json
+import os
+import warnings
+
+from artifact_store import MODELS_DIR, digest_stamp, stamp_matches
+
+SIDECAR_NAME = 'column_stats.json'
+
+
+def sidecar_path(models_dir=MODELS_DIR):
+    return os.path.join(models_dir, SIDECAR_NAME)
+
+
+def compute_column_stats(df):
+    """Describe every column of df in the format returned by get_column_info"""
+    import numpy as np
+    import pandas as pd
+
+    numeric_columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    numeric_stats = {}
+
+    if numeric_columns:
+        block = df[numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        non_null = (~np.isnan(block)).sum(axis=0)
+
+        # All-NaN columns warn and yield NaN; they report no stats below
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mins = np.nanmin(block, axis=0)
+            maxs = np.nanmax(block, axis=0)
+            means = np.nanmean(block, axis=0)
+            medians = np.nanmedian(block, axis=0)
+
+        for i, col in enumerate(numeric_columns):
+            numeric_stats[col] = (int(non_null[i]), mins[i], maxs[i], means[i], medians[i])
+
+    columns_info = []
+    for col in df.columns:
+        if col in numeric_stats:
+            non_null_count = numeric_stats[col][0]
+        else:
+            non_null_count = int(df[col].notna().sum())
+
+        col_info = {
+            'name': col,
+            'type': str(df[col].dtype),
+            'non_null_count': non_null_count,
+            'null_count': int(len(df) - non_null_count),
+            'is_numeric': col in numeric_stats
+        }
+
+        if col_info['is_numeric'] and non_null_count > 0:
+            _, col_min, col_max, col_mean, col_median = numeric_stats[col]
+            col_info['min'] = float(col_min)
+            col_info['max'] = float(col_max)
+            col_info['mean'] = float(col_mean)
+            col_info['median'] = float(col_median)
+
+        columns_info.append(col_info)
+
+    return {'columns': columns_info}
+
+
+def update_column_stats(stats, df, start):
+    """Fold rows df[start:] into statistics previously computed for df[:start].
+
+    Counts, min, max and mean are merged from the new rows alone; a median
+    cannot be merged, so it is recomputed with a linear-time selection.
+    """
+    import numpy as np
+
+    previous = {info['name']: info for info in stats['columns']}
+    delta = compute_column_stats(df.iloc[start:])
+
+    columns_info = []
+    for info in delta['columns']:
+        col = info['name']
+        old = previous.get(col)
+        if old is None or old['is_numeric'] != info['is_numeric']:
+            columns_info.append(compute_column_stats(df[[col]])['columns'][0])
+            continue
+
+        non_null_count = old['non_null_count'] + info['non_null_count']
+        merged = {
+            'name': col,
+            'type': str(df[col].dtype),
+            'non_null_count': non_null_count,
+            'null_count': int(len(df) - non_null_count),
+            'is_numeric': info['is_numeric']
+        }
+
+        parts = [part for part in (old, info) if part['is_numeric'] and part['non_null_count'] > 0]
+        if parts:
+            merged['min'] = min(part['min'] for part in parts)
+            merged['max'] = max(part['max'] for part in parts)
+            merged['mean'] = sum(part['mean'] * part['non_null_count'] for part in parts) / non_null_count
+            merged['median'] = float(np.nanmedian(df[col].to_numpy(dtype=np.float64, na_value=np.nan)))
+
+        columns_info.append(merged)
+
+    return {'columns': columns_info}
+
+
+def load_sidecar(csv_path, path=None):
+    """Cached statistics for csv_path, or None when missing or stale"""
+    path = path or sidecar_path()
+    try:
+        with open(path, 'r') as f:
+            sidecar = json.load(f)
+        if not stamp_matches(sidecar.get('source', {}), csv_path):
+            return None
+    except (OSError, ValueError):
+        return None
+
+    return sidecar.get('stats')
+
+
+def save_sidecar(csv_path, stats, path=None, source=None):
+    """Persist statistics next to the model artifacts, keyed on the CSV content.
+
+    source is the digest stamp of the CSV version the statistics describe;
+    by default the file as it is now.
+    """
+    path = path or sidecar_path()
+    source = source or digest_stamp(csv_path)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': source, 'stats': stats}, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,129 @@
+"""
+Memory-lean dtype plan for loaded catalogs.
+
+By default every numeric column stays float64/int64 and strings stay
+Python objects. The lean plan, enabled with EXOPLANET_LEAN_DTYPES=1 or
+ExoplanetDataHandler(lean_dtypes=True), narrows the loaded frame:
+
+- float feature columns become float32, and the training matrix, the
+  scaler output and the forest input are float32 end to end (sklearn
+  trees split on float32 anyway)
+- integer columns without gaps (flags, counts) are downcast, e.g. to int8
+- low-cardinality string columns (dispositions, methods, the target)
+  become categoricals
+
+Set EXOPLANET_MEMORY_REPORT=1 to print the memory held after each
+loading and training stage.
+"""
+
+import os
+
+import numpy as np
+
+FEATURE_DTYPE = np.float32
+
+# A string column becomes categorical when it has at most this many
+# distinct values per row
+CATEGORY_MAX_RATIO = 0.5
+
+
+def lean_dtypes_enabled():
+    return os.environ.get('EXOPLANET_LEAN_DTYPES', '0') == '1'
+
+
+def memory_report_enabled():
+    return os.environ.get('EXOPLANET_MEMORY_REPORT', '0') == '1'
+
+
+def plan_dtypes(df, feature_columns, target_column=None):
+    """Column -> narrower dtype for the columns worth converting"""
+    import pandas as pd
+
+    features = set(feature_columns)
+    plan = {}
+
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+
+        if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            # Gap-free integers (flags, counts) stay exact in the smallest type;
+            # feature matrices built from them are still float32
+            narrowed = pd.to_numeric(series, downcast='integer').dtype
+            if narrowed.itemsize < dtype.itemsize:
+                plan[col] = narrowed
+        elif col in features:
+            if dtype != FEATURE_DTYPE:
+                plan[col] = FEATURE_DTYPE
+        elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            n_unique = series.nunique(dropna=True)
+            if col == target_column or n_unique <= len(series) * CATEGORY_MAX_RATIO:
+                plan[col] = 'category'
+
+    return plan
+
+
+def apply_plan(df, plan):
+    """Convert df in place according to plan and return it"""
+    for col, dtype in plan.items():
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def float32_columns(df):
+    return [col for col in df.columns if df[col].dtype == np.float32]
+
+
+def display_record(record, columns):
+    """Shortest decimal form of float32 values, so 0.1 is shown as 0.1"""
+    for col in columns:
+        value = record.get(col)
+        if value is not None and value == value:
+            record[col] = float(str(np.float32(value)))
+    return record
+
+
+def nbytes(obj):
+    """Bytes held by a frame (strings included), array or index-like object"""
+    if obj is None:
+        return 0
+    if hasattr(obj, 'memory_usage'):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    return 0
+
+
+class MemoryReport:
+    def __init__(self, enabled=None):
+        self.enabled = memory_report_enabled() if enabled is None else enabled
+        self.stages = []
+
+    def record(self, stage, **objects):
+        """Note the bytes held by the named objects after a stage"""
+        if not self.enabled:
+            return
+        sizes = {name: nbytes(obj) for name, obj in objects.items()}
+        self.stages.append({
+            'stage': stage,
+            'bytes': sum(sizes.values()),
+            'objects': sizes,
+            'rss_kb': _resident_kb()
+        })
+
+    def print(self):
+        for entry in self.stages:
+            parts = ', '.join(f"{name}={size / 1e6:.2f} MB" for name, size in entry['objects'].items())
+            print(f"Memory after {entry['stage']}: {entry['bytes'] / 1e6:.2f} MB ({parts}); "
+                  f"RSS {entry['rss_kb'] / 1024:.1f} MB")
+
+
+def _resident_kb():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
@@ -0,0 +1,138 @@
+"""
+Pluggable classifiers for the training and serving paths.
+
+A backend builds an unfitted estimator and wraps a fitted one in a
+serving engine with predict_with_proba(X) -> (probabilities, classes).
+Tree ensembles are served through FlatForest; other estimators through
+their own predict_proba.
+
+    random_forest           the default forest (training.FOREST_PARAMS)
+    small_forest            30 trees of depth 8: a fraction of the nodes to walk
+    extra_trees             randomized splits, same size as the default forest
+    hist_gradient_boosting  binned gradient boosting, one tree per class per iteration
+
+The handler picks its backend from EXOPLANET_BACKEND (or its backend
+argument). Only forests can be grown in place when rows are appended;
+the other backends retrain.
+"""
+
+import os
+
+import numpy as np
+
+DEFAULT_BACKEND = 'random_forest'
+BACKEND_ENV = 'EXOPLANET_BACKEND'
+
+SMALL_FOREST_PARAMS = {'n_estimators': 30, 'max_depth': 8}
+GRADIENT_BOOSTING_PARAMS = {'max_iter': 200, 'learning_rate': 0.1, 'early_stopping': False}
+
+
+class ProbaEngine:
+    """Serving engine for estimators without a flattened form"""
+
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+
+    def predict_with_proba(self, X):
+        proba = self.model.predict_proba(np.atleast_2d(X))
+        return proba, self.classes_[np.argmax(proba, axis=1)]
+
+    def predict_proba(self, X):
+        return self.predict_with_proba(X)[0]
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[1]
+
+
+class EstimatorBackend:
+    name = None
+    description = None
+    # Random-forest-style ensembles: served by FlatForest and grown with extra
+    # trees for appended rows (incremental.grow_forest)
+    forest = False
+
+    def build(self, random_state=42, **overrides):
+        """Unfitted estimator; overrides the estimator does not accept are ignored"""
+        raise NotImplementedError
+
+    def engine(self, model):
+        return ProbaEngine(model)
+
+
+class RandomForestBackend(EstimatorBackend):
+    name = 'random_forest'
+    description = 'random forest (shared defaults)'
+    forest = True
+
+    def build(self, random_state=42, **overrides):
+        from training import make_forest
+        return make_forest(random_state, **overrides)
+
+    def engine(self, model):
+        from forest_engine import FlatForest
+        return FlatForest.from_forest(model)
+
+
+class SmallForestBackend(RandomForestBackend):
+    name = 'small_forest'
+    description = 'random forest, 30 trees of depth 8'
+
+    def build(self, random_state=42, **overrides):
+        from sklearn.ensemble import RandomForestClassifier
+        from training import forest_params
+
+        # The size is what this backend is about; it wins over a selected search result
+        return RandomForestClassifier(**dict(forest_params(random_state, **overrides), **SMALL_FOREST_PARAMS))
+
+
+class ExtraTreesBackend(RandomForestBackend):
+    name = 'extra_trees'
+    description = 'extremely randomized trees'
+
+    def build(self, random_state=42, **overrides):
+        from sklearn.ensemble import ExtraTreesClassifier
+        from training import forest_params
+        return ExtraTreesClassifier(**forest_params(random_state, **overrides))
+
+
+class HistGradientBoostingBackend(EstimatorBackend):
+    name = 'hist_gradient_boosting'
+    description = 'histogram gradient boosting'
+
+    def build(self, random_state=42, **overrides):
+        from sklearn.ensemble import HistGradientBoostingClassifier
+
+        accepted = HistGradientBoostingClassifier().get_params()
+        params = dict(GRADIENT_BOOSTING_PARAMS, random_state=random_state)
+        params.update((key, value) for key, value in overrides.items() if key in accepted)
+        return HistGradientBoostingClassifier(**params)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (RandomForestBackend(), SmallForestBackend(), ExtraTreesBackend(),
+                    HistGradientBoostingBackend())
+}
+
+
+def get_backend(name=None):
+    """Backend by name; EXOPLANET_BACKEND or the default when name is None"""
+    name = name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown estimator backend '{name}' (available: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def engine_for(model):
+    """Serving engine for a fitted model whose backend is not recorded"""
+    try:
+        return BACKENDS[DEFAULT_BACKEND].engine(model)
+    except (AttributeError, ValueError):
+        return ProbaEngine(model)
+
+
+def tree_count(model):
+    """Trees in a fitted ensemble, or None for estimators that are not forests"""
+    estimators = getattr(model, 'estimators_', None)
+    return None if estimators is None else len(estimators)
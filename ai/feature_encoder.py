@@ -0,0 +1,100 @@
+"""
+Feature encoder shared by every inference path.
+
+Built once at load/train time from the feature column order, a vector of
+fill values for missing inputs and the fitted scaler, it turns request
+dicts (or frames of rows) into ready, scaled NumPy rows without scanning
+the catalog per request.
+"""
+
+import numpy as np
+
+
+class FeatureEncoder:
+    def __init__(self, feature_columns, fill_values, mean=None, scale=None, input_keys=None):
+        self.feature_columns = list(feature_columns)
+        self.fill_values = np.asarray(fill_values, dtype=np.float64)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+        # Input key -> column position; input_keys maps request keys to column names
+        column_positions = {col: i for i, col in enumerate(self.feature_columns)}
+        if input_keys is None:
+            self.positions = column_positions
+        else:
+            self.positions = {
+                key: column_positions[col]
+                for key, col in input_keys.items()
+                if col in column_positions
+            }
+
+    @classmethod
+    def from_scaler(cls, feature_columns, fill_values, scaler, input_keys=None):
+        """Fold a fitted StandardScaler's mean and scale into the encoder"""
+        return cls(
+            feature_columns, fill_values,
+            mean=getattr(scaler, 'mean_', None),
+            scale=getattr(scaler, 'scale_', None),
+            input_keys=input_keys
+        )
+
+    @property
+    def n_features(self):
+        return len(self.feature_columns)
+
+    def raw_row(self, user_inputs):
+        """Unscaled 1 x n_features row, missing inputs taken from the fill vector"""
+        row = self.fill_values.copy()
+        for key, value in user_inputs.items():
+            position = self.positions.get(key)
+            if position is not None:
+                row[position] = float(value)
+        return row.reshape(1, -1)
+
+    def raw_rows(self, inputs_list):
+        """Unscaled rows for a list of input dicts"""
+        rows = np.tile(self.fill_values, (len(inputs_list), 1))
+        for i, user_inputs in enumerate(inputs_list):
+            for key, value in user_inputs.items():
+                position = self.positions.get(key)
+                if position is not None:
+                    rows[i, position] = float(value)
+        return rows
+
+    def raw_frame(self, frame):
+        """Vectorized raw_rows over a DataFrame of inputs.
+
+        Returns the matrix and a mask of rows with provided values that do not
+        parse as numbers (raw_row would raise for those).
+        """
+        import pandas as pd
+
+        rows = np.tile(self.fill_values, (len(frame), 1))
+        invalid = np.zeros(len(frame), dtype=bool)
+
+        for key, position in self.positions.items():
+            if key not in frame.columns:
+                continue
+            values = pd.to_numeric(frame[key], errors='coerce').to_numpy(dtype=np.float64)
+            unparsed = np.isnan(values)
+            invalid |= frame[key].notna().to_numpy() & unparsed
+            rows[:, position] = np.where(unparsed, self.fill_values[position], values)
+
+        return rows, invalid
+
+    def scale_rows(self, rows):
+        """Apply the folded scaler, exactly as StandardScaler.transform would"""
+        rows = np.array(rows, dtype=np.float64)
+        if self.mean is not None:
+            rows -= self.mean
+        if self.scale is not None:
+            rows /= self.scale
+        return rows
+
+    def encode(self, user_inputs):
+        """Scaled 1 x n_features row for one request"""
+        return self.scale_rows(self.raw_row(user_inputs))
+
+    def encode_many(self, inputs_list):
+        """Scaled rows for a batch of requests"""
+        return self.scale_rows(self.raw_rows(inputs_list))
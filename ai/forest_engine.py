@@ -0,0 +1,219 @@
+"""
+Flattened random forest inference.
+
+Exports a fitted sklearn forest into contiguous node arrays (feature,
+threshold, children, leaf class distributions) and walks every tree for
+a whole batch of rows at once with NumPy, returning the class
+probabilities and the argmax class in a single pass. Single-row calls
+avoid sklearn's per-call validation and thread dispatch.
+
+Trees only compare one feature against a threshold per node, so a
+StandardScaler can optionally be folded into the thresholds and raw
+(unscaled) rows fed directly. Scaling and the float32 cast sklearn
+applies are monotonic, so every split has one raw float64 cutoff that
+sends exactly the rows sklearn sends left; fold_scaler finds it by
+bisecting float64 values, and the folded engine matches sklearn too.
+"""
+
+import numpy as np
+
+BATCH_CHUNK_ROWS = 4096
+
+_SIGN_BIT = np.int64(-2 ** 63)
+_ABS_MASK = np.int64(2 ** 63 - 1)
+# Ordered keys of -inf and +inf (see _float_keys)
+_KEY_MIN = -np.int64(0x7FF0000000000000)
+_KEY_MAX = np.int64(0x7FF0000000000000)
+
+
+def _float_keys(values):
+    """Integers ordered like the float64 values; consecutive floats get consecutive keys"""
+    bits = np.asarray(values, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, -(bits & _ABS_MASK), bits)
+
+
+def _key_floats(keys):
+    return np.where(keys < 0, (-keys) | _SIGN_BIT, keys).view(np.float64)
+
+
+def fold_scaler(threshold, feature, mean, scale):
+    """Raw float64 cutoffs T with: x <= T  <=>  float32((x - mean) / scale) <= threshold.
+
+    The right-hand side is what sklearn evaluates for a StandardScaler
+    followed by a tree. It is monotonic in x, so the largest x that
+    satisfies it is found by bisecting the ordered float64 keys, starting
+    from a bracket around threshold * scale + mean.
+    """
+    mean = mean[feature]
+    scale = scale[feature]
+
+    def goes_left(keys):
+        return ((_key_floats(keys) - mean) / scale).astype(np.float32) <= threshold
+
+    estimate = _float_keys(threshold * scale + mean)
+    # lo goes left and hi goes right; widen the bracket until that holds
+    lo, hi = estimate.copy(), estimate + 1
+    step = np.int64(1)
+    while True:
+        low_right = ~goes_left(lo) & (lo > _KEY_MIN)
+        high_left = goes_left(hi) & (hi < _KEY_MAX)
+        if not (low_right.any() or high_left.any()):
+            break
+        lo = np.where(low_right, np.maximum(lo - step, _KEY_MIN), lo)
+        hi = np.where(high_left, np.minimum(hi + step, _KEY_MAX), hi)
+        step *= 2
+
+    while True:
+        open_ = hi - lo > 1
+        if not open_.any():
+            break
+        mid = lo + (hi - lo) // 2
+        left = goes_left(mid)
+        lo = np.where(open_ & left, mid, lo)
+        hi = np.where(open_ & ~left, mid, hi)
+    return _key_floats(lo)
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes,
+                 folded_scaler=False):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self.children = np.stack([left, right], axis=1).ravel()
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.folded_scaler = folded_scaler
+
+    @classmethod
+    def from_forest(cls, forest, scaler=None):
+        """Export a fitted RandomForest/ExtraTrees classifier.
+
+        With a scaler, thresholds are mapped back to raw feature units so
+        rows can be passed unscaled (as float64, the way they would reach
+        scaler.transform). Either way the engine matches sklearn exactly.
+        """
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point at themselves so every row can take max_depth steps
+            left = np.where(is_leaf, nodes, tree.children_left) + offset
+            right = np.where(is_leaf, nodes, tree.children_right) + offset
+            feature = np.where(is_leaf, 0, tree.feature)
+            threshold = np.where(is_leaf, 0.0, tree.threshold)
+
+            # Leaf class distributions, normalized as DecisionTreeClassifier.predict_proba does
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0.0] = 1.0
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value / totals)
+            roots.append(offset)
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        feature = np.concatenate(features).astype(np.intp)
+        threshold = np.concatenate(thresholds)
+
+        folded = scaler is not None
+        if folded:
+            n_features = forest.n_features_in_
+            mean = scaler.mean_ if getattr(scaler, 'with_mean', True) else None
+            scale = scaler.scale_ if getattr(scaler, 'with_std', True) else None
+            threshold = fold_scaler(
+                threshold, feature,
+                np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+                np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+            )
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(forest.classes_),
+            folded_scaler=folded
+        )
+
+    def save(self, path, **arrays):
+        """Write the node arrays, plus any extra named arrays, to an .npz file.
+
+        Loading it back needs only NumPy, not scikit-learn.
+        """
+        np.savez(
+            path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+            value=self.value, roots=self.roots, max_depth=np.asarray(self.max_depth),
+            classes=self.classes_, folded_scaler=np.asarray(self.folded_scaler), **arrays
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Engine saved with save(), and a dict of the extra arrays saved with it"""
+        names = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'max_depth', 'classes',
+                 'folded_scaler')
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        engine = cls(
+            feature=arrays['feature'], threshold=arrays['threshold'], left=arrays['left'],
+            right=arrays['right'], value=arrays['value'], roots=arrays['roots'],
+            max_depth=int(arrays['max_depth']), classes=arrays['classes'],
+            folded_scaler=bool(arrays['folded_scaler'])
+        )
+        return engine, {name: value for name, value in arrays.items() if name not in names}
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _leaves(self, X):
+        """Leaf node reached by every row in every tree, shape (n_rows, n_trees)"""
+        flat = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+        nodes = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            values = np.take(flat, row_offsets + np.take(self.feature, nodes))
+            # A failed comparison (including NaN) takes the right child
+            go_right = ~(values <= np.take(self.threshold, nodes))
+            nodes = np.take(self.children, 2 * nodes + go_right)
+        return nodes
+
+    def predict_with_proba(self, X):
+        """Class probabilities and predicted classes for a batch of rows"""
+        X = np.atleast_2d(np.asarray(X))
+        # sklearn trees compare float32 features against float64 thresholds;
+        # folded thresholds already account for that cast and take raw float64 rows
+        X = X.astype(np.float64 if self.folded_scaler else np.float32)
+
+        proba = np.empty((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], BATCH_CHUNK_ROWS):
+            leaves = self._leaves(X[start:start + BATCH_CHUNK_ROWS])
+            proba[start:start + BATCH_CHUNK_ROWS] = self.value[leaves].sum(axis=1) / self.n_estimators
+
+        return proba, self.classes_[np.argmax(proba, axis=1)]
+
+    def predict_proba(self, X):
+        return self.predict_with_proba(X)[0]
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[1]
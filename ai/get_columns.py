@@ -1,23 +1,16 @@
-import sys
 import json
-from new_exoplanet_system import data_handler, get_columns
+from analysis_worker import encode_json
+from inference import columns
+from profiling import profile
 
 def main():
     try:
-        # Initialize the system if not already done
-        if not data_handler.df is not None:
-            if not data_handler.load_data():
-                print(json.dumps({
-                    "error": "Failed to load data",
-                    "columns": []
-                }))
-                return
-        
-        # Get column information
-        result = get_columns()
+        # Persisted statistics, then a running analysis worker, then in-process loading
+        with profile('get_columns'):
+            result = columns()
         
         # Output result as JSON
-        print(json.dumps(result))
+        print(encode_json(result))
         
     except Exception as e:
         print(json.dumps({
@@ -0,0 +1,117 @@
+"""
+Incremental updates for a training CSV that only grows.
+
+After a load the handler records the file's size and content digest. On a
+change, hashing the first `size` bytes of the new file tells whether the
+old content is an untouched prefix (rows were appended) or the file was
+edited. Appended rows are parsed on their own, without re-reading the
+catalog, and a copy of the fitted forest is grown with extra trees
+trained on them plus a stratified replay sample of earlier rows, so every
+tree sees every class and the new data carries weight in proportion to
+its size.
+"""
+
+import copy
+import hashlib
+import io
+import math
+import os
+
+import numpy as np
+
+from artifact_store import digest_stamp
+
+# Appends larger than this fraction of the catalog retrain from scratch
+MAX_APPEND_FRACTION = 0.5
+
+# Retrain from scratch once appended trees would grow the forest past this
+# multiple of its size after the last full training
+MAX_FOREST_GROWTH = 2.0
+
+
+def source_state(path):
+    """What classify_change needs to know about the file as it was loaded"""
+    state = digest_stamp(path)
+    with open(path, 'rb') as f:
+        if state['size'] > 0:
+            f.seek(state['size'] - 1)
+        state['ends_with_newline'] = f.read(1) == b'\n'
+    return state
+
+
+def prefix_digest(path, length, chunk_size=1 << 20):
+    """SHA-256 of the first length bytes of a file"""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def classify_change(path, previous):
+    """'unchanged', 'append' (old content is a prefix) or 'rewrite'"""
+    size = os.path.getsize(path)
+    if size == previous['size']:
+        return 'unchanged' if digest_stamp(path)['digest'] == previous['digest'] else 'rewrite'
+    if size < previous['size'] or not previous['ends_with_newline']:
+        return 'rewrite'
+    if prefix_digest(path, previous['size']) != previous['digest']:
+        return 'rewrite'
+    return 'append'
+
+
+def read_appended_rows(path, previous):
+    """Rows written after the previous load, or None while the last row is still partial"""
+    import pandas as pd
+
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(previous['size'])
+        tail = f.read()
+
+    if not tail.endswith(b'\n'):
+        return None
+
+    if not tail.strip():
+        return pd.DataFrame(columns=pd.read_csv(io.BytesIO(header)).columns)
+    return pd.read_csv(io.BytesIO(header + tail))
+
+
+def trees_for_append(n_estimators, n_rows, n_new_rows):
+    """Extra trees keeping the trees-per-row ratio of the current forest"""
+    return max(1, math.ceil(n_estimators * n_new_rows / max(1, n_rows)))
+
+
+def replay_sample(y_old, size, seed):
+    """Positions of earlier rows to train new trees on, at least one per class"""
+    rng = np.random.default_rng(seed)
+    classes = np.unique(y_old)
+    positions = [rng.choice(np.flatnonzero(y_old == label)) for label in classes]
+
+    size = min(len(y_old), max(size, len(positions)))
+    remaining = np.setdiff1d(np.arange(len(y_old)), positions, assume_unique=True)
+    extra = rng.choice(remaining, size - len(positions), replace=False)
+    return np.sort(np.concatenate([np.asarray(positions, dtype=np.intp), extra]))
+
+
+def grow_forest(model, X, y, n_trees, random_state):
+    """Copy of a fitted forest with n_trees more trees fitted on (X, y).
+
+    The original forest is not modified, so it can keep serving requests.
+    """
+    from sklearn.base import clone
+
+    extra = clone(model).set_params(n_estimators=n_trees, random_state=random_state, warm_start=False)
+    extra.fit(X, y)
+    if not np.array_equal(extra.classes_, model.classes_):
+        raise ValueError("Appended rows do not cover the forest's classes")
+
+    grown = copy.copy(model)
+    grown.estimators_ = model.estimators_ + extra.estimators_
+    grown.n_estimators = len(grown.estimators_)
+    return grown
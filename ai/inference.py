@@ -0,0 +1,95 @@
+"""
+Inference-only entry point for the per-request CLIs.
+
+Importing this module loads nothing beyond the standard library and
+builds nothing. Each call imports only what it needs, on first use:
+
+- classify() / classify_batch() score KOI candidates with the model from
+  train_exoplanet_model.py (see predict.py). With the serving bundle
+  that script writes, this needs NumPy only: no pandas, no scikit-learn,
+  no unpickling.
+- analyze() and columns() answer catalog requests. They go to a running
+  analysis worker when one is reachable and otherwise load the catalog
+  and model in this process (new_exoplanet_system). columns() first
+  tries the statistics sidecar persisted for the current CSV.
+
+Training dependencies (train_test_split, metrics, watchdog, plotting)
+are never imported on these paths.
+
+Stages run under an instrumentation.request() with timings enabled are
+recorded in its timings block, including those a worker timed.
+"""
+
+import contextlib
+import os
+import sys
+
+import instrumentation
+
+
+def classify(input_data):
+    """Classification for one candidate dict, as predict.py prints it"""
+    from predict import predict_exoplanet
+    return predict_exoplanet(input_data)
+
+
+def classify_batch(frame):
+    """Classification for every row of a DataFrame of candidates"""
+    from predict import predict_batch
+    return predict_batch(frame)
+
+
+def analyze(user_inputs, selected_columns, timings=False):
+    """Exact match or ML analysis of one candidate against the catalog"""
+    from analysis_worker import try_worker_request
+
+    options = {'timings': True} if timings else {}
+    result = try_worker_request('analyze', user_inputs=user_inputs, selected_columns=selected_columns, **options)
+    if result is not None:
+        if isinstance(result, dict) and 'timings' in result:
+            result = dict(result)
+            instrumentation.record_remote(result.pop('timings'))
+        return result
+
+    # Keep stdout reserved for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        from new_exoplanet_system import prepare_system, analyze_exoplanet
+
+        error = prepare_system()
+        if error:
+            return {
+                "error": error,
+                "type": "error"
+            }
+
+        return analyze_exoplanet(user_inputs, selected_columns)
+
+
+def columns():
+    """Column descriptions of the catalog"""
+    from artifact_store import DEFAULT_CSV_PATH
+    from column_stats import load_sidecar
+
+    # Statistics persisted for the current CSV need no pandas at all
+    result = load_sidecar(DEFAULT_CSV_PATH) if os.path.exists(DEFAULT_CSV_PATH) else None
+    if result is not None:
+        return result
+
+    from analysis_worker import try_worker_request
+
+    result = try_worker_request('columns')
+    if result is not None:
+        return result
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from new_exoplanet_system import get_data_handler
+
+        data_handler = get_data_handler()
+        if data_handler.df is None:
+            if not data_handler.load_data():
+                return {
+                    "error": "Failed to load data",
+                    "columns": []
+                }
+
+        return data_handler.get_column_info()
@@ -0,0 +1,325 @@
+"""
+Per-request stage timings and process-wide metrics.
+
+Stages (load, train, load_model, encode, exact_match, knn, classify,
+serialize) are timed with stage() or the timed() decorator. Every stage
+is observed in a latency histogram; when the surrounding request asked
+for timings (request(..., enabled=True), or EXOPLANET_TIMINGS=1), it is
+also added to that request's timings block, which encode_timed() appends
+to the response:
+
+    "timings": {"total_ms": 2.41, "stages": {"exact_match": 0.52, "encode": 0.03, ...}}
+
+A batch that serves several requests at once (micro_batch.py) runs under
+batch_stages(): its stages are held per request, each attributed to the
+requests it served (serving()), and recorded for every one of those
+requests once it has its result, so timings and histograms mean the same
+with and without batching.
+
+Counters, gauges and histograms are kept per process and rendered in
+the Prometheus text exposition format by render_metrics(). The analysis
+worker serves them on its metrics op, over HTTP (--metrics-port) or as
+a file rewritten periodically (--metrics-file / EXOPLANET_METRICS_FILE)
+for the node exporter's textfile collector.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+TIMINGS_ENV = 'EXOPLANET_TIMINGS'
+METRICS_FILE_ENV = 'EXOPLANET_METRICS_FILE'
+
+# Seconds; request paths are sub-millisecond to tens of milliseconds, loads and training seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+_active_timings = contextvars.ContextVar('exoplanet_request_timings', default=None)
+# (RequestTimings per request of the running batch, positions the current stage serves)
+_batch_attribution = contextvars.ContextVar('exoplanet_batch_attribution', default=None)
+
+
+def timings_enabled():
+    return os.environ.get(TIMINGS_ENV, '0') == '1'
+
+
+class RequestTimings:
+    """Stage durations of one request, summed per stage in first-seen order"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'stages': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        }
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_label_text(dict(labels, le=_number(bound)))} {cumulative}'
+        yield f'{name}_sum{_label_text(labels)} {_number(self.sum)}'
+        yield f'{name}_count{_label_text(labels)} {self.count}'
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms, keyed by name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help, {label tuple: value or Histogram})
+        self._families = {}
+
+    def _series(self, kind, name, help_text, labels):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, {})
+        return family[2], tuple(sorted(labels.items()))
+
+    def inc(self, name, help_text='', amount=1, **labels):
+        with self._lock:
+            series, key = self._series('counter', name, help_text, labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, help_text='', **labels):
+        with self._lock:
+            series, key = self._series('gauge', name, help_text, labels)
+            series[key] = value
+
+    def observe(self, name, value, help_text='', buckets=DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            series, key = self._series('histogram', name, help_text, labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._families):
+                kind, help_text, series = self._families[name]
+                if help_text:
+                    lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for key in sorted(series):
+                    labels = dict(key)
+                    if kind == 'histogram':
+                        lines.extend(series[key].lines(name, labels))
+                    else:
+                        lines.append(f'{name}{_label_text(labels)} {_number(series[key])}')
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every module in the process
+metrics = Metrics()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a stage into the stage histogram and the active request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name, seconds):
+    """Add a stage measured elsewhere (another thread) to the histogram and the active request"""
+    attribution = _batch_attribution.get()
+    if attribution is not None:
+        requests, positions = attribution
+        for position in positions:
+            requests[position].add(name, seconds)
+        return
+    metrics.observe('exoplanet_stage_seconds', seconds, 'Time spent per analysis stage', stage=name)
+    timings = _active_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextlib.contextmanager
+def batch_stages(n_requests):
+    """Hold the stages run in this context for the n_requests requests of a batch.
+
+    Yields one RequestTimings per request; stages go to every request
+    unless serving() narrows them. Nothing is observed here: the caller
+    passes each request's stages to record_stage() in that request's own
+    context.
+    """
+    requests = [RequestTimings() for _ in range(n_requests)]
+    token = _batch_attribution.set((requests, range(n_requests)))
+    try:
+        yield requests
+    finally:
+        _batch_attribution.reset(token)
+
+
+@contextlib.contextmanager
+def serving(positions):
+    """Attribute the stages in this context to these requests of the running batch only"""
+    attribution = _batch_attribution.get()
+    if attribution is None:
+        yield
+        return
+    token = _batch_attribution.set((attribution[0], list(positions)))
+    try:
+        yield
+    finally:
+        _batch_attribution.reset(token)
+
+
+def timed(name):
+    """Decorator form of stage()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def request(op, enabled=None):
+    """Count and time one request; yields its RequestTimings when timings were asked for"""
+    timings = RequestTimings() if (timings_enabled() if enabled is None else enabled) else None
+    token = _active_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        _active_timings.reset(token)
+        metrics.observe('exoplanet_request_seconds', time.perf_counter() - start,
+                        'Request latency, excluding response serialization', op=op)
+
+
+def count_result(op, result):
+    """Count a finished request by the type of its result"""
+    outcome = result.get('type', 'error' if 'error' in result else 'ok') if isinstance(result, dict) else 'ok'
+    metrics.inc('exoplanet_requests_total', 'Requests by operation and result type', op=op, outcome=outcome)
+
+
+def record_remote(remote):
+    """Add stages timed by another process (a worker) to the active request's timings"""
+    timings = _active_timings.get()
+    if timings is not None and isinstance(remote, dict):
+        for name, ms in remote.get('stages', {}).items():
+            timings.add(name, ms / 1000)
+
+
+def encode_timed(result, timings, encode):
+    """Encode result with encode(); with timings, time it as serialize and append the timings block"""
+    if timings is None:
+        return encode(result)
+    start = time.perf_counter()
+    body = encode(result)
+    elapsed = time.perf_counter() - start
+    timings.add('serialize', elapsed)
+    metrics.observe('exoplanet_stage_seconds', elapsed, 'Time spent per analysis stage', stage='serialize')
+    if not body.endswith('}'):
+        return body
+    # Spliced in rather than set on result, which may be a cached object
+    separator = ', ' if body != '{}' else ''
+    return body[:-1] + separator + '"timings": ' + json.dumps(timings.as_dict()) + '}'
+
+
+def render_metrics():
+    return metrics.render()
+
+
+def write_metrics(path, render=render_metrics):
+    """Write the metrics file atomically, so a scraper never reads half of it"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+def start_metrics_writer(path, interval=10.0, stop_event=None, render=render_metrics):
+    """Rewrite the metrics file every interval seconds from a daemon thread"""
+    stop_event = stop_event or threading.Event()
+
+    def _loop():
+        while True:
+            try:
+                write_metrics(path, render)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e}")
+            if stop_event.wait(interval):
+                break
+
+    thread = threading.Thread(target=_loop, name='metrics-writer', daemon=True)
+    thread.start()
+    # The last counts survive a clean shutdown
+    atexit.register(write_metrics, path, render)
+    return thread
+
+
+def start_metrics_server(port, host='127.0.0.1', render=render_metrics):
+    """Serve GET /metrics over HTTP from a daemon thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
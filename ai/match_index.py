@@ -0,0 +1,139 @@
+"""
+Exact-match index over the loaded catalog.
+
+Numeric columns keep a sorted copy of their values so a lookup is a pair
+of binary searches per input instead of a full-column scan; string
+columns are grouped by value the first time they are queried.
+
+Given a directory, the numeric arrays are written there and mapped back
+read-only, so a streamed catalog (see streaming.py) is indexed without
+holding its sorted columns in memory.
+"""
+
+import copy
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+# Numeric inputs match when |value - input| < MATCH_TOLERANCE
+MATCH_TOLERANCE = 1e-6
+
+
+def _is_mapped(array):
+    """Whether array is a view of a memory-mapped file"""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def _mapped(directory, name, array):
+    """array written to directory/name.npy and mapped back read-only"""
+    path = os.path.join(directory, f'{name}.npy')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+
+class ExactMatchIndex:
+    def __init__(self, df, directory=None):
+        self.n_rows = len(df)
+        self.columns = set(df.columns)
+        self._df = df
+        self._numeric = {}
+        self._categorical = {}
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        for position, col in enumerate(df.columns):
+            if pd.api.types.is_numeric_dtype(df[col]):
+                values, order, sorted_values, precision = self._index_numeric(df[col])
+                if directory is not None:
+                    # Values already mapped (a streamed column) are not written again
+                    if not _is_mapped(values):
+                        values = _mapped(directory, f'{position}_values', values)
+                    order = _mapped(directory, f'{position}_order', order)
+                    sorted_values = _mapped(directory, f'{position}_sorted', sorted_values)
+                self._numeric[col] = values, order, sorted_values, precision
+
+    @staticmethod
+    def _index_numeric(series, start=0, previous=None):
+        """Values, row order and sorted values of a column (rows from start on merged into previous)"""
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = start + np.flatnonzero(~np.isnan(values[start:]))
+        order = valid[np.argsort(values[valid], kind='stable')]
+
+        if previous is not None:
+            # Merge the new rows into the already sorted ones instead of re-sorting everything
+            _, old_order, old_sorted, _ = previous
+            at = np.searchsorted(old_sorted, values[order], side='right')
+            order = np.insert(old_order, at, order)
+
+        # float32 columns compare the input rounded to float32, as it was stored
+        precision = np.float32 if series.dtype == np.float32 else np.float64
+        return values, order, values[order], precision
+
+    def extended(self, df):
+        """New index over df, whose first rows are the ones indexed here (held in memory)"""
+        start = self.n_rows
+        index = copy.copy(self)
+        index.n_rows = len(df)
+        index.columns = set(df.columns)
+        index._df = df
+        index._numeric = {}
+        index._categorical = {}
+
+        for col in df.columns:
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            if col in self._numeric:
+                index._numeric[col] = self._index_numeric(df[col], start, self._numeric[col])
+            else:
+                index._numeric[col] = self._index_numeric(df[col])
+        return index
+
+    def candidates(self, col, value):
+        """Sorted row positions whose value in col matches the input"""
+        if col in self._numeric:
+            values, order, sorted_values, precision = self._numeric[col]
+            target = float(precision(value))
+
+            # Search a slightly wider window, then apply the exact tolerance test
+            lo = np.searchsorted(sorted_values, target - 2 * MATCH_TOLERANCE, side='left')
+            hi = np.searchsorted(sorted_values, target + 2 * MATCH_TOLERANCE, side='right')
+            positions = order[lo:hi]
+            positions = positions[np.abs(values[positions] - target) < MATCH_TOLERANCE]
+            return np.sort(positions)
+
+        groups = self._categorical.get(col)
+        if groups is None:
+            strings = self._df[col].astype(str)
+            groups = strings.groupby(strings.to_numpy(), sort=False).indices
+            self._categorical[col] = groups
+        return groups.get(str(value), np.empty(0, dtype=np.intp))
+
+    def lookup(self, user_inputs):
+        """Position of the first row matching every known input column, or None"""
+        matches = [
+            self.candidates(col, value)
+            for col, value in user_inputs.items()
+            if col in self.columns
+        ]
+
+        if not matches:
+            # No usable constraints: every row matches, as with an all-True mask
+            return 0 if self.n_rows else None
+
+        matches.sort(key=len)
+        result = matches[0]
+        for other in matches[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+
+        return int(result[0]) if len(result) else None
@@ -0,0 +1,165 @@
+"""
+Micro-batching of concurrent requests.
+
+A single analysis request scales one row and runs the forest and the
+neighbour query on a 1 x n_features matrix, so per-call overhead (Python
+dispatch, small-array setup) costs more than the arithmetic. Under
+concurrent load MicroBatcher collects requests into batches instead: a
+batch opens when a request arrives and closes after max_wait seconds or
+at max_batch requests, whichever comes first. One batch function call
+(new_exoplanet_system.analyze_exoplanet_batch: one forest pass and one
+neighbour query for all rows) serves the whole batch, and every caller
+gets its own result back.
+
+max_wait trades latency for throughput: every request can wait up to
+that long for company. With max_wait=0 a batch is whatever queued up
+while the previous one ran, so an idle server adds no delay and a busy
+one still batches.
+
+The queue is observable through the process metrics (instrumentation.py):
+
+    exoplanet_batch_queue_depth{batcher=...}     requests waiting, sampled at submit and batch start
+    exoplanet_batch_size{batcher=...}            histogram of requests per batch
+    exoplanet_batch_wait_seconds{batcher=...}    histogram of time from submit to batch start
+
+Each request's timings get a batch_wait stage, plus the stages the batch
+function ran for it (instrumentation.batch_stages): its own exact match
+and encoding, and the neighbour query and forest pass it shared, just
+as an unbatched request records them.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import instrumentation
+
+BATCH_WAIT_ENV = 'EXOPLANET_BATCH_WAIT_MS'
+MAX_BATCH_ENV = 'EXOPLANET_MAX_BATCH'
+DEFAULT_MAX_WAIT = 0.002
+DEFAULT_MAX_BATCH = 256
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def batch_wait_from_env():
+    """EXOPLANET_BATCH_WAIT_MS in seconds, or None (batching off) when unset"""
+    setting = os.environ.get(BATCH_WAIT_ENV)
+    return None if setting in (None, '') else float(setting) / 1000
+
+
+def max_batch_from_env():
+    return int(os.environ.get(MAX_BATCH_ENV, DEFAULT_MAX_BATCH))
+
+
+class _Pending:
+    __slots__ = ('payload', 'future', 'submitted', 'started', 'finished', 'stages')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.stages = {}
+
+
+class MicroBatcher:
+    """Runs run_batch(payloads) -> results on batches of concurrently submitted payloads"""
+
+    def __init__(self, run_batch, max_wait=DEFAULT_MAX_WAIT, max_batch=DEFAULT_MAX_BATCH, name='analyze'):
+        if max_batch < 1:
+            raise ValueError('max_batch must be at least 1')
+        self.run_batch = run_batch
+        self.max_wait = max(0.0, max_wait)
+        self.max_batch = max_batch
+        self.name = name
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name=f'micro-batch-{name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, payload, timeout=None):
+        """Queue payload and block until its batch has run; returns its result or raises its error"""
+        if self._stopped:
+            raise RuntimeError('Batcher is stopped')
+        pending = _Pending(payload)
+        self._queue.put(pending)
+        self.record_depth()
+        try:
+            return pending.future.result(timeout)
+        finally:
+            if pending.finished is not None:
+                instrumentation.record_stage('batch_wait', pending.started - pending.submitted)
+                for name, seconds in pending.stages.items():
+                    instrumentation.record_stage(name, seconds)
+
+    def stop(self, timeout=None):
+        """Finish the queued requests, then stop the batching thread"""
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def record_depth(self):
+        instrumentation.metrics.set('exoplanet_batch_queue_depth', self._queue.qsize(),
+                                    'Requests waiting for a batch', batcher=self.name)
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            # The window opens when the first request of the batch arrived
+            deadline = first.submitted + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._run(batch)
+
+        # Requests that raced with stop()
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                pending.future.set_exception(RuntimeError('Batcher is stopped'))
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        self.record_depth()
+        metrics = instrumentation.metrics
+        metrics.observe('exoplanet_batch_size', len(batch), 'Requests per batch', buckets=BATCH_SIZE_BUCKETS,
+                        batcher=self.name)
+        for pending in batch:
+            pending.started = started
+            metrics.observe('exoplanet_batch_wait_seconds', started - pending.submitted,
+                            'Time from submit to the start of the batch', batcher=self.name)
+
+        try:
+            with instrumentation.batch_stages(len(batch)) as timings:
+                results = self.run_batch([pending.payload for pending in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f'Batch function returned {len(results)} results for {len(batch)} requests')
+        except Exception as e:
+            finished = time.perf_counter()
+            for pending in batch:
+                pending.finished = finished
+                pending.future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        for pending, result, request_timings in zip(batch, results, timings):
+            pending.finished = finished
+            pending.stages = request_timings.stages
+            pending.future.set_result(result)
@@ -0,0 +1,230 @@
+"""
+Registry of trained model versions loaded in this process.
+
+Entry points resolve a model by name (and optionally version) instead of
+unpickling its files themselves. The registry:
+
+- loads each artifact (model, scaler, label encoder, similarity index)
+  on first use, not when the version is resolved;
+- keeps the most recently used DEFAULT_CAPACITY versions loaded and
+  drops the least recently used one beyond that;
+- notices when the files on disk change. A name whose directory has a
+  CURRENT pointer resolves to the version it names, so a newly published
+  version is a different entry. Files are also checked by size and
+  mtime. An artifact's content digest is taken when it is first loaded
+  (outside the lock), and decides when size or mtime differ, so a
+  touched but identical file is not reloaded; a changed file that was
+  never loaded needs no digest. Checks run at most every RECHECK_SECONDS
+  per name.
+
+Objects derived from a version's artifacts (serving engines, feature
+encoders) can be cached on it with LoadedModel.derived(), so they are
+rebuilt only when the version changes.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+from artifact_store import CURRENT_POINTER, current_version_dir, digest_stamp, file_digest, source_stamp, stamp_matches
+
+DEFAULT_CAPACITY = 2
+RECHECK_SECONDS = 1.0
+
+
+def _load_pickle(path):
+    import joblib
+    return joblib.load(path)
+
+
+def _load_serving_bundle(path):
+    from forest_engine import FlatForest
+    return FlatForest.load(path)
+
+
+def _load_similarity_index(path):
+    from similarity_index import SimilarityIndex
+    return SimilarityIndex.load(path)
+
+
+class ArtifactLayout:
+    def __init__(self, files, metadata):
+        """files maps artifact names to (file name, loader); metadata is the JSON file name"""
+        self.files = files
+        self.metadata = metadata
+
+
+# Written by train_exoplanet_model.py into models/. The serving bundle
+# (forest engine, scaler parameters, class names) loads without scikit-learn.
+KOI_LAYOUT = ArtifactLayout({
+    'model': ('exoplanet_classifier.pkl', _load_pickle),
+    'scaler': ('scaler.pkl', _load_pickle),
+    'label_encoder': ('label_encoder.pkl', _load_pickle),
+    'serving_bundle': ('serving_bundle.npz', _load_serving_bundle)
+}, metadata='model_metadata.json')
+
+# Written by ExoplanetDataHandler.save_model into models/<fingerprint>/<version>/
+CATALOG_LAYOUT = ArtifactLayout({
+    'model': ('rf_classifier.pkl', _load_pickle),
+    'scaler': ('scaler.pkl', _load_pickle),
+    'label_encoder': ('label_encoder.pkl', _load_pickle),
+    'similarity_index': ('similarity_index', _load_similarity_index)
+}, metadata='metadata.json')
+
+
+class LoadedModel:
+    """One version of a model; each artifact is loaded on first access"""
+
+    def __init__(self, name, path, layout):
+        self.name = name
+        self.path = path
+        self.version = os.path.basename(os.path.normpath(path))
+        self.layout = layout
+        self.loaded_at = time.time()
+
+        metadata_path = os.path.join(path, layout.metadata)
+        with open(metadata_path, 'r') as f:
+            self.metadata = json.load(f)
+
+        # Identity of every file as it was when this version was resolved:
+        # size and mtime, plus the digest once the file has been loaded
+        self._stamps = {metadata_path: digest_stamp(metadata_path)}
+        for file_name, _ in layout.files.values():
+            file_path = os.path.join(path, file_name)
+            if os.path.isfile(file_path):
+                self._stamps[file_path] = source_stamp(file_path)
+
+        self._artifacts = {}
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def artifact(self, key):
+        with self._lock:
+            if key in self._artifacts:
+                return self._artifacts[key]
+        file_name, loader = self.layout.files[key]
+        file_path = os.path.join(self.path, file_name)
+        value = loader(file_path)
+        digest = self._loaded_digest(file_path)
+        with self._lock:
+            if digest is not None:
+                self._stamps[file_path]['digest'] = digest
+            return self._artifacts.setdefault(key, value)
+
+    def _loaded_digest(self, file_path):
+        """Digest of a just loaded file, or None when it changed since this version was resolved"""
+        stamp = self._stamps.get(file_path)
+        if stamp is None or 'digest' in stamp or not os.path.isfile(file_path):
+            return None
+        current = source_stamp(file_path)
+        if (current['size'], current['mtime_ns']) != (stamp['size'], stamp['mtime_ns']):
+            return None
+        return file_digest(file_path)
+
+    def derived(self, key, factory):
+        """factory() built once per version and cached under key"""
+        with self._lock:
+            if key in self._derived:
+                return self._derived[key]
+        value = factory()
+        with self._lock:
+            return self._derived.setdefault(key, value)
+
+    def is_current(self):
+        """Whether the files still hold what this version was loaded from"""
+        with self._lock:
+            stamps = [dict(stamp) for stamp in self._stamps.values()]
+        try:
+            for stamp in stamps:
+                if 'digest' in stamp:
+                    if not stamp_matches(stamp, stamp['path']):
+                        return False
+                elif source_stamp(stamp['path']) != stamp:
+                    return False
+            return True
+        except OSError:
+            return False
+
+
+class ModelRegistry:
+    def __init__(self, capacity=DEFAULT_CAPACITY, recheck_seconds=RECHECK_SECONDS):
+        self.capacity = capacity
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._names = {}
+        self._loaded = collections.OrderedDict()
+        # name -> (resolved version directory, time of the last check)
+        self._checked = {}
+        self.counters = {'hits': 0, 'loads': 0, 'reloads': 0, 'evictions': 0}
+
+    def register(self, name, directory, layout):
+        """Make a model directory resolvable by name; re-registering the same directory is a no-op"""
+        with self._lock:
+            if self._names.get(name) != (directory, layout):
+                self._names[name] = (directory, layout)
+                self._checked.pop(name, None)
+
+    def get(self, name, version=None):
+        """The loaded model for name, at version or the current one.
+
+        Raises KeyError for an unregistered name and OSError when the
+        version has no metadata on disk.
+        """
+        directory, layout = self._names[name]
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(name) if version is None else None
+            if checked is not None and now - checked[1] < self.recheck_seconds:
+                loaded = self._loaded.get((name, checked[0]))
+                if loaded is not None:
+                    self._loaded.move_to_end((name, checked[0]))
+                    self.counters['hits'] += 1
+                    return loaded
+
+            path = self._resolve(directory, version)
+            key = (name, path)
+            loaded = self._loaded.get(key)
+            if loaded is not None and loaded.is_current():
+                self._loaded.move_to_end(key)
+                self.counters['hits'] += 1
+            else:
+                if loaded is not None:
+                    self.counters['reloads'] += 1
+                    del self._loaded[key]
+                loaded = LoadedModel(name, path, layout)
+                self.counters['loads'] += 1
+                self._loaded[key] = loaded
+                while len(self._loaded) > self.capacity:
+                    self._loaded.popitem(last=False)
+                    self.counters['evictions'] += 1
+
+            if version is None:
+                self._checked[name] = (path, now)
+            return loaded
+
+    def evict(self, name=None):
+        """Drop loaded versions of name (of every name when None)"""
+        with self._lock:
+            for key in [key for key in self._loaded if name is None or key[0] == name]:
+                del self._loaded[key]
+            for checked in [checked for checked in self._checked if name is None or checked == name]:
+                del self._checked[checked]
+
+    def loaded_versions(self):
+        """(name, version) of every loaded model, least recently used first"""
+        with self._lock:
+            return [(loaded.name, loaded.version) for loaded in self._loaded.values()]
+
+    @staticmethod
+    def _resolve(directory, version):
+        if version is not None:
+            return os.path.join(directory, version)
+        if os.path.exists(os.path.join(directory, CURRENT_POINTER)):
+            return current_version_dir(os.path.basename(directory), os.path.dirname(directory))
+        return directory
+
+
+# Shared by every entry point in the process
+registry = ModelRegistry()
@@ -0,0 +1,79 @@
+"""
+Immutable snapshot of everything a request reads.
+
+The handler builds data, models and indexes in its own working
+attributes, then publishes them as one ModelSnapshot with a single
+reference assignment. A request takes the current snapshot once and uses
+only it, so it never sees a half-retrained mix of old and new state and
+never waits on a retrain; readers take no lock.
+
+Builders must not mutate objects that a published snapshot holds. They
+create new frames, scalers, forests and indexes instead.
+"""
+
+
+class ModelSnapshot:
+    __slots__ = (
+        'version', 'data_fingerprint', 'data_source', 'df', 'feature_columns', 'target_column',
+        'encoder', 'model', 'forest_engine', 'label_encoder', 'similarity_index',
+        'match_index', 'float32_columns', '_column_stats'
+    )
+
+    def __init__(self, version, data_fingerprint, data_source, df, feature_columns, target_column,
+                 encoder, model, forest_engine, label_encoder, similarity_index, match_index,
+                 float32_columns=(), column_stats=None):
+        values = {
+            'version': version,
+            'data_fingerprint': data_fingerprint,
+            'data_source': data_source,
+            'df': df,
+            'feature_columns': tuple(feature_columns),
+            'target_column': target_column,
+            'encoder': encoder,
+            'model': model,
+            'forest_engine': forest_engine,
+            'label_encoder': label_encoder,
+            'similarity_index': similarity_index,
+            'match_index': match_index,
+            'float32_columns': tuple(float32_columns),
+            # Derived lazily, at most once per snapshot; see cache_column_stats
+            '_column_stats': [column_stats]
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"ModelSnapshot is immutable; publish a new one instead of setting {name}")
+
+    @property
+    def n_rows(self):
+        return len(self.df)
+
+    @property
+    def column_stats(self):
+        return self._column_stats[0]
+
+    def cache_column_stats(self, stats):
+        """Remember statistics computed from this snapshot's frame"""
+        self._column_stats[0] = stats
+
+    def record(self, position):
+        """Catalog row as a dict, float32 values shown at their own precision"""
+        from dtype_plan import display_record
+
+        record = self.df.iloc[position].to_dict()
+        if self.float32_columns:
+            display_record(record, self.float32_columns)
+        return record
+
+    def records(self, positions):
+        """record() of many rows, from one selection; values as record() gives them"""
+        from dtype_plan import display_record
+
+        rows = self.df.iloc[list(positions)]
+        # to_numpy() interleaves the columns into the same dtype a row selection gets
+        records = [dict(zip(rows.columns, values)) for values in rows.to_numpy()]
+        if self.float32_columns:
+            for record in records:
+                display_record(record, self.float32_columns)
+        return records
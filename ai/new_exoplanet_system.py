@@ -1,79 +1,120 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
-import joblib
 import json
 import os
 import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 import threading
 import warnings
+from artifact_store import (DEFAULT_CSV_PATH, file_digest, data_fingerprint, artifact_dir, new_version_dir,
+                            publish_version, prune_versions)
+from match_index import ExactMatchIndex
+from similarity_index import SimilarityIndex, index_dtype, resolve_algorithm
+from feature_encoder import FeatureEncoder
+from column_stats import compute_column_stats, update_column_stats, save_sidecar
+from catalog_cache import read_catalog
+from incremental import (MAX_APPEND_FRACTION, MAX_FOREST_GROWTH, source_state, classify_change,
+                         read_appended_rows, trees_for_append, replay_sample, grow_forest)
+from dtype_plan import FEATURE_DTYPE, lean_dtypes_enabled, plan_dtypes, apply_plan, float32_columns, MemoryReport
+from model_snapshot import ModelSnapshot
+from retrain_scheduler import RetrainScheduler, train_in_process
+from training_lock import TrainingLock
+from training import selected_params
+from estimator_backends import DEFAULT_BACKEND, get_backend, tree_count
+from model_registry import CATALOG_LAYOUT, registry as model_registry
+from instrumentation import serving, stage, timed
+from streaming import (streaming_enabled, scan_catalog, iter_chunks, frame_dir, StreamedFrameWriter, chunk_rows,
+                       scale_to_file)
+from out_of_core import out_of_core_enabled, sample_per_class, training_shards
 warnings.filterwarnings('ignore')
 
+# Columns tried, in order, as the classification target
+POTENTIAL_TARGETS = ['pl_controv_flag', 'discoverymethod', 'rv_flag', 'tran_flag']
+
 class ExoplanetDataHandler:
-    def __init__(self, csv_path='training_data.csv'):
+    """Loads the catalog and trains or loads the models for it.
+    
+    The data and model attributes are working state for loading and
+    training. Requests read only self.snapshot, which is replaced as a whole
+    once a load, training run or append has finished.
+    """
+    
+    def __init__(self, csv_path=DEFAULT_CSV_PATH, neighbor_algorithm='auto', lean_dtypes=None, backend=None,
+                 streaming=None, out_of_core=None):
         self.csv_path = csv_path
+        self.backend = get_backend(backend)
         self.df = None
+        # Train on per-class samples of row blocks instead of the whole matrix: see out_of_core.py
+        self.out_of_core = out_of_core_enabled() if out_of_core is None else out_of_core
+        if self.out_of_core and streaming is False:
+            raise ValueError("out_of_core training reads the streamed feature matrix; it requires streaming")
+        # Out-of-core training implies a streaming load, so no step holds the whole matrix in memory
+        self.streaming = self.out_of_core or (streaming_enabled() if streaming is None else streaming)
+        # Imputed features of self.df, memory-mapped, when loaded by streaming
+        self.feature_matrix = None
+        self.approximate_medians = False
+        self.lean_dtypes = lean_dtypes_enabled() if lean_dtypes is None else lean_dtypes
+        self.feature_dtype = FEATURE_DTYPE if self.lean_dtypes else np.float64
+        self.memory_report = MemoryReport()
+        self._float32_columns = []
         self.model = None
-        self.scaler = StandardScaler()
-        self.knn = NearestNeighbors(n_neighbors=6, metric='euclidean')
-        self.label_encoder = LabelEncoder()
+        self.forest_engine = None
+        self.scaler = None
+        self.neighbor_algorithm = neighbor_algorithm
+        self.similarity_index = None
+        self.label_encoder = None
         self.feature_columns = []
+        self.feature_medians = None
+        self.encoder = None
         self.target_column = None
         self.is_trained = False
+        self.accuracy = None
+        self.base_estimators = None
+        self.data_source = None
+        self.last_refresh = None
+        self.data_fingerprint = None
+        self.match_index = None
+        self.snapshot = None
+        self._snapshot_count = 0
+        self._update_lock = threading.Lock()
         self.last_modified = None
         self._model_cache = {}
-        self._data_cache = None
-        self._cache_timestamp = 0
         
+    @timed('load')
     def load_data(self):
         """Load and preprocess the CSV data"""
         try:
             if not os.path.exists(self.csv_path):
                 print(f"Warning: {self.csv_path} not found. Creating sample data...")
                 self._create_sample_data()
-                return
+                self.data_source = source_state(self.csv_path)
+                self._update_fingerprint()
+                self.match_index = ExactMatchIndex(self.df)
+                return True
             
             print(f"Loading data from {self.csv_path}...")
-            self.df = pd.read_csv(self.csv_path)
+            self.feature_matrix = None
+            self.approximate_medians = False
+            if self.streaming:
+                return self._load_streaming()
             
-            # Clean the data
-            self.df = self.df.dropna(how='all')  # Remove completely empty rows
+            # Parsed once per CSV version; later loads read the columnar cache
+            # (completely empty rows are already removed there)
+            self.df = read_catalog(self.csv_path)
+            self.data_source = source_state(self.csv_path)
+            self.memory_report.record('parse', frame=self.df)
             
             # Identify potential target columns (exoplanet classification)
-            potential_targets = ['pl_controv_flag', 'discoverymethod', 'rv_flag', 'tran_flag']
             self.target_column = None
             
-            for col in potential_targets:
+            for col in POTENTIAL_TARGETS:
                 if col in self.df.columns and self.df[col].notna().sum() > 0:
                     self.target_column = col
                     break
             
             # If no clear target, create one based on discovery method
             if self.target_column is None:
-                if 'discoverymethod' in self.df.columns:
-                    # Create binary classification: confirmed vs candidate
-                    self.df['exoplanet_status'] = self.df['discoverymethod'].apply(
-                        lambda x: 'Confirmed' if pd.notna(x) and 'Radial Velocity' in str(x) else 'Candidate'
-                    )
-                    self.target_column = 'exoplanet_status'
-                else:
-                    # Create synthetic target based on orbital period and radius
-                    self.df['exoplanet_status'] = 'Candidate'
-                    if 'pl_orbper' in self.df.columns and 'pl_rade' in self.df.columns:
-                        confirmed_mask = (
-                            (self.df['pl_orbper'].notna()) & 
-                            (self.df['pl_rade'].notna()) & 
-                            (self.df['pl_orbper'] > 0) & 
-                            (self.df['pl_rade'] > 0)
-                        )
-                        self.df.loc[confirmed_mask, 'exoplanet_status'] = 'Confirmed'
-                    self.target_column = 'exoplanet_status'
+                self._derive_status(self.df)
+                self.target_column = 'exoplanet_status'
             
             # Select numeric columns for features
             numeric_columns = self.df.select_dtypes(include=[np.number]).columns.tolist()
@@ -84,9 +125,23 @@ class ExoplanetDataHandler:
                 if col != self.target_column and self.df[col].notna().sum() > len(self.df) * 0.1:  # At least 10% non-null
                     self.feature_columns.append(col)
             
-            # Fill missing values with median
-            for col in self.feature_columns:
-                self.df[col] = self.df[col].fillna(self.df[col].median())
+            # Medians come from the parsed values, before any narrowing
+            medians = self.df[self.feature_columns].median()
+            
+            if self.lean_dtypes:
+                apply_plan(self.df, plan_dtypes(self.df, self.feature_columns, self.target_column))
+                self.memory_report.record('dtype plan', frame=self.df)
+            
+            # Fill missing values with median; keep the medians for request-time imputation
+            self.df = self.df.fillna(medians.astype(self.feature_dtype).to_dict())
+            self.feature_medians = medians.to_numpy(dtype=self.feature_dtype).astype(np.float64)
+            self._float32_columns = float32_columns(self.df)
+            self.memory_report.record('impute', frame=self.df)
+            
+            self._update_fingerprint()
+            
+            # Index the final frame once so lookups never scan it
+            self.match_index = ExactMatchIndex(self.df)
             
             print(f"Loaded {len(self.df)} records with {len(self.feature_columns)} features")
             print(f"Target column: {self.target_column}")
@@ -98,6 +153,97 @@ class ExoplanetDataHandler:
             print(f"Error loading data: {e}")
             return False
     
+    def _load_streaming(self):
+        """load_data for catalogs larger than memory: see streaming.py"""
+        self.data_source = source_state(self.csv_path)
+        
+        # Pass 1: counts, dtypes and medians in bounded memory
+        scan = scan_catalog(self.csv_path)
+        columns = scan.columns
+        self.memory_report.record('scan')
+        
+        self.target_column = next(
+            (col for col in POTENTIAL_TARGETS if col in columns and columns[col].non_null > 0), None
+        )
+        derive_status = self.target_column is None
+        if derive_status:
+            self.target_column = 'exoplanet_status'
+        
+        self.feature_columns = [
+            col for col, column in columns.items()
+            if column.numeric and col != self.target_column and column.non_null > scan.n_rows * 0.1
+        ]
+        medians = np.array([columns[col].median for col in self.feature_columns], dtype=np.float64)
+        fill = medians.astype(self.feature_dtype)
+        self.approximate_medians = any(not columns[col].sketch.exact for col in self.feature_columns)
+        
+        # Pass 2: impute chunk by chunk; every column is written to disk and mapped back
+        directory = frame_dir(self.csv_path, self.data_source['digest'], self.feature_dtype)
+        writer = StreamedFrameWriter(directory, scan, self.feature_columns, self.feature_dtype)
+        try:
+            for chunk in iter_chunks(self.csv_path):
+                if derive_status:
+                    self._derive_status(chunk)
+                block = chunk[self.feature_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+                block = block.astype(self.feature_dtype, copy=False)
+                writer.write(chunk, np.where(np.isnan(block), fill, block))
+            self.feature_matrix, frame_columns = writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+        
+        df = pd.DataFrame(frame_columns, copy=False)
+        for col, column in columns.items():
+            if col not in self.feature_columns and column.frame_dtype != df[col].dtype:
+                df[col] = df[col].astype(column.frame_dtype)
+        if self.lean_dtypes:
+            apply_plan(df, plan_dtypes(df, self.feature_columns, self.target_column))
+        self.df = df
+        self.feature_medians = fill.astype(np.float64)
+        self._float32_columns = float32_columns(self.df)
+        self.memory_report.record('stream', frame=self.df)
+        
+        self._update_fingerprint()
+        # The index's sorted columns are mapped from the same directory
+        self.match_index = ExactMatchIndex(self.df, directory=os.path.join(directory, 'match_index'))
+        
+        print(f"Streamed {len(self.df)} records with {len(self.feature_columns)} features "
+              f"({'estimated' if self.approximate_medians else 'exact'} medians)")
+        print(f"Target column: {self.target_column}")
+        return True
+    
+    def _derive_status(self, frame):
+        """Add the synthetic 'exoplanet_status' target to a frame without a usable one"""
+        if 'discoverymethod' in frame.columns:
+            # Create binary classification: confirmed vs candidate
+            frame['exoplanet_status'] = frame['discoverymethod'].apply(
+                lambda x: 'Confirmed' if pd.notna(x) and 'Radial Velocity' in str(x) else 'Candidate'
+            )
+        else:
+            # Create synthetic target based on orbital period and radius
+            frame['exoplanet_status'] = 'Candidate'
+            if 'pl_orbper' in frame.columns and 'pl_rade' in frame.columns:
+                confirmed_mask = (
+                    (frame['pl_orbper'].notna()) & 
+                    (frame['pl_rade'].notna()) & 
+                    (frame['pl_orbper'] > 0) & 
+                    (frame['pl_rade'] > 0)
+                )
+                frame.loc[confirmed_mask, 'exoplanet_status'] = 'Confirmed'
+    
+    def _update_fingerprint(self):
+        """Key artifacts on the CSV content and the schema inferred from it"""
+        self.data_fingerprint = data_fingerprint(
+            file_digest(self.csv_path), self.feature_columns, self.target_column,
+            feature_dtype='float32' if self.lean_dtypes else None,
+            forest_params=selected_params() or None,
+            # Estimated medians impute differently from the exact ones
+            imputation='median_sketch' if self.approximate_medians else None,
+            # Models trained on samples are kept apart from the ones trained on every row
+            sampling=f'out_of_core:{sample_per_class()}:{training_shards()}' if self.out_of_core else None,
+            backend=None if self.backend.name == DEFAULT_BACKEND else self.backend.name
+        )
+    
     def _create_sample_data(self):
         """Create sample data if CSV doesn't exist"""
         np.random.seed(42)
@@ -120,59 +266,94 @@ class ExoplanetDataHandler:
         self.df['exoplanet_status'] = np.random.choice(['Confirmed', 'Candidate'], n_samples, p=[0.3, 0.7])
         self.target_column = 'exoplanet_status'
         self.feature_columns = list(data.keys())
+        self.feature_medians = self.df[self.feature_columns].median().to_numpy(dtype=np.float64)
         
         # Save sample data
         self.df.to_csv(self.csv_path, index=False)
         print(f"Created sample data with {n_samples} records")
     
+    @timed('train')
     def train_model(self):
         """Train the Random Forest model"""
         if self.df is None or len(self.df) == 0:
             print("No data available for training")
             return False
         
+        # Training-only dependencies stay out of the import path of serving processes
+        from sklearn.preprocessing import StandardScaler, LabelEncoder
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score
+        
         try:
             # Prepare features and target
-            X = self.df[self.feature_columns].values
-            y = self.df[self.target_column].values
+            if self.feature_matrix is not None:
+                X = self.feature_matrix
+            else:
+                X = self.df[self.feature_columns].to_numpy(dtype=self.feature_dtype)
+            self.memory_report.record('feature matrix', frame=self.df, X=X)
             
             # Encode target labels
-            y_encoded = self.label_encoder.fit_transform(y)
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
-            )
-            
-            # Scale features
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
-            
-            # Train Random Forest
-            self.model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42,
-                class_weight='balanced'
-            )
+            # Fresh encoder and scaler: the published snapshot may still hold the old ones
+            self.label_encoder = LabelEncoder()
+            self.scaler = StandardScaler()
+            if self.feature_matrix is not None:
+                # Codes straight from the streamed column, without an array of label objects
+                y_encoded, classes = pd.factorize(self.df[self.target_column], sort=True)
+                self.label_encoder.fit(np.asarray(classes))
+            else:
+                y_encoded = self.label_encoder.fit_transform(self.df[self.target_column].to_numpy())
             
-            self.model.fit(X_train_scaled, y_train)
+            if self.out_of_core:
+                X_test_scaled, y_test = self._fit_out_of_core(X, y_encoded)
+            else:
+                # Split data
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
+                )
+                
+                # Scale features
+                X_train_scaled = self.scaler.fit_transform(X_train)
+                X_test_scaled = self.scaler.transform(X_test)
+                self._build_encoder()
+                self.memory_report.record('scale', frame=self.df, X=X, X_train_scaled=X_train_scaled,
+                                          X_test_scaled=X_test_scaled)
+                
+                # Train the classifier of the configured backend (a random forest by default)
+                self.model = self.backend.build(random_state=42, class_weight='balanced')
+                
+                self.model.fit(X_train_scaled, y_train)
+            self.base_estimators = tree_count(self.model)
+            self.forest_engine = self.backend.engine(self.model)
             
-            # Train KNN for similarity search
-            self.knn.fit(X_train_scaled)
+            # Index the full catalog for similarity search
+            if self.feature_matrix is not None:
+                # A streamed catalog is scaled chunk by chunk into a file beside its frame
+                algorithm = resolve_algorithm(self.neighbor_algorithm, X.shape[1])
+                scaled = scale_to_file(
+                    self.scaler, X,
+                    os.path.join(os.path.dirname(self.feature_matrix.filename), 'scaled_features.npy'),
+                    index_dtype(algorithm, X.dtype)
+                )
+            else:
+                scaled = self.scaler.transform(X)
+            self.similarity_index = SimilarityIndex(self.neighbor_algorithm).build(scaled)
+            self.memory_report.record('similarity index', frame=self.df,
+                                      index_features=self.similarity_index.features)
             
             # Evaluate model
             y_pred = self.model.predict(X_test_scaled)
-            accuracy = accuracy_score(y_test, y_pred)
+            self.accuracy = accuracy_score(y_test, y_pred)
             
             print(f"Model trained successfully!")
-            print(f"Accuracy: {accuracy:.4f}")
+            print(f"Accuracy: {self.accuracy:.4f}")
             print(f"Classes: {self.label_encoder.classes_}")
             
             self.is_trained = True
+            self.memory_report.print()
             
-            # Save model artifacts
-            self.save_model()
+            # Save model artifacts, then hand the new state to requests
+            model_dir = self.save_model()
+            self._publish(model_dir)
             
             return True
             
@@ -180,83 +361,305 @@ class ExoplanetDataHandler:
             print(f"Error training model: {e}")
             return False
     
+    def _fit_out_of_core(self, X, y_encoded):
+        """Scaler and model from row blocks of X; returns the scaled test sample and its labels"""
+        from out_of_core import OutOfCoreTrainer, array_chunks
+        
+        trainer = OutOfCoreTrainer(sample_per_class(), test_size=0.2, n_shards=training_shards(), random_state=42)
+        trainer.consume_all(array_chunks(X, y_encoded, chunk_rows()))
+        print(trainer.summary())
+        self.scaler = trainer.scaler
+        self._build_encoder()
+        self.model = trainer.fit(self.backend, class_weight='balanced')
+        X_test_scaled, y_test = trainer.test_set()
+        self.memory_report.record('out-of-core sample', frame=self.df, X=X, X_test_scaled=X_test_scaled)
+        return X_test_scaled, y_test
+    
     def save_model(self):
-        """Save the trained model and artifacts"""
+        """Save the artifacts as a new version under the data fingerprint; return its directory"""
+        import joblib
+        
         try:
-            os.makedirs('models', exist_ok=True)
+            model_dir = new_version_dir(self.data_fingerprint)
+            # Everything is written to a temporary directory and renamed into place
+            tmp_dir = f'{model_dir}.tmp'
+            os.makedirs(tmp_dir)
             
-            joblib.dump(self.model, 'models/rf_classifier.pkl')
-            joblib.dump(self.scaler, 'models/scaler.pkl')
-            joblib.dump(self.knn, 'models/knn_model.pkl')
-            joblib.dump(self.label_encoder, 'models/label_encoder.pkl')
+            joblib.dump(self.model, os.path.join(tmp_dir, 'rf_classifier.pkl'))
+            joblib.dump(self.scaler, os.path.join(tmp_dir, 'scaler.pkl'))
+            self.similarity_index.save(os.path.join(tmp_dir, 'similarity_index'))
+            joblib.dump(self.label_encoder, os.path.join(tmp_dir, 'label_encoder.pkl'))
             
             # Save metadata
             metadata = {
+                'fingerprint': self.data_fingerprint,
+                'version': os.path.basename(model_dir),
                 'feature_columns': self.feature_columns,
                 'target_column': self.target_column,
                 'class_names': self.label_encoder.classes_.tolist(),
                 'n_features': len(self.feature_columns),
                 'n_samples': len(self.df),
+                'feature_dtype': np.dtype(self.feature_dtype).name,
+                'backend': self.backend.name,
+                'base_estimators': self.base_estimators,
+                'n_estimators': tree_count(self.model),
                 'trained_at': time.time()
             }
             
-            with open('models/metadata.json', 'w') as f:
+            with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as f:
                 json.dump(metadata, f, indent=2)
             
-            print("Model artifacts saved successfully!")
+            # Readers switch to the new version only once it is complete
+            os.rename(tmp_dir, model_dir)
+            publish_version(model_dir)
+            prune_versions(self.data_fingerprint)
+            
+            print(f"Model artifacts saved to {model_dir}")
+            return model_dir
             
         except Exception as e:
             print(f"Error saving model: {e}")
+            return None
     
+    @timed('load_model')
     def load_model(self):
-        """Load the trained model and artifacts"""
+        """Load the artifacts trained for the current data fingerprint"""
         try:
-            if not os.path.exists('models/rf_classifier.pkl'):
-                print("No trained model found")
+            if self.data_fingerprint is None:
+                print("No data fingerprint; load data before loading a model")
                 return False
             
-            self.model = joblib.load('models/rf_classifier.pkl')
-            self.scaler = joblib.load('models/scaler.pkl')
-            self.knn = joblib.load('models/knn_model.pkl')
-            self.label_encoder = joblib.load('models/label_encoder.pkl')
+            # Versions already loaded in this process are reused, not unpickled again
+            model_registry.register(self.data_fingerprint, artifact_dir(self.data_fingerprint), CATALOG_LAYOUT)
+            try:
+                loaded = model_registry.get(self.data_fingerprint)
+            except OSError:
+                loaded = None
+            if loaded is None or loaded.metadata.get('fingerprint') != self.data_fingerprint:
+                print(f"No trained model found for fingerprint {self.data_fingerprint}")
+                return False
+            model_dir = loaded.path
+            metadata = loaded.metadata
             
-            with open('models/metadata.json', 'r') as f:
-                metadata = json.load(f)
-                self.feature_columns = metadata['feature_columns']
-                self.target_column = metadata['target_column']
+            self.model = loaded.artifact('model')
+            self.base_estimators = metadata.get('base_estimators', tree_count(self.model))
+            self.forest_engine = loaded.derived(('engine', self.backend.name),
+                                                lambda: self.backend.engine(self.model))
+            self.scaler = loaded.artifact('scaler')
+            self.similarity_index = loaded.artifact('similarity_index')
+            if self.neighbor_algorithm not in ('auto', self.similarity_index.algorithm):
+                # Persisted with another algorithm; rebuild from the mapped feature matrix
+                persisted = self.similarity_index
+                self.similarity_index = loaded.derived(
+                    ('similarity_index', self.neighbor_algorithm),
+                    lambda: SimilarityIndex(self.neighbor_algorithm).build(persisted.all_features())
+                )
+            self.label_encoder = loaded.artifact('label_encoder')
+            self.feature_columns = metadata['feature_columns']
+            self.target_column = metadata['target_column']
+            self._build_encoder()
             
             self.is_trained = True
-            print("Model loaded successfully!")
+            self._publish(model_dir)
+            print(f"Model loaded from {model_dir}")
             return True
             
         except Exception as e:
             print(f"Error loading model: {e}")
             return False
     
-    def find_exact_match(self, user_inputs, selected_columns):
+    def _publish(self, model_dir=None, column_stats=None):
+        """Make the working state visible to requests with one reference swap"""
+        self._snapshot_count += 1
+        version = os.path.basename(model_dir) if model_dir else f'unsaved-{self._snapshot_count}'
+        self.snapshot = ModelSnapshot(
+            version=version,
+            data_fingerprint=self.data_fingerprint,
+            data_source=self.data_source,
+            df=self.df,
+            feature_columns=self.feature_columns,
+            target_column=self.target_column,
+            encoder=self.encoder,
+            model=self.model,
+            forest_engine=self.forest_engine,
+            label_encoder=self.label_encoder,
+            similarity_index=self.similarity_index,
+            match_index=self.match_index,
+            float32_columns=self._float32_columns,
+            column_stats=column_stats
+        )
+    
+    def refresh_data(self, retrain=None):
+        """Catch up with the CSV: grow the model when rows were only appended, else retrain.
+        
+        Runs off to the side of request handling; one refresh runs at a time.
+        retrain, when given, trains elsewhere (another process): it is called
+        without arguments and returns True once artifacts for the current
+        CSV are saved, which are then loaded here.
+        """
+        with self._update_lock:
+            return self._refresh_data(retrain)
+    
+    def process_options(self):
+        """Constructor options a trainer process needs to build the same model"""
+        return {'neighbor_algorithm': self.neighbor_algorithm, 'lean_dtypes': self.lean_dtypes,
+                'backend': self.backend.name, 'streaming': self.streaming, 'out_of_core': self.out_of_core}
+    
+    def _refresh_data(self, retrain):
+        change = 'rewrite'
+        # Appends build on the published state; after a failed retrain the working state is not it
+        published = self.snapshot is not None and self.snapshot.df is self.df
+        if published and self.data_source is not None and os.path.exists(self.csv_path):
+            change = classify_change(self.csv_path, self.data_source)
+        
+        self.last_refresh = change
+        if change == 'unchanged':
+            print("CSV content unchanged; keeping the current model")
+            return True
+        
+        if change == 'append':
+            try:
+                if self._apply_append():
+                    return True
+            except Exception as e:
+                print(f"Incremental update failed: {e}")
+        
+        print("Retraining model from scratch...")
+        self.last_refresh = 'full'
+        self.clear_cache()
+        if retrain is None:
+            return self.load_data() and self.ensure_model()
+        
+        if not retrain():
+            return False
+        # The trainer saved artifacts under the data fingerprint; load and publish them
+        return self.load_data() and self.load_model()
+    
+    def _apply_append(self):
+        """Fold appended CSV rows into the data, forest, indexes and statistics.
+        
+        Returns False when the change should be handled by a full retrain.
+        """
+        if self.streaming:
+            # Folding rows in would pull the mapped frame into memory; a streamed retrain keeps it bounded
+            print("Appends to a streamed catalog are not applied in memory; retraining")
+            return False
+        
+        delta = read_appended_rows(self.csv_path, self.data_source)
+        if delta is None:
+            print("Last appended row is incomplete; waiting for the rest")
+            return True
+        
+        delta = delta.dropna(how='all')
+        if self.target_column == 'exoplanet_status' and 'exoplanet_status' not in delta.columns:
+            self._derive_status(delta)
+        
+        missing = [col for col in self.feature_columns + [self.target_column] if col not in delta.columns]
+        if missing:
+            print(f"Appended rows lack columns {missing[:5]}")
+            return False
+        
+        if not self.backend.forest:
+            print(f"The {self.backend.name} backend cannot be grown with appended rows; retraining")
+            return False
+        
+        start = len(self.df)
+        column_stats = self.snapshot.column_stats
+        n_trees = trees_for_append(len(self.model.estimators_), start, len(delta))
+        if len(delta) > MAX_APPEND_FRACTION * start:
+            print(f"{len(delta)} appended rows are too many for an incremental update")
+            return False
+        if len(self.model.estimators_) + n_trees > MAX_FOREST_GROWTH * self.base_estimators:
+            print("Forest has grown enough through appends; retraining")
+            return False
+        
+        unknown = set(delta[self.target_column].dropna()) - set(self.label_encoder.classes_)
+        if unknown or delta[self.target_column].isna().any():
+            print(f"Appended rows have unseen target values {sorted(map(str, unknown))[:5]}")
+            return False
+        
+        if len(delta) > 0:
+            # New rows are imputed with the medians the model was trained with
+            medians = dict(zip(self.feature_columns, self.feature_medians.astype(self.feature_dtype)))
+            delta[self.feature_columns] = delta[self.feature_columns].fillna(medians)
+            df = pd.concat([self.df, delta], ignore_index=True)
+            if self.lean_dtypes:
+                apply_plan(df, plan_dtypes(df, self.feature_columns, self.target_column))
+            
+            X_new = df[self.feature_columns].iloc[start:].to_numpy(dtype=self.feature_dtype)
+            X_new_scaled = self.scaler.transform(X_new)
+            y_new = self.label_encoder.transform(df[self.target_column].iloc[start:].to_numpy())
+            
+            # Train the extra trees on the new rows plus as many earlier rows
+            y_old = self.label_encoder.transform(self.df[self.target_column].to_numpy())
+            replay = replay_sample(y_old, len(delta), seed=len(df))
+            X_replay = self.scaler.transform(
+                self.df[self.feature_columns].iloc[replay].to_numpy(dtype=self.feature_dtype)
+            )
+            self.model = grow_forest(
+                self.model,
+                np.concatenate([X_replay, X_new_scaled]),
+                np.concatenate([y_old[replay], y_new]),
+                n_trees, random_state=len(df)
+            )
+            
+            self.forest_engine = self.backend.engine(self.model)
+            self.similarity_index = self.similarity_index.add(X_new_scaled)
+            self.match_index = self.match_index.extended(df)
+            if column_stats is not None:
+                column_stats = update_column_stats(column_stats, df, start)
+            self.df = df
+            self._float32_columns = float32_columns(df)
+            print(f"Added {len(delta)} appended rows with {n_trees} new trees "
+                  f"({len(self.model.estimators_)} total)")
+        
+        self.data_source = source_state(self.csv_path)
+        self._update_fingerprint()
+        self._publish(self.save_model(), column_stats=column_stats)
+        if column_stats is not None:
+            self._save_column_stats(column_stats, self.data_source)
+        return True
+    
+    def _build_encoder(self):
+        """Precompute the column map, median fill vector and scaling for inference"""
+        self.encoder = FeatureEncoder.from_scaler(
+            self.feature_columns, self.feature_medians, self.scaler
+        )
+    
+    def ensure_model(self, lock_timeout=None):
+        """Reuse artifacts matching the loaded data, training only on a miss.
+        
+        Across processes only one trains a fingerprint at a time; the others
+        wait for it (up to lock_timeout seconds) and load what it saved.
+        """
+        if self.load_model():
+            return True
+        
+        with TrainingLock(artifact_dir(self.data_fingerprint), timeout=lock_timeout) as lock:
+            # Only a lock someone else held can have new artifacts behind it
+            if lock.contended and self.load_model():
+                print(f"Loaded model trained by another process after {lock.waited:.1f}s")
+                return True
+            if not lock.acquired:
+                print(f"Timed out after {lock.waited:.0f}s waiting for another trainer; training here")
+            return self.train_model()
+    
+    @timed('exact_match')
+    def find_exact_match(self, user_inputs, selected_columns, snapshot=None):
         """Find exact match in the dataset"""
-        if self.df is None:
+        snapshot = snapshot or self.snapshot
+        if snapshot is None:
             return None
         
         try:
-            # Create mask for exact match
-            mask = pd.Series([True] * len(self.df))
-            
-            for col, value in user_inputs.items():
-                if col in self.df.columns:
-                    if pd.api.types.is_numeric_dtype(self.df[col]):
-                        # For numeric columns, allow small tolerance
-                        mask &= (abs(self.df[col] - float(value)) < 1e-6)
-                    else:
-                        # For categorical columns, exact match
-                        mask &= (self.df[col].astype(str) == str(value))
-            
-            if mask.any():
-                match_idx = mask.idxmax()
-                match_record = self.df.iloc[match_idx].to_dict()
+            # Numeric columns match within 1e-6, other columns by string equality
+            match_idx = snapshot.match_index.lookup(user_inputs)
+            
+            if match_idx is not None:
+                match_record = snapshot.record(match_idx)
                 
                 # Return all columns except the selected ones
-                result_columns = [col for col in self.df.columns if col not in selected_columns]
+                result_columns = [col for col in snapshot.df.columns if col not in selected_columns]
                 return {
                     'found': True,
                     'record': {col: match_record[col] for col in result_columns},
@@ -269,230 +672,362 @@ class ExoplanetDataHandler:
             print(f"Error in exact match: {e}")
             return {'found': False, 'error': str(e)}
     
-    def find_nearest_neighbors(self, user_inputs, selected_columns, k=6):
+    @timed('knn')
+    def find_nearest_neighbors(self, user_inputs, selected_columns, k=6, input_scaled=None, snapshot=None):
         """Find k nearest neighbors using KNN"""
-        if not self.is_trained or self.df is None:
+        snapshot = snapshot or self.snapshot
+        if snapshot is None:
             return {'error': 'Model not trained or data not loaded'}
         
         try:
-            # Prepare input features
-            input_features = []
-            for col in self.feature_columns:
-                if col in user_inputs:
-                    input_features.append(float(user_inputs[col]))
-                else:
-                    # Use median value for missing features
-                    input_features.append(self.df[col].median())
-            
-            input_features = np.array(input_features).reshape(1, -1)
-            input_scaled = self.scaler.transform(input_features)
-            
-            # Find nearest neighbors
-            distances, indices = self.knn.kneighbors(input_scaled, n_neighbors=k)
-            
-            neighbors = []
-            for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-                neighbor_record = self.df.iloc[idx].to_dict()
-                similarity_score = 1 / (1 + dist)  # Convert distance to similarity
-                
-                neighbors.append({
-                    'index': idx,
-                    'similarity_score': float(similarity_score),
-                    'distance': float(dist),
-                    'record': neighbor_record
-                })
+            # Prepare input features; missing ones take the column median
+            if input_scaled is None:
+                input_scaled = snapshot.encoder.encode(user_inputs)
             
-            return {'neighbors': neighbors}
+            # Find nearest neighbors; indices are positions in the full catalog
+            distances, indices = snapshot.similarity_index.query(input_scaled, k=k)
+            
+            return {'neighbors': self._neighbor_list(snapshot, distances[0], indices[0])}
             
         except Exception as e:
             print(f"Error in nearest neighbors: {e}")
             return {'error': str(e)}
     
-    def predict_classification(self, user_inputs, selected_columns):
+    @timed('knn')
+    def find_nearest_neighbors_batch(self, inputs_scaled, k=6, snapshot=None):
+        """find_nearest_neighbors for every row of an encoded batch, in one index query"""
+        snapshot = snapshot or self.snapshot
+        if snapshot is None:
+            return [{'error': 'Model not trained or data not loaded'}] * len(inputs_scaled)
+        
+        try:
+            distances, indices = snapshot.similarity_index.query(inputs_scaled, k=k)
+            # The neighbours' rows of the whole batch in one selection
+            records = iter(snapshot.records(indices.ravel()))
+            return [{'neighbors': self._neighbor_list(snapshot, row_distances, row_indices, records)}
+                    for row_distances, row_indices in zip(distances, indices)]
+        except Exception as e:
+            print(f"Error in nearest neighbors: {e}")
+            return [{'error': str(e)}] * len(inputs_scaled)
+    
+    @staticmethod
+    def _neighbor_list(snapshot, distances, indices, records=None):
+        neighbors = []
+        for dist, idx in zip(distances, indices):
+            neighbor_record = snapshot.record(idx) if records is None else next(records)
+            similarity_score = 1 / (1 + dist)  # Convert distance to similarity
+            
+            neighbors.append({
+                'index': int(idx),
+                'similarity_score': float(similarity_score),
+                'distance': float(dist),
+                'record': neighbor_record
+            })
+        return neighbors
+    
+    @timed('classify')
+    def predict_classification(self, user_inputs, selected_columns, input_scaled=None, snapshot=None):
         """Predict exoplanet classification using Random Forest"""
-        if not self.is_trained:
+        snapshot = snapshot or self.snapshot
+        if snapshot is None:
             return {'error': 'Model not trained'}
         
         try:
-            # Prepare input features
-            input_features = []
-            for col in self.feature_columns:
-                if col in user_inputs:
-                    input_features.append(float(user_inputs[col]))
-                else:
-                    # Use median value for missing features
-                    input_features.append(self.df[col].median())
-            
-            input_features = np.array(input_features).reshape(1, -1)
-            input_scaled = self.scaler.transform(input_features)
-            
-            # Make prediction
-            prediction_proba = self.model.predict_proba(input_scaled)[0]
-            prediction_class = self.model.predict(input_scaled)[0]
+            # Prepare input features; missing ones take the column median
+            if input_scaled is None:
+                input_scaled = snapshot.encoder.encode(user_inputs)
+            
+            # Make prediction; probabilities and class come from one forest pass
+            prediction_proba, prediction_class = snapshot.forest_engine.predict_with_proba(input_scaled)
             
             # Get class name
-            class_name = self.label_encoder.inverse_transform([prediction_class])[0]
-            confidence = float(np.max(prediction_proba))
-            
-            # Create probability dictionary
-            probabilities = {}
-            for i, class_name_encoded in enumerate(self.label_encoder.classes_):
-                probabilities[class_name_encoded] = float(prediction_proba[i])
-            
-            return {
-                'classification': class_name,
-                'confidence': confidence,
-                'probabilities': probabilities
-            }
+            class_name = snapshot.label_encoder.inverse_transform(prediction_class)[0]
+            return self._classification(snapshot, prediction_proba[0], class_name)
             
         except Exception as e:
             print(f"Error in classification: {e}")
             return {'error': str(e)}
     
-    def get_column_info(self):
-        """Get information about available columns with caching"""
-        current_time = time.time()
+    @timed('classify')
+    def predict_classification_batch(self, inputs_scaled, snapshot=None):
+        """predict_classification for every row of an encoded batch, in one forest pass"""
+        snapshot = snapshot or self.snapshot
+        if snapshot is None:
+            return [{'error': 'Model not trained'}] * len(inputs_scaled)
         
-        # Check if we have cached data that's still valid (5 minutes)
-        if (self._data_cache is not None and 
-            (current_time - self._cache_timestamp) < 300):
-            return self._data_cache
+        try:
+            prediction_proba, prediction_class = snapshot.forest_engine.predict_with_proba(inputs_scaled)
+            class_names = snapshot.label_encoder.inverse_transform(prediction_class)
+            return [self._classification(snapshot, proba, class_name)
+                    for proba, class_name in zip(prediction_proba, class_names)]
+        except Exception as e:
+            print(f"Error in classification: {e}")
+            return [{'error': str(e)}] * len(inputs_scaled)
+    
+    @staticmethod
+    def _classification(snapshot, prediction_proba, class_name):
+        confidence = float(np.max(prediction_proba))
         
-        if self.df is None:
-            return {'columns': [], 'error': 'Data not loaded'}
+        # Create probability dictionary
+        probabilities = {}
+        for i, class_name_encoded in enumerate(snapshot.label_encoder.classes_):
+            probabilities[class_name_encoded] = float(prediction_proba[i])
         
-        columns_info = []
-        for col in self.df.columns:
-            col_info = {
-                'name': col,
-                'type': str(self.df[col].dtype),
-                'non_null_count': int(self.df[col].notna().sum()),
-                'null_count': int(self.df[col].isna().sum()),
-                'is_numeric': pd.api.types.is_numeric_dtype(self.df[col])
-            }
-            
-            if col_info['is_numeric'] and col_info['non_null_count'] > 0:
-                col_info['min'] = float(self.df[col].min())
-                col_info['max'] = float(self.df[col].max())
-                col_info['mean'] = float(self.df[col].mean())
-                col_info['median'] = float(self.df[col].median())
-            
-            columns_info.append(col_info)
+        return {
+            'classification': class_name,
+            'confidence': confidence,
+            'probabilities': probabilities
+        }
+    
+    @timed('column_info')
+    def get_column_info(self):
+        """Get information about available columns, computed once per snapshot"""
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.column_stats is not None:
+            return snapshot.column_stats
         
-        result = {'columns': columns_info}
+        # Before a model is published (column listing only) describe the loaded data
+        df = snapshot.df if snapshot is not None else self.df
+        if df is None:
+            return {'columns': [], 'error': 'Data not loaded'}
+        
+        result = compute_column_stats(df)
         
-        # Cache the result
-        self._data_cache = result
-        self._cache_timestamp = current_time
+        # Cache the result, in memory and as a sidecar keyed on the CSV content
+        if snapshot is not None:
+            snapshot.cache_column_stats(result)
+        self._save_column_stats(result, snapshot.data_source if snapshot is not None else self.data_source)
         
         return result
     
+    def _save_column_stats(self, stats, source):
+        try:
+            save_sidecar(self.csv_path, stats, source=source)
+        except OSError as e:
+            print(f"Could not write column statistics sidecar: {e}")
+    
     def clear_cache(self):
         """Clear all caches"""
         self._model_cache = {}
-        self._data_cache = None
-        self._cache_timestamp = 0
 
-class FileWatcher(FileSystemEventHandler):
-    def __init__(self, data_handler):
+class FileWatcher:
+    """Forwards changes to the handler's CSV (and only that file) to the retrain scheduler.
+    
+    A watchdog event handler by duck typing (the observer only calls
+    dispatch), so watchdog is imported when a watcher starts, not with
+    this module.
+    """
+    
+    def __init__(self, data_handler, scheduler):
         self.data_handler = data_handler
-        self.last_modified = None
+        self.scheduler = scheduler
+        self.csv_path = os.path.abspath(data_handler.csv_path)
     
-    def on_modified(self, event):
-        if event.is_directory:
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ('created', 'modified', 'moved'):
             return
         
-        if event.src_path.endswith('.csv'):
-            current_time = time.time()
-            if self.last_modified and (current_time - self.last_modified) < 5:
-                return  # Avoid multiple triggers
-            
-            self.last_modified = current_time
-            print(f"CSV file modified: {event.src_path}")
-            
-            # Retrain model in background
-            threading.Thread(target=self._retrain_model, daemon=True).start()
+        # Editors often write a temporary file and rename it over the CSV
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        if any(path and os.path.abspath(path) == self.csv_path for path in paths):
+            print(f"CSV file {event.event_type}: {self.csv_path}")
+            self.scheduler.notify()
     
-    def _retrain_model(self):
-        """Retrain model when CSV is updated"""
-        try:
-            print("Retraining model due to CSV update...")
-            # Clear cache before retraining
-            self.data_handler.clear_cache()
-            
-            if self.data_handler.load_data():
-                self.data_handler.train_model()
-                print("Model retraining completed!")
-            else:
-                print("Failed to retrain model")
-        except Exception as e:
-            print(f"Error during retraining: {e}")
+    def dispatch(self, event):
+        self.on_any_event(event)
+
+def _run_retrain_job(job):
+    """Scheduler job: appends are applied in place, full retrains run in a trainer process"""
+    data_handler = get_data_handler()
+    print(f"Retraining model due to CSV update (job {job.id}, {job.events} change events)...")
+    succeeded = data_handler.refresh_data(
+        retrain=lambda: train_in_process(data_handler.csv_path, data_handler.process_options(), job)
+    )
+    job.mode = data_handler.last_refresh
+    return succeeded
+
+# Global data handler instance, built on first use rather than at import
+_data_handler = None
+_data_handler_lock = threading.Lock()
+retrain_scheduler = None
+
+def get_data_handler():
+    """The process-wide data handler"""
+    global _data_handler
+    
+    with _data_handler_lock:
+        if _data_handler is None:
+            _data_handler = ExoplanetDataHandler()
+        return _data_handler
+
+def __getattr__(name):
+    # Keeps `new_exoplanet_system.data_handler` working without building it at import
+    if name == 'data_handler':
+        return get_data_handler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Global data handler instance
-data_handler = ExoplanetDataHandler()
+def start_watcher():
+    """Watch the CSV and retrain on changes; returns the observer"""
+    global retrain_scheduler
+    from watchdog.observers import Observer
+    
+    retrain_scheduler = RetrainScheduler(_run_retrain_job).start()
+    observer = Observer()
+    event_handler = FileWatcher(get_data_handler(), retrain_scheduler)
+    observer.schedule(event_handler, path=os.path.dirname(event_handler.csv_path), recursive=False)
+    observer.start()
+    return observer
+
+def retrain_status():
+    """Scheduler state and the published model version, for status reports"""
+    snapshot = get_data_handler().snapshot
+    return {
+        'retrain': retrain_scheduler.status() if retrain_scheduler is not None else {'state': 'disabled'},
+        'model': None if snapshot is None else {
+            'version': snapshot.version,
+            'fingerprint': snapshot.data_fingerprint,
+            'records': snapshot.n_rows
+        }
+    }
 
 def initialize_system():
     """Initialize the exoplanet analysis system"""
-    global data_handler
+    data_handler = get_data_handler()
     
     print("Initializing Exoplanet Analysis System...")
     
     # Load data and train model
     if data_handler.load_data():
-        if data_handler.train_model():
+        if data_handler.ensure_model():
             print("System initialized successfully!")
             
             # Start file watcher
-            observer = Observer()
-            event_handler = FileWatcher(data_handler)
-            observer.schedule(event_handler, path='.', recursive=False)
-            observer.start()
+            start_watcher()
             
             return True
     
     print("Failed to initialize system")
     return False
 
+def prepare_system():
+    """Load data and a matching model once per process; return an error message on failure"""
+    data_handler = get_data_handler()
+    if data_handler.snapshot is not None:
+        return None
+    
+    if not data_handler.load_data():
+        return "Failed to load data"
+    
+    if not data_handler.ensure_model():
+        return "Failed to train model"
+    
+    return None
+
 def get_columns():
     """Get available columns from the CSV"""
-    return data_handler.get_column_info()
+    return get_data_handler().get_column_info()
 
 def analyze_exoplanet(user_inputs, selected_columns):
     """Main analysis function"""
     try:
+        # One snapshot serves the whole request, even if a retrain publishes meanwhile
+        data_handler = get_data_handler()
+        snapshot = data_handler.snapshot
+        
         # First, try exact match
-        exact_match = data_handler.find_exact_match(user_inputs, selected_columns)
+        exact_match = data_handler.find_exact_match(user_inputs, selected_columns, snapshot=snapshot)
         
         if exact_match.get('found'):
-            return {
-                'type': 'exact_match',
-                'result': exact_match['record'],
-                'message': 'Exact match found in dataset!'
-            }
+            return _exact_match_result(exact_match)
         
-        # If no exact match, use ML approach
-        neighbors_result = data_handler.find_nearest_neighbors(user_inputs, selected_columns)
-        classification_result = data_handler.predict_classification(user_inputs, selected_columns)
+        # If no exact match, use ML approach; encode the request once for both models
+        try:
+            with stage('encode'):
+                input_scaled = snapshot.encoder.encode(user_inputs)
+        except Exception:
+            input_scaled = None  # Each step reports the encoding error itself
         
-        if 'error' in neighbors_result or 'error' in classification_result:
-            return {
-                'type': 'error',
-                'message': 'Analysis failed',
-                'error': neighbors_result.get('error', classification_result.get('error'))
-            }
+        neighbors_result = data_handler.find_nearest_neighbors(
+            user_inputs, selected_columns, input_scaled=input_scaled, snapshot=snapshot
+        )
+        classification_result = data_handler.predict_classification(
+            user_inputs, selected_columns, input_scaled=input_scaled, snapshot=snapshot
+        )
+        
+        return _ml_analysis_result(neighbors_result, classification_result)
         
+    except Exception as e:
         return {
-            'type': 'ml_analysis',
-            'classification': classification_result,
-            'neighbors': neighbors_result['neighbors'],
-            'message': 'No exact match found. Using ML analysis.'
+            'type': 'error',
+            'message': f'Analysis failed: {str(e)}'
         }
+
+def analyze_exoplanet_batch(requests):
+    """analyze_exoplanet for a list of (user_inputs, selected_columns) requests.
+    
+    Exact matches are looked up per request; the rest are encoded into one
+    matrix that goes through one neighbour query and one forest pass (see
+    micro_batch.py). Results are the same as analyze_exoplanet's, in order.
+    """
+    try:
+        data_handler = get_data_handler()
+        snapshot = data_handler.snapshot
+        results = [None] * len(requests)
+        pending, rows = [], []
+        
+        for i, (user_inputs, selected_columns) in enumerate(requests):
+            # Per-request stages are timed for that request alone, as analyze_exoplanet times them
+            with serving([i]):
+                exact_match = data_handler.find_exact_match(user_inputs, selected_columns, snapshot=snapshot)
+                if exact_match.get('found'):
+                    results[i] = _exact_match_result(exact_match)
+                    continue
+                try:
+                    with stage('encode'):
+                        rows.append(snapshot.encoder.encode(user_inputs)[0])
+                    pending.append(i)
+                except Exception:
+                    # Reported the way a lone request reports it
+                    results[i] = analyze_exoplanet(user_inputs, selected_columns)
+        
+        if pending:
+            inputs_scaled = np.vstack(rows)
+            # Each row waited for the whole neighbour query and forest pass
+            with serving(pending):
+                neighbors = data_handler.find_nearest_neighbors_batch(inputs_scaled, snapshot=snapshot)
+                classifications = data_handler.predict_classification_batch(inputs_scaled, snapshot=snapshot)
+            for i, neighbors_result, classification_result in zip(pending, neighbors, classifications):
+                results[i] = _ml_analysis_result(neighbors_result, classification_result)
+        
+        return results
         
     except Exception as e:
-        return {
+        return [{
             'type': 'error',
             'message': f'Analysis failed: {str(e)}'
+        } for _ in requests]
+
+def _exact_match_result(exact_match):
+    return {
+        'type': 'exact_match',
+        'result': exact_match['record'],
+        'message': 'Exact match found in dataset!'
+    }
+
+def _ml_analysis_result(neighbors_result, classification_result):
+    if 'error' in neighbors_result or 'error' in classification_result:
+        return {
+            'type': 'error',
+            'message': 'Analysis failed',
+            'error': neighbors_result.get('error', classification_result.get('error'))
         }
+    
+    return {
+        'type': 'ml_analysis',
+        'classification': classification_result,
+        'neighbors': neighbors_result['neighbors'],
+        'message': 'No exact match found. Using ML analysis.'
+    }
 
 if __name__ == "__main__":
     # Initialize the system
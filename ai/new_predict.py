@@ -1,26 +1,12 @@
 import sys
 import json
-import os
-from new_exoplanet_system import data_handler, get_columns, analyze_exoplanet
+import instrumentation
+from profiling import profile
+from analysis_worker import encode_json
+from inference import analyze
 
 def main():
     try:
-        # Initialize the system if not already done
-        if not data_handler.is_trained:
-            if not data_handler.load_data():
-                print(json.dumps({
-                    "error": "Failed to load data",
-                    "type": "error"
-                }))
-                return
-            
-            if not data_handler.train_model():
-                print(json.dumps({
-                    "error": "Failed to train model", 
-                    "type": "error"
-                }))
-                return
-        
         # Get command line arguments
         if len(sys.argv) < 2:
             print(json.dumps({
@@ -43,11 +29,15 @@ def main():
             }))
             return
         
-        # Perform analysis
-        result = analyze_exoplanet(user_inputs, selected_columns)
+        # Prefers a running analysis worker, falls back to in-process analysis;
+        # "timings": true in the input (or EXOPLANET_TIMINGS=1) adds per-stage timings
+        # EXOPLANET_PROFILE=1 (or a sampling rate) writes a profile tagged with "request_id"
+        with profile('new_predict', request_id=input_data.get('request_id')), \
+                instrumentation.request('analyze', enabled=input_data.get('timings') or None) as timings:
+            result = analyze(user_inputs, selected_columns, timings=timings is not None)
         
         # Output result as JSON
-        print(json.dumps(result))
+        print(instrumentation.encode_timed(result, timings, encode_json))
         
     except Exception as e:
         print(json.dumps({
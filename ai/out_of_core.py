@@ -0,0 +1,284 @@
+"""
+Training on catalogs larger than memory.
+
+In-memory training splits, scales and fits the whole feature matrix at
+once. Out-of-core training reads the rows as a stream of chunks instead
+(CSV chunks, or row blocks of a memory-mapped feature matrix) and keeps
+only a bounded sample of them:
+
+- Each row goes to the test sample with probability test_size, otherwise
+  to the training sample: both are StratifiedReservoirs, a uniform
+  sample of at most a fixed number of rows per class (reservoir sampling,
+  Algorithm R, per class). Rare classes are kept whole; only classes
+  with more rows than the capacity are sampled.
+- The StandardScaler is fitted with partial_fit on every training row,
+  not just the sampled ones, so scaling matches in-memory training.
+- With n_shards > 1, chunks are dealt to the shards in turn, each shard
+  keeping its own reservoir. A sub-forest with 1/n_shards of the trees is
+  fitted on each shard's rows in its own process, and the sub-forests
+  are merged into one ensemble (forest backends only). A shard that saw
+  no rows of some class borrows a few from another shard, so every
+  sub-forest has the same classes.
+
+Memory is bounded by the chunk size plus the samples: classes x capacity
+rows for training and test_size / (1 - test_size) of that for testing.
+restore_priors weights the sampled rows so every class counts in
+proportion to the rows it had in the stream.
+
+The handler trains out of core with EXOPLANET_OUT_OF_CORE=1 (sample size
+EXOPLANET_SAMPLE_PER_CLASS, shards EXOPLANET_TRAINING_SHARDS), reading
+row blocks of the memory-mapped matrix of a streaming load, which out of
+core training turns on (see streaming.py); the KOI
+training scripts with --out-of-core. benchmarks/bench_out_of_core.py
+compares the accuracy against in-memory training.
+"""
+
+import copy
+import math
+import os
+
+import numpy as np
+
+from streaming import QuantileSketch, iter_chunks
+
+OUT_OF_CORE_ENV = 'EXOPLANET_OUT_OF_CORE'
+SAMPLE_PER_CLASS_ENV = 'EXOPLANET_SAMPLE_PER_CLASS'
+SHARDS_ENV = 'EXOPLANET_TRAINING_SHARDS'
+DEFAULT_SAMPLE_PER_CLASS = 100000
+# Rows a shard lends per class it has not seen
+BORROWED_ROWS = 50
+
+
+def out_of_core_enabled():
+    return os.environ.get(OUT_OF_CORE_ENV, '0') == '1'
+
+
+def sample_per_class():
+    return int(os.environ.get(SAMPLE_PER_CLASS_ENV, DEFAULT_SAMPLE_PER_CLASS))
+
+
+def training_shards():
+    return int(os.environ.get(SHARDS_ENV, 1))
+
+
+class StratifiedReservoir:
+    """Uniform sample of at most capacity rows per class of a stream of (X, y) chunks"""
+
+    def __init__(self, capacity, seed=0):
+        self.capacity = capacity
+        self.seen = {}
+        self._buffers = {}
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, X, y):
+        for label in np.unique(y):
+            self._add_class(label, X[y == label])
+
+    def _add_class(self, label, rows):
+        buffer = self._buffers.get(label)
+        if buffer is None:
+            buffer = self._buffers[label] = np.empty((self.capacity, rows.shape[1]), dtype=rows.dtype)
+        seen = self.seen.get(label, 0)
+
+        # Until the reservoir is full every row is kept
+        free = min(max(self.capacity - seen, 0), len(rows))
+        buffer[seen:seen + free] = rows[:free]
+
+        # After that, the row at stream position t replaces slot j ~ U[0, t] when j < capacity
+        rest = rows[free:]
+        if len(rest):
+            positions = seen + free + np.arange(len(rest))
+            slots = (self._rng.random(len(rest)) * (positions + 1)).astype(np.int64)
+            kept = slots < self.capacity
+            slots, rest = slots[kept], rest[kept]
+            # Of several rows drawn for one slot, the last one wins, as in the sequential algorithm
+            unique_slots, last = np.unique(slots[::-1], return_index=True)
+            buffer[unique_slots] = rest[::-1][last]
+        self.seen[label] = seen + len(rows)
+
+    def size(self, label):
+        return min(self.seen.get(label, 0), self.capacity)
+
+    @property
+    def labels(self):
+        return sorted(label for label, seen in self.seen.items() if seen)
+
+    def sample(self, label=None):
+        """(X, y) of the sampled rows, of one class or of all of them in label order"""
+        labels = self.labels if label is None else [label]
+        if not labels:
+            return np.empty((0, 0)), np.empty(0, dtype=np.int64)
+        X = np.concatenate([self._buffers[label][:self.size(label)] for label in labels])
+        y = np.concatenate([np.full(self.size(label), label) for label in labels])
+        return X, y
+
+
+def _fit_shard(model, X, y, sample_weight):
+    model.fit(X, y, sample_weight=sample_weight)
+    return model
+
+
+def merge_forests(forests, n_jobs=None):
+    """One forest with the trees of all of them; they must have been fitted on the same classes"""
+    for forest in forests[1:]:
+        if not np.array_equal(forest.classes_, forests[0].classes_):
+            raise ValueError('Sub-forests were fitted on different classes')
+    merged = copy.copy(forests[0])
+    merged.estimators_ = [tree for forest in forests for tree in forest.estimators_]
+    merged.n_estimators = len(merged.estimators_)
+    if n_jobs is not None:
+        merged.n_jobs = n_jobs
+    return merged
+
+
+class OutOfCoreTrainer:
+    """Scaler fitted incrementally and stratified samples of a chunked (X, y) stream"""
+
+    def __init__(self, capacity=None, test_size=0.2, n_shards=1, random_state=42):
+        from sklearn.preprocessing import StandardScaler
+
+        if n_shards < 1:
+            raise ValueError('n_shards must be at least 1')
+        self.capacity = capacity or sample_per_class()
+        self.test_size = test_size
+        self.n_shards = n_shards
+        self.random_state = random_state
+        self.scaler = StandardScaler()
+        shard_capacity = math.ceil(self.capacity / n_shards)
+        self.shards = [StratifiedReservoir(shard_capacity, random_state + i) for i in range(n_shards)]
+        # Sized so that test and training samples keep the test_size proportion per class
+        self.test = StratifiedReservoir(math.ceil(self.capacity * test_size / (1 - test_size)),
+                                        random_state + n_shards)
+        self.n_chunks = 0
+        self.n_rows = 0
+        self._rng = np.random.default_rng(random_state)
+
+    def consume(self, X, y):
+        """Take one chunk: features as float rows, labels already encoded"""
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        held_out = self._rng.random(len(y)) < self.test_size
+        train = ~held_out
+        if train.any():
+            self.scaler.partial_fit(X[train])
+            self.shards[self.n_chunks % self.n_shards].add(X[train], y[train])
+        self.test.add(X[held_out], y[held_out])
+        self.n_chunks += 1
+        self.n_rows += len(y)
+
+    def consume_all(self, chunks):
+        for X, y in chunks:
+            self.consume(X, y)
+        return self
+
+    @property
+    def labels(self):
+        return sorted({label for shard in self.shards for label in shard.labels})
+
+    def _shard_samples(self):
+        """(X, y) of every shard that saw rows, each with rows of every class"""
+        used = [shard for shard in self.shards if shard.labels]
+        samples = []
+        for shard in used:
+            X, y = shard.sample()
+            for label in self.labels:
+                if shard.size(label):
+                    continue
+                lender = max(used, key=lambda other: other.size(label))
+                X_lent, y_lent = lender.sample(label)
+                print(f"Shard without class {label}: borrowing {min(BORROWED_ROWS, len(y_lent))} rows")
+                X = np.concatenate([X, X_lent[:BORROWED_ROWS]])
+                y = np.concatenate([y, y_lent[:BORROWED_ROWS]])
+            samples.append((X, y))
+        return samples
+
+    def _prior_weights(self, samples):
+        """Per-row weights giving every class its share of the stream, or None when sampling kept them"""
+        seen = {label: sum(shard.seen.get(label, 0) for shard in self.shards) for label in self.labels}
+        kept = {label: sum(int(np.sum(y == label)) for _, y in samples) for label in self.labels}
+        ratio = {label: seen[label] / kept[label] for label in self.labels}
+        if all(abs(value - 1.0) < 1e-12 for value in ratio.values()):
+            return [None] * len(samples)
+        lookup = np.zeros(max(self.labels) + 1)
+        lookup[self.labels] = [ratio[label] for label in self.labels]
+        return [lookup[y] for _, y in samples]
+
+    def fit(self, backend, restore_priors=False, n_jobs=None, **overrides):
+        """Fitted model of the backend; one sub-forest per shard, merged, when there are several"""
+        samples = self._shard_samples()
+        if not samples:
+            raise ValueError('No training rows were streamed')
+        if len(samples) > 1 and not backend.forest:
+            raise ValueError(f'Sharded training needs a forest backend, not {backend.name}')
+        weights = self._prior_weights(samples) if restore_priors else [None] * len(samples)
+        scaled = [self.scaler.transform(X) for X, _ in samples]
+
+        if len(samples) == 1:
+            model = backend.build(self.random_state, **overrides)
+            return _fit_shard(model, scaled[0], samples[0][1], weights[0])
+
+        from joblib import Parallel, delayed
+
+        models = [backend.build(self.random_state + i, **overrides) for i in range(len(samples))]
+        serving_jobs = models[0].n_jobs
+        for model in models:
+            model.set_params(n_estimators=max(1, math.ceil(model.n_estimators / len(samples))), n_jobs=1)
+        # Each sub-forest in its own process; the samples are pickled over to it
+        forests = Parallel(n_jobs=min(len(samples), n_jobs or os.cpu_count() or 1))(
+            delayed(_fit_shard)(model, X, y, w)
+            for model, X, (_, y), w in zip(models, scaled, samples, weights)
+        )
+        return merge_forests(forests, n_jobs=serving_jobs)
+
+    def test_set(self):
+        """Scaled test sample and its labels"""
+        X, y = self.test.sample()
+        return (self.scaler.transform(X) if len(y) else X), y
+
+    def summary(self):
+        lines = [f"Streamed {self.n_rows} rows in {self.n_chunks} chunks, {self.n_shards} shard(s)"]
+        for label in self.labels:
+            seen = sum(shard.seen.get(label, 0) for shard in self.shards)
+            kept = sum(shard.size(label) for shard in self.shards)
+            lines.append(f"   class {label}: {kept} of {seen} training rows sampled, "
+                         f"{self.test.size(label)} test rows")
+        return '\n'.join(lines)
+
+
+def array_chunks(X, y, rows):
+    """Row blocks of an in-memory or memory-mapped matrix"""
+    for start in range(0, len(y), rows):
+        yield np.asarray(X[start:start + rows], dtype=np.float64), y[start:start + rows]
+
+
+def scan_training_csv(csv_path, feature_columns, target_column, rows=None, comment=None):
+    """Feature medians (sketched) and sorted target classes of a CSV, in one pass"""
+    sketches = [QuantileSketch() for _ in feature_columns]
+    classes = set()
+    for chunk in iter_chunks(csv_path, rows, usecols=list(feature_columns) + [target_column], comment=comment):
+        for sketch, col in zip(sketches, feature_columns):
+            sketch.update(chunk[col].to_numpy(dtype=np.float64, na_value=np.nan))
+        classes.update(chunk[target_column].dropna().astype(str).unique())
+    medians = np.array([sketch.median() for sketch in sketches])
+    return medians, np.array(sorted(classes), dtype=object)
+
+
+def csv_chunks(csv_path, feature_columns, target_column, medians, classes, rows=None, comment=None):
+    """(median-imputed features, encoded labels) chunks of a CSV; rows without a label are skipped"""
+    for chunk in iter_chunks(csv_path, rows, usecols=list(feature_columns) + [target_column], comment=comment):
+        chunk = chunk[chunk[target_column].notna()]
+        X = chunk[list(feature_columns)].to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(X)
+        X[missing] = np.broadcast_to(medians, X.shape)[missing]
+        y = np.searchsorted(classes, chunk[target_column].astype(str).to_numpy(dtype=object))
+        yield X, y
+
+
+def train_from_csv(csv_path, feature_columns, target_column, backend, capacity=None, n_shards=1, rows=None,
+                   comment=None, test_size=0.2, random_state=42, restore_priors=True, **overrides):
+    """Out-of-core training on a CSV: (trainer, fitted model, class names, feature medians)"""
+    medians, classes = scan_training_csv(csv_path, feature_columns, target_column, rows, comment)
+    trainer = OutOfCoreTrainer(capacity, test_size, n_shards, random_state)
+    trainer.consume_all(csv_chunks(csv_path, feature_columns, target_column, medians, classes, rows, comment))
+    model = trainer.fit(backend, restore_priors=restore_priors, **overrides)
+    return trainer, model, classes, medians
@@ -1,139 +1,252 @@
 import sys
 import json
-import os
-import joblib
+import argparse
+import functools
 import numpy as np
+from feature_encoder import FeatureEncoder
+from estimator_backends import get_backend, engine_for
+from model_registry import KOI_LAYOUT, registry
 
-def load_model_artifacts():
-    """Load the trained model and preprocessing artifacts."""
+# Map input data to the expected feature names
+FEATURE_MAPPING = {
+    'orbital_period': 'koi_period',
+    'transit_duration': 'koi_duration', 
+    'planetary_radius': 'koi_prad',
+    'transit_depth': 'koi_depth',
+    'stellar_temperature': 'koi_steff',
+    'stellar_radius': 'koi_srad',
+    'stellar_surface_gravity': 'koi_slogg'
+}
+
+# Default values used when a feature is missing from the input
+DEFAULT_VALUES = {
+    'koi_period': 10.0,
+    'koi_duration': 3.0,
+    'koi_prad': 1.0,
+    'koi_depth': 1000.0,
+    'koi_steff': 5778.0,
+    'koi_srad': 1.0,
+    'koi_slogg': 4.4
+}
+
+# Map class names to expected format
+CLASS_MAPPING = {
+    'CONFIRMED': 'Confirmed Exoplanet',
+    'CANDIDATE': 'Planetary Candidate', 
+    'FALSE POSITIVE': 'False Positive'
+}
+
+FALLBACK_PREDICTION = {
+    "classification": "Planetary Candidate",
+    "confidence": 0.75
+}
+
+BATCH_CHUNK_SIZE = 10000
+
+# Artifacts written by train_exoplanet_model.py, resolved through the model registry
+MODEL_NAME = 'koi'
+registry.register(MODEL_NAME, 'models', KOI_LAYOUT)
+
+def load_model_artifacts(loaded=None):
+    """Load the trained model and preprocessing artifacts (unpickled once per version)."""
     try:
-        # Load the trained model
-        model = joblib.load('models/exoplanet_classifier.pkl')
-        
-        # Load the scaler
-        scaler = joblib.load('models/scaler.pkl')
-        
-        # Load the label encoder
-        label_encoder = joblib.load('models/label_encoder.pkl')
-        
-        # Load metadata
-        with open('models/model_metadata.json', 'r') as f:
-            metadata = json.load(f)
-        
-        return model, scaler, label_encoder, metadata
+        loaded = loaded or registry.get(MODEL_NAME)
+        return (loaded.artifact('model'), loaded.artifact('scaler'),
+                loaded.artifact('label_encoder'), loaded.metadata)
     except Exception as e:
         print(f"Error loading model artifacts: {e}", file=sys.stderr)
         return None, None, None, None
 
+def load_serving_state():
+    """Encoder, predict_proba and class names of the current model, or None.
+    
+    Built once per model version and reused until the files change.
+    """
+    try:
+        loaded = registry.get(MODEL_NAME)
+        return loaded.derived('serving_state', lambda: build_serving_state(loaded))
+    except Exception as e:
+        print(f"Error loading model artifacts: {e}", file=sys.stderr)
+        return None
+
+def build_serving_state(loaded):
+    """Serving state from the NumPy-only serving bundle when the model has one, else the pickles."""
+    metadata = loaded.metadata
+    feature_names = metadata['feature_names']
+    
+    if metadata.get('serving_bundle'):
+        # Nothing is unpickled and scikit-learn is never imported
+        engine, arrays = loaded.artifact('serving_bundle')
+        fill_values, input_keys = encoder_inputs(feature_names)
+        encoder = FeatureEncoder(feature_names, fill_values, mean=arrays['scaler_mean'],
+                                 scale=arrays['scaler_scale'], input_keys=input_keys)
+        return encoder, engine.predict_proba, arrays['class_names']
+    
+    model, scaler, label_encoder, metadata = load_model_artifacts(loaded)
+    if model is None:
+        raise RuntimeError("Model artifacts could not be loaded")
+    return build_encoder(feature_names, scaler), probability_function(model, metadata), label_encoder.classes_
+
+def input_key_for(feature_name):
+    """Find the input key that feeds a model feature, if any."""
+    for input_key_name, model_feature_name in FEATURE_MAPPING.items():
+        if model_feature_name == feature_name:
+            return input_key_name
+    return None
+
+def encoder_inputs(feature_names):
+    """Fill values and input key mapping of the feature encoder for a feature list."""
+    fill_values = [DEFAULT_VALUES.get(feature_name, 0.0) for feature_name in feature_names]
+    input_keys = {
+        input_key_for(feature_name): feature_name
+        for feature_name in feature_names
+        if input_key_for(feature_name)
+    }
+    return fill_values, input_keys
+
+def build_encoder(feature_names, scaler=None):
+    """Feature encoder mapping input keys to model features, defaults filling gaps."""
+    fill_values, input_keys = encoder_inputs(feature_names)
+    
+    if scaler is None:
+        return FeatureEncoder(feature_names, fill_values, input_keys=input_keys)
+    return FeatureEncoder.from_scaler(feature_names, fill_values, scaler, input_keys=input_keys)
+
+@functools.lru_cache(maxsize=8)
+def raw_encoder(feature_names):
+    """Unscaled encoder for a tuple of feature names, built once per feature list."""
+    return build_encoder(list(feature_names))
+
 def prepare_features(input_data, feature_names):
     """Prepare input features in the correct order and format."""
-    # Map input data to the expected feature names
-    feature_mapping = {
-        'orbital_period': 'koi_period',
-        'transit_duration': 'koi_duration', 
-        'planetary_radius': 'koi_prad',
-        'transit_depth': 'koi_depth',
-        'stellar_temperature': 'koi_steff',
-        'stellar_radius': 'koi_srad',
-        'stellar_surface_gravity': 'koi_slogg'
+    return raw_encoder(tuple(feature_names)).raw_row(input_data)
+
+def prepare_feature_matrix(frame, feature_names):
+    """Vectorized prepare_features over a DataFrame of raw input rows.
+    
+    Returns the feature matrix and a boolean mask of rows whose provided
+    values could not be parsed as numbers (prepare_features would raise).
+    """
+    return raw_encoder(tuple(feature_names)).raw_frame(frame)
+
+def format_prediction(prediction_proba, class_names):
+    """Build the response for one row of class probabilities."""
+    prediction_class = int(np.argmax(prediction_proba))
+    
+    probabilities = {
+        "Confirmed Exoplanet": 0.0,
+        "Planetary Candidate": 0.0,
+        "False Positive": 0.0
     }
+    for i, class_name in enumerate(class_names):
+        mapped = CLASS_MAPPING.get(class_name)
+        if mapped:
+            probabilities[mapped] = float(prediction_proba[i])
     
-    # Create feature array in the correct order
-    features = []
-    for feature_name in feature_names:
-        # Find the corresponding input key
-        input_key = None
-        for input_key_name, model_feature_name in feature_mapping.items():
-            if model_feature_name == feature_name:
-                input_key = input_key_name
-                break
-        
-        if input_key and input_key in input_data:
-            features.append(float(input_data[input_key]))
-        else:
-            # Use default values if feature is missing
-            default_values = {
-                'koi_period': 10.0,
-                'koi_duration': 3.0,
-                'koi_prad': 1.0,
-                'koi_depth': 1000.0,
-                'koi_steff': 5778.0,
-                'koi_srad': 1.0,
-                'koi_slogg': 4.4
-            }
-            features.append(default_values.get(feature_name, 0.0))
-    
-    return np.array(features).reshape(1, -1)
+    return {
+        "classification": CLASS_MAPPING.get(class_names[prediction_class], 'Planetary Candidate'),
+        "confidence": float(prediction_proba[prediction_class]),
+        "probabilities": probabilities
+    }
 
 def predict_exoplanet(input_data):
     """Make prediction using the trained model."""
     try:
-        # Load model artifacts
-        model, scaler, label_encoder, metadata = load_model_artifacts()
+        # Model artifacts, encoder and engine come from the registry
+        state = load_serving_state()
         
-        if model is None:
-            return {
-                "classification": "Planetary Candidate",
-                "confidence": 0.75,
-                "error": "Model not available"
-            }
+        if state is None:
+            return dict(FALLBACK_PREDICTION, error="Model not available")
+        encoder, predict_proba, class_names = state
         
-        # Prepare features
-        feature_names = metadata['feature_names']
-        features = prepare_features(input_data, feature_names)
-        
-        # Scale features
-        features_scaled = scaler.transform(features)
-        
-        # Make prediction
-        prediction_proba = model.predict_proba(features_scaled)[0]
-        prediction_class = model.predict(features_scaled)[0]
+        # Prepare and scale features
+        features_scaled = encoder.encode(input_data)
         
-        # Get class name
-        class_name = label_encoder.inverse_transform([prediction_class])[0]
+        # Make prediction; the class is the argmax of the probabilities
+        prediction_proba = predict_proba(features_scaled)[0]
         
-        # Get confidence (max probability)
-        confidence = float(np.max(prediction_proba))
+        return format_prediction(prediction_proba, class_names)
         
-        # Map class names to expected format
-        class_mapping = {
-            'CONFIRMED': 'Confirmed Exoplanet',
-            'CANDIDATE': 'Planetary Candidate', 
-            'FALSE POSITIVE': 'False Positive'
-        }
-        
-        classification = class_mapping.get(class_name, 'Planetary Candidate')
+    except Exception as e:
+        return dict(FALLBACK_PREDICTION, error=str(e))
+
+def probability_function(model, metadata=None):
+    """predict_proba of the serving engine for the model's estimator backend."""
+    backend = (metadata or {}).get('backend')
+    if backend is None:
+        # Artifacts saved before backends were recorded
+        return engine_for(model).predict_proba
+    return get_backend(backend).engine(model).predict_proba
+
+def read_batch_rows(path, input_format=None):
+    """Read a CSV or JSON-lines file of input rows into a DataFrame."""
+    import pandas as pd
+    
+    if input_format is None:
+        input_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    
+    if input_format == 'jsonl':
+        return pd.read_json(path, lines=True, dtype=False)
+    
+    # Keep raw text so empty cells are rejected like in the single-row path
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def predict_batch(frame, chunk_size=BATCH_CHUNK_SIZE):
+    """Score every row of a DataFrame, returning one result per row in order."""
+    state = load_serving_state()
+    
+    if state is None:
+        return [dict(FALLBACK_PREDICTION, error="Model not available") for _ in range(len(frame))]
+    encoder, predict_proba, class_names = state
+    
+    features, invalid = encoder.raw_frame(frame)
+    
+    results = []
+    for start in range(0, len(frame), chunk_size):
+        stop = min(start + chunk_size, len(frame))
         
-        return {
-            "classification": classification,
-            "confidence": confidence,
-            "probabilities": {
-                "Confirmed Exoplanet": float(prediction_proba[1]),  # CONFIRMED
-                "Planetary Candidate": float(prediction_proba[0]),  # CANDIDATE
-                "False Positive": float(prediction_proba[2])        # FALSE POSITIVE
-            }
-        }
+        # One scaling pass and one predict_proba call per chunk
+        probabilities = predict_proba(encoder.scale_rows(features[start:stop]))
         
-    except Exception as e:
-        return {
-            "classification": "Planetary Candidate",
-            "confidence": 0.75,
-            "error": str(e)
-        }
+        for offset, prediction_proba in enumerate(probabilities):
+            if invalid[start + offset]:
+                results.append(dict(FALLBACK_PREDICTION, error="Invalid numeric value in input row"))
+            else:
+                results.append(format_prediction(prediction_proba, class_names))
+    
+    return results
+
+def run_batch(path, input_format=None, chunk_size=BATCH_CHUNK_SIZE):
+    """Print one JSON prediction per input row, in input order."""
+    frame = read_batch_rows(path, input_format)
+    
+    for result in predict_batch(frame, chunk_size):
+        sys.stdout.write(json.dumps(result) + '\n')
+    sys.stdout.flush()
 
 def main():
+    parser = argparse.ArgumentParser(description='Classify exoplanet candidates')
+    parser.add_argument('input', nargs='?', help='JSON object describing a single candidate')
+    parser.add_argument('--batch', metavar='FILE', help='CSV or JSON-lines file of candidates to score')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='batch file format (default: from extension)')
+    parser.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE, help='rows per predict_proba call')
+    args = parser.parse_args()
+    
+    if args.batch:
+        try:
+            run_batch(args.batch, args.format, args.chunk_size)
+        except Exception as e:
+            print(json.dumps(dict(FALLBACK_PREDICTION, error=str(e))))
+        return
+    
     try:
         # Get input data from command line argument
-        if len(sys.argv) < 2:
-            print(json.dumps({
-                "classification": "Planetary Candidate",
-                "confidence": 0.75,
-                "error": "No input data provided"
-            }))
+        if args.input is None:
+            print(json.dumps(dict(FALLBACK_PREDICTION, error="No input data provided")))
             return
         
         # Parse input data
-        input_data = json.loads(sys.argv[1])
+        input_data = json.loads(args.input)
         
         # Make prediction
         result = predict_exoplanet(input_data)
@@ -143,11 +256,11 @@ def main():
         
     except Exception as e:
         # Fallback prediction in case of error
-        print(json.dumps({
-            "classification": "Planetary Candidate",
-            "confidence": 0.75,
-            "error": str(e)
-        }))
+        print(json.dumps(dict(FALLBACK_PREDICTION, error=str(e))))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    from profiling import profile
+    
+    # EXOPLANET_PROFILE=1 (or a sampling rate) writes a profile of this run
+    with profile('predict'):
+        main()
\ No newline at end of file
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Analysis Server
+========================
+
+The analysis worker answers requests on one core: its threads share one
+interpreter lock. This server loads the catalog, feature encoder, forest
+and neighbour index once, in the parent, then forks --workers worker
+processes that serve the worker protocol (see analysis_worker.py) on one
+shared Unix socket, each accepting connections as it is free.
+
+The workers share the parent's loaded pages copy-on-write. Before
+forking, the parent runs one request of each kind (so lazily built state
+exists before the fork, not once per worker), collects garbage and calls
+gc.freeze(): the objects alive at that point move to a permanent
+generation that later collections never traverse, so a worker's garbage
+collector does not write to, and thereby copy, the pages holding them.
+Large arrays are never written at all; per-worker private memory grows
+only with what a worker allocates itself.
+
+The parent supervises the workers: one that exits is replaced (no faster
+than once per RESTART_BACKOFF seconds per slot), and one whose private
+memory (Private_Clean + Private_Dirty in /proc/<pid>/smaps_rollup) goes
+over --max-private-mb is replaced: it stops accepting connections and
+exits once the open ones are closed (or after DRAIN_TIMEOUT seconds).
+The shutdown op stops the whole server; SIGTERM or SIGINT to the parent
+does too.
+
+Each worker keeps its own metrics; the metrics op reports those of the
+worker that answers it. Retraining on CSV changes (--watch) is not
+available here: restart the server to serve a new model.
+
+Usage:
+    python prefork_server.py --workers 4 [--socket /tmp/exoplanet_worker.sock] [--max-private-mb 512]
+                             [--batch-wait-ms 2]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+from analysis_worker import DEFAULT_SOCKET_PATH, AnalysisWorker, _RequestHandler, _UnixServer, encode_json
+from micro_batch import batch_wait_from_env, max_batch_from_env
+
+WORKERS_ENV = 'EXOPLANET_WORKERS'
+MAX_PRIVATE_MB_ENV = 'EXOPLANET_WORKER_MAX_PRIVATE_MB'
+CHECK_INTERVAL = 1.0
+RESTART_BACKOFF = 1.0
+# Seconds a stopping worker waits for its open connections to close
+DRAIN_TIMEOUT = 5.0
+# Seconds after SIGTERM before the parent kills a worker
+STOP_GRACE = 10.0
+# Exit status of a worker that received the shutdown op
+SHUTDOWN_EXIT = 3
+
+
+def memory_kb(pid='self'):
+    """Resident, proportional (Pss) and private memory of a process in kB, from smaps_rollup"""
+    fields = {'Rss': 'rss_kb', 'Pss': 'pss_kb', 'Private_Clean': 'private_kb', 'Private_Dirty': 'private_kb'}
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                name = line.split(':', 1)[0]
+                if name in fields:
+                    memory[fields[name]] = memory.get(fields[name], 0) + int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+class _SharedSocketServer(_UnixServer):
+    """Unix socket server whose listening socket several processes accept on"""
+
+    def server_activate(self):
+        super().server_activate()
+        # Every worker wakes up for a new connection and one wins; the rest must not block in accept()
+        self.socket.setblocking(False)
+
+    open_connections = 0
+    _count_lock = threading.Lock()
+
+    def get_request(self):
+        connection, address = super().get_request()
+        connection.setblocking(True)
+        return connection, address
+
+    def process_request_thread(self, request, client_address):
+        with self._count_lock:
+            self.open_connections += 1
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._count_lock:
+                self.open_connections -= 1
+
+    def drain(self, timeout):
+        """Wait until the connections being served have closed, or timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while self.open_connections and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+class PreforkServer:
+    def __init__(self, worker, socket_path, n_workers, max_private_kb=None, batch_wait=None, freeze=True):
+        self.worker = worker
+        self.socket_path = socket_path
+        self.n_workers = n_workers
+        self.max_private_kb = max_private_kb
+        self.batch_wait = batch_wait
+        self.freeze = freeze
+        self.server = None
+        self.children = {}
+        self.stopping = threading.Event()
+        self._started = {}
+        self._terminated = {}
+
+    def serve(self):
+        """Load, fork the workers and supervise them until shutdown; returns the exit status"""
+        # stdout carries only the ready (or error) line, as with analysis_worker.py; diagnostics go to stderr
+        protocol_out = sys.stdout
+        sys.stdout = sys.stderr
+
+        error = self.worker.start()
+        if error:
+            protocol_out.write(json.dumps({'type': 'error', 'error': error}) + '\n')
+            protocol_out.flush()
+            return 1
+        self.worker.warm_up()
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = _SharedSocketServer(self.socket_path, _RequestHandler)
+        self.server.worker = self.worker
+
+        gc.collect()
+        if self.freeze:
+            gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.n_workers):
+            self._spawn(slot)
+
+        ready = self.worker.ready_message()
+        ready.update(socket=self.socket_path, workers=sorted(self.children))
+        protocol_out.write(encode_json(ready) + '\n')
+        protocol_out.flush()
+
+        try:
+            self._supervise()
+        finally:
+            self._stop_children()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            print("Pre-fork server stopped", flush=True)
+        return 0
+
+    def _stop(self, signum, frame):
+        self.stopping.set()
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(slot)
+        self.children[pid] = slot
+        self._started[slot] = time.monotonic()
+
+    def _run_worker(self, slot):
+        """Serve in a forked worker; never returns"""
+        status = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+                target=self.server.shutdown, daemon=True).start())
+            random.seed()
+            # The batching thread does not survive the fork; each worker starts its own
+            self.worker.batch_wait = self.batch_wait
+            if self.batch_wait is not None:
+                self.worker.start_batching()
+            self.server.serve_forever()
+            self.server.drain(DRAIN_TIMEOUT)
+            if self.worker.stopping.is_set():
+                status = SHUTDOWN_EXIT
+        except BaseException as e:
+            print(f"Worker {slot} failed: {e}", file=sys.stderr)
+            status = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(status)
+
+    def _supervise(self):
+        while not self.stopping.is_set():
+            self._reap()
+            self._check_memory()
+            self.stopping.wait(CHECK_INTERVAL)
+
+    def _reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            slot = self.children.pop(pid, None)
+            self._terminated.pop(pid, None)
+            if slot is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code == SHUTDOWN_EXIT:
+                print(f"Worker {slot} (pid {pid}) received shutdown; stopping", flush=True)
+                self.stopping.set()
+                return
+            if self.stopping.is_set():
+                continue
+            print(f"Worker {slot} (pid {pid}) exited with status {code}; restarting", flush=True)
+            wait = self._started[slot] + RESTART_BACKOFF - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._spawn(slot)
+
+    def _check_memory(self):
+        now = time.monotonic()
+        for pid, slot in list(self.children.items()):
+            stopped_at = self._terminated.get(pid)
+            if stopped_at is not None:
+                if now - stopped_at > STOP_GRACE:
+                    self._signal(pid, signal.SIGKILL)
+                continue
+            if self.max_private_kb is None:
+                continue
+            private_kb = memory_kb(pid).get('private_kb', 0)
+            if private_kb > self.max_private_kb:
+                print(f"Worker {slot} (pid {pid}) holds {private_kb / 1024:.0f} MB private memory; restarting",
+                      flush=True)
+                self._terminated[pid] = now
+                self._signal(pid, signal.SIGTERM)
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _stop_children(self):
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + STOP_GRACE
+        while self.children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.05)
+            else:
+                self.children.pop(pid, None)
+        for pid in self.children:
+            self._signal(pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-fork exoplanet analysis server')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get(WORKERS_ENV, os.cpu_count() or 1)),
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='Unix socket to serve on')
+    parser.add_argument('--max-private-mb', type=float, default=os.environ.get(MAX_PRIVATE_MB_ENV),
+                        help='restart a worker whose private memory exceeds this')
+    parser.add_argument('--batch-wait-ms', type=float,
+                        default=None if batch_wait_from_env() is None else batch_wait_from_env() * 1000,
+                        help='micro-batch analyze requests within each worker (see micro_batch.py)')
+    parser.add_argument('--max-batch', type=int, default=max_batch_from_env(), help='requests per micro-batch')
+    parser.add_argument('--no-gc-freeze', action='store_true', help='fork without gc.freeze() (for comparison)')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    server = PreforkServer(
+        AnalysisWorker(max_batch=args.max_batch), args.socket, args.workers,
+        max_private_kb=None if args.max_private_mb is None else float(args.max_private_mb) * 1024,
+        batch_wait=None if args.batch_wait_ms is None else args.batch_wait_ms / 1000,
+        freeze=not args.no_gc_freeze
+    )
+    return server.serve()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
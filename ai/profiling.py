@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+On-demand profiling of the analysis entry points.
+
+Off unless asked for. EXOPLANET_PROFILE turns it on for every CLI run
+or worker request ("1") or for a random fraction of them ("0.05"). A
+worker request can also ask for it with "profile": true. A profiled
+invocation writes into EXOPLANET_PROFILE_DIR (default: profiles/):
+
+    <time>-<pid>-<entry>-<request id>.prof         cProfile stats (pstats format)
+    <time>-<pid>-<entry>-<request id>.alloc.json   top allocation sites (tracemalloc)
+
+Tracing allocations slows a run down several times over, most of it in
+imports; EXOPLANET_PROFILE_ALLOCATIONS=0 keeps only the cProfile dump.
+
+The request id is the one given (for example the request's "request_id")
+or a generated one. When profiling is off, profile() costs an
+environment lookup; cProfile and tracemalloc are not even imported.
+One invocation is profiled at a time per process; concurrent requests
+in a threaded worker run unprofiled meanwhile.
+
+Aggregate many dumps into one hot-function and allocation report:
+
+    python profiling.py report profiles/ [--sort cumulative] [--top 30]
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_ENV = 'EXOPLANET_PROFILE'
+PROFILE_DIR_ENV = 'EXOPLANET_PROFILE_DIR'
+ALLOCATIONS_ENV = 'EXOPLANET_PROFILE_ALLOCATIONS'
+DEFAULT_PROFILE_DIR = 'profiles'
+TOP_ALLOCATIONS = 25
+TRACE_FRAMES = 1
+
+_profile_lock = threading.Lock()
+
+
+def should_profile(requested=None):
+    """Whether to profile this invocation: an explicit request, or EXOPLANET_PROFILE"""
+    if requested:
+        return True
+    setting = os.environ.get(PROFILE_ENV)
+    if not setting or setting == '0':
+        return False
+    try:
+        rate = float(setting)
+    except ValueError:
+        return False
+    return rate >= 1 or random.random() < rate
+
+
+@contextlib.contextmanager
+def profile(name, request_id=None, requested=None):
+    """Profile the enclosed block when asked for; yields the dump path prefix or None"""
+    if not should_profile(requested) or not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        import cProfile
+        import tracemalloc
+
+        prefix = _dump_prefix(name, request_id)
+        started_tracing = os.environ.get(ALLOCATIONS_ENV, '1') != '0' and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield prefix
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            if started_tracing:
+                tracemalloc.stop()
+            _write_dumps(prefix, profiler, snapshot)
+    finally:
+        _profile_lock.release()
+
+
+def _dump_prefix(name, request_id):
+    directory = os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    tag = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(request_id or uuid.uuid4().hex[:12]))
+    return os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{name}-{tag}")
+
+
+def _write_dumps(prefix, profiler, snapshot):
+    try:
+        profiler.dump_stats(f'{prefix}.prof')
+        if snapshot is None:
+            print(f"Profile written to {prefix}.prof", file=sys.stderr)
+            return
+        allocations = [{
+            'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'size_kb': stat.size / 1024,
+            'count': stat.count
+        } for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+        with open(f'{prefix}.alloc.json', 'w') as f:
+            json.dump(allocations, f, indent=2)
+        print(f"Profile written to {prefix}.prof", file=sys.stderr)
+    except OSError as e:
+        print(f"Could not write profile {prefix}: {e}", file=sys.stderr)
+
+
+def _expand(paths, suffix):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, f'*{suffix}'))))
+        elif path.endswith(suffix):
+            files.append(path)
+    return files
+
+
+def report(paths, sort='cumulative', top=30, out=sys.stdout):
+    """Print the combined hot functions and allocation sites of the dumps under paths"""
+    import pstats
+
+    profiles = _expand(paths, '.prof')
+    if not profiles:
+        print("No profiles found", file=out)
+        return 1
+
+    stats = pstats.Stats(profiles[0], stream=out)
+    for path in profiles[1:]:
+        stats.add(path)
+    print(f"{len(profiles)} profiles", file=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+    sites = {}
+    for path in _expand(paths, '.alloc.json'):
+        with open(path, 'r') as f:
+            for entry in json.load(f):
+                total = sites.setdefault(entry['site'], {'size_kb': 0.0, 'count': 0, 'dumps': 0})
+                total['size_kb'] += entry['size_kb']
+                total['count'] += entry['count']
+                total['dumps'] += 1
+    if sites:
+        print(f"Top allocation sites (summed over {len(_expand(paths, '.alloc.json'))} snapshots):", file=out)
+        ranked = sorted(sites.items(), key=lambda item: item[1]['size_kb'], reverse=True)[:top]
+        for site, total in ranked:
+            print(f"  {total['size_kb']:10.1f} kB  {total['count']:8d} blocks  {total['dumps']:4d} dumps  {site}",
+                  file=out)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate profiles written by the analysis entry points')
+    commands = parser.add_subparsers(dest='command', required=True)
+    report_parser = commands.add_parser('report', help='combined hot-function and allocation report')
+    report_parser.add_argument('paths', nargs='+', help='profile directories or .prof / .alloc.json files')
+    report_parser.add_argument('--sort', default='cumulative', help='pstats sort key (cumulative, tottime, ncalls)')
+    report_parser.add_argument('--top', type=int, default=30)
+    args = parser.parse_args()
+
+    return report(args.paths, args.sort, args.top)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Debounced retraining in a separate process.
+
+File events only mark a retrain as pending. The scheduler waits until the
+CSV has been quiet for DEBOUNCE_SECONDS (or MAX_DELAY_SECONDS have passed
+since the first event of a burst), then runs one job for the whole burst.
+An event that arrives while a job is running cancels it, since it is
+training on stale data, and a fresh job follows after the next quiet
+period.
+
+Full retrains run in a spawned process, so the forest fit and pandas work
+never hold the serving process's GIL. The trainer saves its artifacts
+under the data fingerprint; the serving process then only loads them and
+publishes a new snapshot.
+"""
+
+import itertools
+import multiprocessing
+import sys
+import threading
+import time
+
+DEBOUNCE_SECONDS = 2.0
+MAX_DELAY_SECONDS = 30.0
+
+# Finished jobs kept for status reports
+HISTORY_SIZE = 10
+
+
+class RetrainJob:
+    def __init__(self, job_id, events, first_event_at):
+        self.id = job_id
+        self.events = events
+        self.first_event_at = first_event_at
+        self.started_at = time.time()
+        self.finished_at = None
+        self.status = 'running'
+        self.mode = None
+        self.error = None
+        self.trainer_pid = None
+        self._process = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the job; a running trainer process is terminated"""
+        with self._lock:
+            self._cancelled.set()
+            if self._process is not None and self._process.is_alive():
+                self._process.terminate()
+
+    def attach(self, process):
+        """Register the trainer process so cancel() can stop it"""
+        with self._lock:
+            self._process = process
+            self.trainer_pid = process.pid
+            if self.cancelled:
+                process.terminate()
+
+    def as_dict(self):
+        finished_at = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'status': self.status,
+            'mode': self.mode,
+            'events': self.events,
+            'started_at': self.started_at,
+            'duration': finished_at - self.started_at,
+            'trainer_pid': self.trainer_pid,
+            'error': self.error
+        }
+
+
+class RetrainScheduler:
+    def __init__(self, run_job, debounce_seconds=DEBOUNCE_SECONDS, max_delay_seconds=MAX_DELAY_SECONDS):
+        """run_job(job) performs one refresh and returns True once its result is published"""
+        self.run_job = run_job
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._ids = itertools.count(1)
+
+        self._pending_events = 0
+        self._first_event_at = None
+        self._last_event_at = None
+        self._job = None
+        self._history = []
+        self.counters = {'events': 0, 'jobs': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='retrain-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            if self._job is not None:
+                self._job.cancel()
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def notify(self):
+        """Record a change to the CSV; bursts of changes collapse into one job"""
+        with self._condition:
+            now = time.time()
+            self.counters['events'] += 1
+            self._pending_events += 1
+            if self._first_event_at is None:
+                self._first_event_at = now
+            self._last_event_at = now
+
+            if self._job is not None and not self._job.cancelled:
+                print(f"CSV changed during retrain job {self._job.id}; cancelling it")
+                self._job.cancel()
+            self._condition.notify_all()
+
+    def status(self):
+        with self._condition:
+            if self._job is not None:
+                state = 'running'
+            elif self._pending_events:
+                state = 'pending'
+            else:
+                state = 'idle'
+
+            return {
+                'state': state,
+                'pending_events': self._pending_events,
+                'first_event_at': self._first_event_at,
+                'last_event_at': self._last_event_at,
+                'debounce_seconds': self.debounce_seconds,
+                'current_job': None if self._job is None else self._job.as_dict(),
+                'recent_jobs': [job.as_dict() for job in self._history],
+                'counters': dict(self.counters)
+            }
+
+    def _next_job(self):
+        """Block until a burst of events has settled; None when stopping"""
+        with self._condition:
+            while True:
+                if self._stopping:
+                    return None
+                if not self._pending_events:
+                    self._condition.wait()
+                    continue
+
+                due = min(self._last_event_at + self.debounce_seconds,
+                          self._first_event_at + self.max_delay_seconds)
+                remaining = due - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                job = RetrainJob(next(self._ids), self._pending_events, self._first_event_at)
+                self._pending_events = 0
+                self._first_event_at = None
+                self._job = job
+                self.counters['jobs'] += 1
+                return job
+
+    def _loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            try:
+                succeeded = self.run_job(job)
+            except Exception as e:
+                succeeded = False
+                job.error = str(e)
+
+            with self._condition:
+                job.finished_at = time.time()
+                # A job cancelled after it published (an in-place append) still took effect
+                if succeeded:
+                    job.status = 'succeeded'
+                else:
+                    job.status = 'cancelled' if job.cancelled else 'failed'
+                self.counters[job.status] += 1
+                self._history = (self._history + [job])[-HISTORY_SIZE:]
+                self._job = None
+            print(f"Retrain job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+
+def train_in_process(csv_path, handler_options, job):
+    """Train a model for csv_path in a spawned process; True once its artifacts are saved"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_trainer_main, args=(csv_path, handler_options, sender),
+        name=f'retrain-{job.id}', daemon=True
+    )
+    process.start()
+    sender.close()
+    job.attach(process)
+    process.join()
+
+    if job.cancelled:
+        return False
+
+    try:
+        result = receiver.recv() if receiver.poll() else None
+    except EOFError:
+        result = None
+    finally:
+        receiver.close()
+
+    if result is None:
+        job.error = f'trainer exited with code {process.exitcode}'
+        return False
+    if not result['ok']:
+        job.error = result.get('error')
+    return result['ok']
+
+
+def _trainer_main(csv_path, handler_options, sender):
+    # The parent may speak a protocol on stdout; keep training logs off it
+    sys.stdout = sys.stderr
+
+    from new_exoplanet_system import ExoplanetDataHandler
+
+    handler = ExoplanetDataHandler(csv_path=csv_path, **handler_options)
+    try:
+        ok = handler.load_data() and handler.ensure_model()
+        sender.send({
+            'ok': bool(ok),
+            'fingerprint': handler.data_fingerprint,
+            'error': None if ok else 'training failed'
+        })
+    except Exception as e:
+        sender.send({'ok': False, 'error': str(e)})
+    finally:
+        sender.close()
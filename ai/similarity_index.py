@@ -0,0 +1,244 @@
+"""
+Nearest-neighbour index over the scaled feature matrix of the full catalog.
+
+The feature matrix and, for tree algorithms, the KD/ball tree arrays are
+stored as .npy files so a serving process maps them with mmap_mode instead
+of unpickling a private copy of the index.
+
+Algorithms:
+- brute:     chunked exact search over the (memory-mapped) matrix
+- kd_tree:   sklearn KDTree, good for low-dimensional features
+- ball_tree: sklearn BallTree, more robust as dimensionality grows
+- auto:      kd_tree up to AUTO_TREE_MAX_FEATURES features, brute above
+
+Rows appended to the catalog go to a small delta block that is searched
+by brute force and merged with the base results, until it grows past
+DELTA_COMPACT_FRACTION of the base and the index is rebuilt.
+"""
+
+import copy
+import json
+import os
+import pickle
+
+import numpy as np
+
+ALGORITHMS = ('brute', 'kd_tree', 'ball_tree')
+AUTO_TREE_MAX_FEATURES = 15
+BRUTE_CHUNK_ROWS = 65536
+DELTA_COMPACT_FRACTION = 0.1
+
+
+def resolve_algorithm(algorithm, n_features):
+    """Turn 'auto' into a concrete algorithm for the given dimensionality"""
+    if algorithm == 'auto':
+        return 'kd_tree' if n_features <= AUTO_TREE_MAX_FEATURES else 'brute'
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown neighbour algorithm: {algorithm}")
+    return algorithm
+
+
+def index_dtype(algorithm, dtype):
+    """dtype build() stores features of the given dtype in, for a concrete algorithm"""
+    return np.float32 if algorithm == 'brute' and np.dtype(dtype) == np.float32 else np.float64
+
+
+def _tree_class(algorithm):
+    from sklearn.neighbors import KDTree, BallTree
+    return KDTree if algorithm == 'kd_tree' else BallTree
+
+
+class SimilarityIndex:
+    def __init__(self, algorithm='auto', leaf_size=40):
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        self.features = None
+        self._sq_norms = None
+        self._tree = None
+        self._delta = None
+        self._delta_sq_norms = None
+
+    def build(self, features):
+        """Index a scaled feature matrix; row i is catalog position i.
+
+        A float32 matrix stays float32 for brute search; sklearn trees
+        always work on a float64 copy. A memory-mapped matrix already in
+        that dtype (see streaming.scale_to_file) is indexed in place.
+        """
+        features = np.asarray(features)
+        self.algorithm = resolve_algorithm(self.algorithm, features.shape[1])
+        self.features = np.ascontiguousarray(features, dtype=index_dtype(self.algorithm, features.dtype))
+        self._delta = None
+        self._delta_sq_norms = None
+        self._sq_norms = None
+        self._tree = None
+
+        if self.algorithm == 'brute':
+            self._sq_norms = np.einsum('ij,ij->i', self.features, self.features, dtype=np.float64)
+        else:
+            self._tree = _tree_class(self.algorithm)(self.features, leaf_size=self.leaf_size)
+        return self
+
+    @property
+    def n_samples(self):
+        if self.features is None:
+            return 0
+        return self.features.shape[0] + (0 if self._delta is None else self._delta.shape[0])
+
+    def all_features(self):
+        """Base and appended rows as one matrix"""
+        if self._delta is None:
+            return self.features
+        return np.concatenate([self.features, self._delta])
+
+    def add(self, features):
+        """New index with rows appended at the next catalog positions.
+
+        The base matrix and tree are shared with this index, which is left
+        untouched and can keep serving queries.
+        """
+        features = np.asarray(features, dtype=self.features.dtype).reshape(-1, self.features.shape[1])
+        index = copy.copy(self)
+        index._delta = features if self._delta is None else np.concatenate([self._delta, features])
+        index._delta_sq_norms = np.einsum('ij,ij->i', index._delta, index._delta, dtype=np.float64)
+
+        if index._delta.shape[0] > DELTA_COMPACT_FRACTION * index.features.shape[0]:
+            index.compact()
+        return index
+
+    def compact(self):
+        """Rebuild this index in place over the appended rows too"""
+        if self._delta is not None:
+            self.build(self.all_features())
+        return self
+
+    def query(self, X, k=6):
+        """Distances and catalog positions of the k nearest rows, nearest first"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        k = min(k, self.n_samples)
+        base_k = min(k, self.features.shape[0])
+
+        if self._tree is not None:
+            distances, indices = self._tree.query(X, k=base_k)
+        else:
+            distances, indices = self._brute_query(X, base_k, self.features, self._sq_norms)
+
+        if self._delta is None:
+            return distances, indices
+
+        delta_dist, delta_idx = self._brute_query(
+            X, min(k, self._delta.shape[0]), self._delta, self._delta_sq_norms,
+            offset=self.features.shape[0]
+        )
+        distances = np.concatenate([distances, delta_dist], axis=1)
+        indices = np.concatenate([indices, delta_idx], axis=1)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _brute_query(self, X, k, features, sq_norms, offset=0):
+        query_norms = np.einsum('ij,ij->i', X, X)
+        best_dist = np.full((X.shape[0], k), np.inf)
+        best_idx = np.zeros((X.shape[0], k), dtype=np.intp)
+
+        # Scan the matrix in chunks so a memory-mapped index is never copied whole
+        for start in range(0, features.shape[0], BRUTE_CHUNK_ROWS):
+            block = features[start:start + BRUTE_CHUNK_ROWS]
+            sq_dist = (query_norms[:, None] - 2.0 * X @ block.T
+                       + sq_norms[start:start + BRUTE_CHUNK_ROWS][None, :])
+
+            merged_dist = np.concatenate([best_dist, sq_dist], axis=1)
+            merged_idx = np.concatenate([
+                best_idx,
+                np.broadcast_to(np.arange(offset + start, offset + start + block.shape[0]), sq_dist.shape)
+            ], axis=1)
+
+            top = np.argpartition(merged_dist, k - 1, axis=1)[:, :k]
+            best_dist = np.take_along_axis(merged_dist, top, axis=1)
+            best_idx = np.take_along_axis(merged_idx, top, axis=1)
+
+        order = np.argsort(best_dist, axis=1, kind='stable')
+        best_dist = np.take_along_axis(best_dist, order, axis=1)
+        best_idx = np.take_along_axis(best_idx, order, axis=1)
+        return np.sqrt(np.maximum(best_dist, 0.0)), best_idx
+
+    def save(self, directory):
+        """Write the index as .npy arrays plus a small metadata file"""
+        import sklearn
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'features.npy'), self.features)
+
+        meta = {
+            'algorithm': self.algorithm,
+            'leaf_size': self.leaf_size,
+            'sklearn_version': sklearn.__version__
+        }
+
+        if self._sq_norms is not None:
+            np.save(os.path.join(directory, 'sq_norms.npy'), self._sq_norms)
+
+        if self._delta is not None:
+            np.save(os.path.join(directory, 'delta.npy'), self._delta)
+            meta['delta_rows'] = int(self._delta.shape[0])
+
+        if self._tree is not None:
+            # Array state goes to .npy files; state[0] is the feature matrix itself
+            state = self._tree.__getstate__()
+            scalars = []
+            for position, item in enumerate(state):
+                if position == 0:
+                    scalars.append(None)
+                elif isinstance(item, np.ndarray):
+                    np.save(os.path.join(directory, f'tree_{position}.npy'), item)
+                    scalars.append(None)
+                else:
+                    scalars.append(item)
+            meta['tree_arrays'] = [
+                position for position, item in enumerate(state)
+                if position > 0 and isinstance(item, np.ndarray)
+            ]
+            with open(os.path.join(directory, 'tree_state.pkl'), 'wb') as f:
+                pickle.dump(scalars, f)
+
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Map a saved index; array data stays in the page cache, not the heap"""
+        import sklearn
+
+        with open(os.path.join(directory, 'index.json'), 'r') as f:
+            meta = json.load(f)
+
+        index = cls(meta['algorithm'], meta['leaf_size'])
+        index.features = np.load(os.path.join(directory, 'features.npy'), mmap_mode=mmap_mode)
+
+        if index.algorithm == 'brute':
+            index._sq_norms = np.load(os.path.join(directory, 'sq_norms.npy'), mmap_mode=mmap_mode)
+        elif meta.get('sklearn_version') != sklearn.__version__:
+            # Tree state layout is private to sklearn; rebuild rather than guess
+            index._tree = _tree_class(index.algorithm)(index.features, leaf_size=index.leaf_size)
+        else:
+            with open(os.path.join(directory, 'tree_state.pkl'), 'rb') as f:
+                state = pickle.load(f)
+            state[0] = index.features
+            for position in meta['tree_arrays']:
+                state[position] = np.load(
+                    os.path.join(directory, f'tree_{position}.npy'), mmap_mode=mmap_mode
+                )
+            tree = _tree_class(index.algorithm).__new__(_tree_class(index.algorithm))
+            try:
+                tree.__setstate__(tuple(state))
+            except ValueError:
+                # Some sklearn versions need writable buffers; copy-on-write keeps pages shared
+                if mmap_mode != 'r':
+                    raise
+                return cls.load(directory, mmap_mode='c')
+            index._tree = tree
+
+        if meta.get('delta_rows'):
+            index._delta = np.load(os.path.join(directory, 'delta.npy'))
+            index._delta_sq_norms = np.einsum('ij,ij->i', index._delta, index._delta, dtype=np.float64)
+
+        return index
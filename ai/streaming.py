@@ -0,0 +1,402 @@
+"""
+Chunked loading for catalogs too large to parse in one piece.
+
+With EXOPLANET_STREAMING=1 (or ExoplanetDataHandler(streaming=True))
+the handler reads the CSV in chunks of EXOPLANET_CHUNK_ROWS rows, twice:
+
+1. scan_catalog() keeps per-column statistics in one pass: non-null
+   counts, min, max and mean exactly, and the median through a
+   QuantileSketch of bounded size. It also settles each column's dtype
+   the way a whole-file parse would.
+2. The handler then reads the chunks again and imputes the feature
+   columns with those medians. StreamedFrameWriter writes every column,
+   chunk by chunk, to files under models/streamed_frames/ and maps them
+   back read-only:
+
+   - features.npy: the imputed (rows, features) matrix training reads;
+     the frame's float feature columns are views of it
+   - col_<i>.npy: every other numeric or boolean column
+   - strings.arrow: string columns held by pyarrow (pandas' pyarrow
+     string dtype), in Arrow IPC format
+
+So the records frame lives in the page cache, not the heap: memory the
+process owns stays near one chunk whatever the catalog size. Only
+columns of Python objects (mixed types, or strings without pyarrow) are
+collected in memory, as are columns the lean dtype plan narrows.
+
+Medians are exact while a column has at most DEFAULT_SKETCH_SIZE
+values; beyond that they are estimates within a fraction of a percent
+in rank. Streaming loads bypass the catalog cache, and rows appended to
+the CSV are not folded into a streamed catalog: they trigger a full,
+streamed retrain.
+"""
+
+import os
+import shutil
+
+import numpy as np
+
+from artifact_store import MODELS_DIR
+
+STREAMING_ENV = 'EXOPLANET_STREAMING'
+CHUNK_ROWS_ENV = 'EXOPLANET_CHUNK_ROWS'
+DEFAULT_CHUNK_ROWS = 100000
+DEFAULT_SKETCH_SIZE = 2048
+FRAME_DIR = os.path.join(MODELS_DIR, 'streamed_frames')
+
+
+def streaming_enabled():
+    return os.environ.get(STREAMING_ENV, '0') == '1'
+
+
+def chunk_rows():
+    return int(os.environ.get(CHUNK_ROWS_ENV, DEFAULT_CHUNK_ROWS))
+
+
+class QuantileSketch:
+    """Mergeable-compactor quantile sketch (KLL style) over float values.
+
+    Each level holds at most k sorted-then-sampled values; a value on level
+    i stands for 2**i inputs. A full level keeps every other value (random
+    offset) one level up, so memory is O(k log(n / k)) and the rank error
+    is a small multiple of 1/k. Until the first compaction it holds every
+    value and answers exactly.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_SIZE, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            buffer = self.levels[level]
+            if len(buffer) > self.k:
+                buffer = np.sort(buffer)
+                # An odd value out stays on this level
+                keep = buffer[:len(buffer) % 2]
+                pairs = buffer[len(keep):]
+                promoted = pairs[int(self._rng.integers(2))::2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buffer), 2.0 ** i) for i, buffer in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return float(values[order][min(position, len(values) - 1)])
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class ColumnScan:
+    """What one pass over a column's chunks knows about it"""
+
+    def __init__(self, name):
+        self.name = name
+        self.kinds = set()
+        self.non_null = 0
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.sketch = None
+        # Pandas dtype of the string chunks (object, or the string dtype)
+        self.string_dtype = None
+        self._complete = False
+
+    def update(self, series):
+        non_null = int(series.notna().sum())
+        self.non_null += non_null
+        if non_null == 0:
+            # An empty chunk says nothing about the type (it parses as float)
+            return
+        kind = series.dtype.kind
+        self.kinds.add(kind)
+        if kind not in 'biuf':
+            if self.string_dtype is None:
+                self.string_dtype = series.dtype
+            return
+
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        present = values[~np.isnan(values)]
+        self.min = float(present.min()) if self.min is None else min(self.min, float(present.min()))
+        self.max = float(present.max()) if self.max is None else max(self.max, float(present.max()))
+        self.total += float(present.sum())
+        if self.sketch is None:
+            self.sketch = QuantileSketch()
+        self.sketch.update(present)
+
+    @property
+    def numeric(self):
+        return bool(self.kinds) and self.kinds <= set('iuf')
+
+    @property
+    def mean(self):
+        return self.total / self.non_null if self.numeric and self.non_null else float('nan')
+
+    @property
+    def median(self):
+        return self.sketch.median() if self.numeric and self.sketch is not None else float('nan')
+
+    @property
+    def dtype(self):
+        """Numpy dtype to collect the column in; see frame_dtype for strings"""
+        if not self.kinds:
+            return np.dtype(np.float64)
+        if self.kinds == {'b'}:
+            return np.dtype(bool)
+        if self.kinds <= {'i', 'u'} and self._complete:
+            return np.dtype(np.int64)
+        if self.numeric:
+            return np.dtype(np.float64)
+        return np.dtype(object)
+
+    @property
+    def frame_dtype(self):
+        """Dtype of the column in a whole-file parse"""
+        if self.dtype == object and self.string_dtype is not None and self.kinds == {self.string_dtype.kind}:
+            return self.string_dtype
+        return self.dtype
+
+
+class CatalogScan:
+    def __init__(self, columns):
+        self.columns = {col: ColumnScan(col) for col in columns}
+        self.n_rows = 0
+
+    def update(self, chunk):
+        self.n_rows += len(chunk)
+        for col, scan in self.columns.items():
+            scan.update(chunk[col])
+
+    def finish(self):
+        for scan in self.columns.values():
+            # Integer columns with gaps parse as floats
+            scan._complete = scan.non_null == self.n_rows
+        return self
+
+    @property
+    def approximate_medians(self):
+        return any(scan.sketch is not None and not scan.sketch.exact for scan in self.columns.values())
+
+
+def iter_chunks(csv_path, rows=None, usecols=None, comment=None):
+    """Chunks of the catalog with fully empty rows removed"""
+    import pandas as pd
+
+    # round_trip parses floats to the same values as the whole-file (pyarrow) parse
+    with pd.read_csv(csv_path, chunksize=rows or chunk_rows(), float_precision='round_trip',
+                     usecols=usecols, comment=comment) as reader:
+        for chunk in reader:
+            yield chunk.dropna(how='all')
+
+
+def scan_catalog(csv_path, rows=None):
+    """Column statistics and dtypes of the catalog, in one pass"""
+    scan = None
+    for chunk in iter_chunks(csv_path, rows):
+        if scan is None:
+            scan = CatalogScan(chunk.columns)
+        scan.update(chunk)
+    if scan is None:
+        import pandas as pd
+        scan = CatalogScan(pd.read_csv(csv_path, nrows=0).columns)
+    return scan.finish()
+
+
+def frame_dir(csv_path, digest, dtype):
+    """Directory of the streamed columns of one CSV version, for one feature dtype"""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(FRAME_DIR, f'{stem}-{digest[:16]}-{np.dtype(dtype).name}')
+
+
+def _is_arrow_string(dtype):
+    import pandas as pd
+    return isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow'
+
+
+class StreamedFrameWriter:
+    """Columns of a streamed catalog, written chunk by chunk and mapped back read-only.
+
+    Float feature columns go to the feature matrix, other numeric and
+    boolean columns to one .npy file each and pyarrow-backed strings to
+    an Arrow IPC file (one record batch per chunk). Columns of Python
+    objects, and columns the scan did not see (added to every chunk,
+    like a derived target), are kept in memory unless they hold pyarrow
+    strings.
+    """
+
+    def __init__(self, directory, scan, feature_columns, feature_dtype):
+        self.directory = directory
+        self.tmp_dir = f'{directory}.{os.getpid()}.tmp'
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+
+        self.n_rows = scan.n_rows
+        self.position = 0
+        self.feature_columns = list(feature_columns)
+        self.matrix = np.lib.format.open_memmap(
+            os.path.join(self.tmp_dir, 'features.npy'), mode='w+', dtype=feature_dtype,
+            shape=(scan.n_rows, len(self.feature_columns))
+        )
+        features = {col: position for position, col in enumerate(self.feature_columns)}
+
+        # Column -> ('matrix', position) | ('npy', memmap) | ('arrow', dtype) | ('memory', array)
+        self.storage = {}
+        for position, (col, column) in enumerate(scan.columns.items()):
+            if col in features and column.dtype.kind == 'f':
+                self.storage[col] = ('matrix', features[col])
+            elif column.dtype.kind in 'biuf':
+                self.storage[col] = ('npy', np.lib.format.open_memmap(
+                    os.path.join(self.tmp_dir, f'col_{position}.npy'), mode='w+', dtype=column.dtype,
+                    shape=(scan.n_rows,)
+                ))
+            elif _is_arrow_string(column.frame_dtype):
+                self.storage[col] = ('arrow', column.frame_dtype)
+            else:
+                self.storage[col] = ('memory', np.empty(scan.n_rows, dtype=column.dtype))
+        self._strings = None
+        self._schema = None
+
+    def write(self, chunk, block):
+        """Store one chunk: its imputed feature block and the frame columns"""
+        rows = slice(self.position, self.position + len(chunk))
+        self.matrix[rows] = block
+        for col in chunk.columns:
+            if col not in self.storage:
+                dtype = chunk[col].dtype
+                self.storage[col] = (('arrow', dtype) if _is_arrow_string(dtype)
+                                     else ('memory', np.empty(self.n_rows, dtype=object)))
+
+        strings = {}
+        for col, (kind, target) in self.storage.items():
+            series = chunk[col]
+            if kind == 'npy':
+                if target.dtype.kind == 'f':
+                    target[rows] = series.to_numpy(dtype=target.dtype, na_value=np.nan)
+                else:
+                    target[rows] = series.to_numpy(dtype=target.dtype)
+            elif kind == 'arrow':
+                # A chunk where the column is empty parses as float
+                strings[col] = series if series.dtype == target else series.astype(target)
+            elif kind == 'memory':
+                target[rows] = series.to_numpy(dtype=target.dtype)
+        if strings:
+            self._write_strings(strings)
+        self.position += len(chunk)
+
+    def _write_strings(self, strings):
+        import pyarrow as pa
+
+        arrays = [pa.array(series.array) for series in strings.values()]
+        if self._strings is None:
+            self._schema = pa.schema([(col, array.type) for col, array in zip(strings, arrays)])
+            self._sink = pa.OSFile(os.path.join(self.tmp_dir, 'strings.arrow'), 'wb')
+            self._strings = pa.ipc.new_file(self._sink, self._schema)
+        arrays = [array.cast(field.type) if array.type != field.type else array
+                  for array, field in zip(arrays, self._schema)]
+        self._strings.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def finish(self):
+        """Publish the directory; returns the mapped feature matrix and the frame columns in order"""
+        self.matrix.flush()
+        self.matrix = None
+        for kind, target in self.storage.values():
+            if kind == 'npy':
+                target.flush()
+        if self._strings is not None:
+            self._strings.close()
+            self._sink.close()
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        try:
+            os.rename(self.tmp_dir, self.directory)
+        except OSError:
+            # Another process published the same CSV version first
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        _remove_stale_frames(self.directory)
+        return self._open()
+
+    def _open(self):
+        matrix = np.load(os.path.join(self.directory, 'features.npy'), mmap_mode='r')
+        strings = None
+        if os.path.exists(os.path.join(self.directory, 'strings.arrow')):
+            import pyarrow as pa
+            strings = pa.ipc.open_file(pa.memory_map(os.path.join(self.directory, 'strings.arrow'))).read_all()
+
+        columns = {}
+        for position, (col, (kind, target)) in enumerate(self.storage.items()):
+            # Plain ndarray views of the maps, like the arrays of a parsed frame
+            if kind == 'matrix':
+                columns[col] = np.asarray(matrix[:, target])
+            elif kind == 'npy':
+                columns[col] = np.asarray(np.load(os.path.join(self.directory, f'col_{position}.npy'), mmap_mode='r'))
+            elif kind == 'arrow':
+                # Wraps the mapped Arrow buffers without copying them
+                columns[col] = target.__from_arrow__(strings.column(col))
+            else:
+                columns[col] = target
+        return matrix, columns
+
+    def abort(self):
+        self.matrix = None
+        self.storage = {}
+        if self._strings is not None:
+            self._sink.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def scale_to_file(scaler, X, path, dtype, rows=None):
+    """scaler.transform(X), written block by block to a .npy file and mapped back read-only"""
+    rows = rows or chunk_rows()
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    scaled = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=X.shape)
+    try:
+        for start in range(0, len(X), rows):
+            scaled[start:start + rows] = scaler.transform(X[start:start + rows])
+        scaled.flush()
+    except BaseException:
+        del scaled
+        os.remove(tmp_path)
+        raise
+    del scaled
+    # Replaced, not rewritten: an index built from the previous file keeps mapping it
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+
+def _remove_stale_frames(current):
+    """Streamed frames of earlier versions of the same CSV, in the same dtype"""
+    directory = os.path.dirname(current)
+    stem, _, dtype_name = os.path.basename(current).rsplit('-', 2)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if (path != current and name.startswith(f'{stem}-') and name.endswith(f'-{dtype_name}')
+                and os.path.isdir(path)):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,119 @@
+"""FlatForest parity with sklearn, with and without a folded StandardScaler."""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from forest_engine import FlatForest, fold_scaler
+
+
+def training_data(seed=0, rows=600):
+    """Features on very different scales, a discrete one and a constant one"""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.normal(0.0, 1.0, rows),
+        rng.lognormal(3.0, 2.0, rows),
+        rng.normal(5800.0, 900.0, rows),
+        rng.integers(0, 5, rows).astype(np.float64),
+        rng.normal(1e-6, 3e-7, rows),
+        np.full(rows, 7.25)
+    ])
+    y = (X[:, 0] + np.log(X[:, 1]) / 3 + X[:, 3] / 2 > 1.5).astype(int) + (X[:, 2] > 6500)
+    return X, y
+
+
+def internal_nodes(forest):
+    """(feature, threshold) of every split in the forest"""
+    splits = [(tree.tree_.feature[mask], tree.tree_.threshold[mask])
+              for tree in forest.estimators_ for mask in [tree.tree_.children_left != -1]]
+    return np.concatenate([f for f, _ in splits]), np.concatenate([t for _, t in splits])
+
+
+def rows_at(base, features, values):
+    """One copy of base per value, with that value in the given feature"""
+    rows = np.repeat(base[None, :], len(values), axis=0)
+    rows[np.arange(len(values)), features] = values
+    return rows
+
+
+def assert_same(engine, proba, X):
+    engine_proba, predicted = engine.predict_with_proba(X)
+    np.testing.assert_allclose(engine_proba, proba, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(predicted, np.argmax(proba, axis=1))
+
+
+@pytest.fixture(scope='module', params=[RandomForestClassifier, ExtraTreesClassifier])
+def fitted(request):
+    X, y = training_data()
+    scaler = StandardScaler().fit(X)
+    model = request.param(n_estimators=25, random_state=0).fit(scaler.transform(X), y)
+    return X, scaler, model
+
+
+def test_matches_sklearn_on_random_rows(fitted):
+    X, scaler, model = fitted
+    rng = np.random.default_rng(1)
+    X_raw = X[rng.integers(0, len(X), 2000)] * rng.normal(1.0, 0.05, (2000, X.shape[1]))
+    X_scaled = scaler.transform(X_raw)
+
+    assert_same(FlatForest.from_forest(model), model.predict_proba(X_scaled), X_scaled)
+    assert_same(FlatForest.from_forest(model, scaler), model.predict_proba(X_scaled), X_raw)
+
+
+def test_matches_sklearn_on_threshold_boundaries(fitted):
+    """Rows exactly on, and one float32 or float64 step either side of, every split"""
+    X, scaler, model = fitted
+    features, thresholds = internal_nodes(model)
+    base = scaler.transform(X[:1])[0]
+
+    t32 = thresholds.astype(np.float32)
+    candidates = [
+        thresholds,
+        np.nextafter(thresholds, -np.inf),
+        np.nextafter(thresholds, np.inf),
+        t32,
+        np.nextafter(t32, np.float32(-np.inf)),
+        np.nextafter(t32, np.float32(np.inf)),
+    ]
+    X_scaled = np.concatenate([rows_at(base, features, values.astype(np.float64)) for values in candidates])
+    assert_same(FlatForest.from_forest(model), model.predict_proba(X_scaled), X_scaled)
+
+
+def test_folded_matches_sklearn_on_raw_boundaries(fitted):
+    """Raw rows at the folded cutoffs and where the scaled value lands on a threshold"""
+    X, scaler, model = fitted
+    engine = FlatForest.from_forest(model, scaler)
+    features, thresholds = internal_nodes(model)
+    cutoffs = fold_scaler(thresholds, features, scaler.mean_, scaler.scale_)
+    unscaled = thresholds * scaler.scale_[features] + scaler.mean_[features]
+    base = X[0]
+
+    candidates = [cutoffs, np.nextafter(cutoffs, -np.inf), np.nextafter(cutoffs, np.inf),
+                  unscaled, np.nextafter(unscaled, -np.inf), np.nextafter(unscaled, np.inf)]
+    X_raw = np.concatenate([rows_at(base, features, values) for values in candidates])
+    assert_same(engine, model.predict_proba(scaler.transform(X_raw)), X_raw)
+
+
+def test_fold_scaler_cutoff_is_the_last_raw_value_going_left(fitted):
+    X, scaler, model = fitted
+    features, thresholds = internal_nodes(model)
+    mean, scale = scaler.mean_[features], scaler.scale_[features]
+    cutoffs = fold_scaler(thresholds, features, scaler.mean_, scaler.scale_)
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= thresholds
+
+    assert goes_left(cutoffs).all()
+    assert not goes_left(np.nextafter(cutoffs, np.inf)).any()
+
+
+@pytest.mark.parametrize('with_mean, with_std', [(False, True), (True, False), (False, False)])
+def test_folded_scaler_options(with_mean, with_std):
+    X, y = training_data(seed=2)
+    scaler = StandardScaler(with_mean=with_mean, with_std=with_std).fit(X)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(scaler.transform(X), y)
+    rng = np.random.default_rng(3)
+    X_raw = X * rng.normal(1.0, 0.05, X.shape)
+
+    assert_same(FlatForest.from_forest(model, scaler), model.predict_proba(scaler.transform(X_raw)), X_raw)
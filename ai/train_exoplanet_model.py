@@ -20,24 +20,38 @@ Target: koi_disposition (CONFIRMED, CANDIDATE, FALSE POSITIVE)
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 from sklearn.metrics import precision_recall_fscore_support
+import argparse
 import joblib
 import os
+from catalog_cache import read_catalog
+from training import add_search_arguments, search_from_args
+from streaming import chunk_rows as chunk_rows_default
+from estimator_backends import BACKENDS, DEFAULT_BACKEND, get_backend, tree_count
+from forest_engine import FlatForest
 import warnings
 warnings.filterwarnings('ignore')
 
+# Feature columns (key exoplanet characteristics)
+FEATURE_COLUMNS = [
+    'koi_period',      # Orbital period (days)
+    'koi_duration',    # Transit duration (hours)
+    'koi_prad',        # Planetary radius (Earth radii)
+    'koi_depth',       # Transit depth (ppm)
+    'koi_steff',       # Stellar effective temperature (K)
+    'koi_srad',        # Stellar radius (Solar radii)
+    'koi_slogg'        # Stellar surface gravity (log10(cm/s^2))
+]
+
 def load_and_explore_data(csv_path):
     """Load the CSV dataset and perform initial exploration."""
     print("Loading NASA Exoplanet Archive dataset...")
     
-    # Load the CSV file, skipping comment lines
-    df = pd.read_csv(csv_path, comment='#')
+    # Load the CSV file, skipping comment lines (cached in columnar form after the first parse)
+    df = read_catalog(csv_path, comment='#')
     
     print(f"Dataset loaded successfully!")
     print(f"   Shape: {df.shape}")
@@ -72,20 +86,9 @@ def prepare_features_and_target(df):
     """Prepare features and target for machine learning."""
     print("\nPreparing features and target...")
     
-    # Define feature columns (key exoplanet characteristics)
-    feature_columns = [
-        'koi_period',      # Orbital period (days)
-        'koi_duration',    # Transit duration (hours)
-        'koi_prad',        # Planetary radius (Earth radii)
-        'koi_depth',       # Transit depth (ppm)
-        'koi_steff',       # Stellar effective temperature (K)
-        'koi_srad',        # Stellar radius (Solar radii)
-        'koi_slogg'        # Stellar surface gravity (log10(cm/s^2))
-    ]
-    
     # Check which features are available
-    available_features = [col for col in feature_columns if col in df.columns]
-    missing_features = [col for col in feature_columns if col not in df.columns]
+    available_features = [col for col in FEATURE_COLUMNS if col in df.columns]
+    missing_features = [col for col in FEATURE_COLUMNS if col not in df.columns]
     
     print(f"   Available features: {available_features}")
     if missing_features:
@@ -158,28 +161,52 @@ def split_and_scale_data(X, y_encoded, test_size=0.2, random_state=42):
     
     return X_train_scaled, X_test_scaled, y_train, y_test, scaler
 
-def train_random_forest(X_train, y_train, random_state=42):
-    """Train a Random Forest classifier."""
-    print("\n🌲 Training Random Forest classifier...")
+# Forest settings this pipeline adds to the shared defaults
+FOREST_OVERRIDES = {'min_samples_split': 5, 'min_samples_leaf': 2}
+
+def train_classifier(X_train, y_train, backend=DEFAULT_BACKEND, random_state=42, params=None):
+    """Train the classifier of an estimator backend (params: e.g. the result of a search)."""
+    backend = get_backend(backend)
+    print(f"\n🌲 Training {backend.description} classifier...")
     
     # Create and train the model
-    rf_model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=10,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=random_state,
-        n_jobs=-1
-    )
+    model = backend.build(random_state, **dict(FOREST_OVERRIDES, **(params or {})))
     
-    rf_model.fit(X_train, y_train)
+    model.fit(X_train, y_train)
     
     print(f"   Model trained successfully!")
-    print(f"   Number of trees: {rf_model.n_estimators}")
-    print(f"   Max depth: {rf_model.max_depth}")
+    if tree_count(model) is not None:
+        print(f"   Number of trees: {tree_count(model)}")
+    print(f"   Max depth: {model.max_depth}")
     print(f"   Features used: {X_train.shape[1]}")
     
-    return rf_model
+    return model
+
+def train_random_forest(X_train, y_train, random_state=42, params=None):
+    """Train a Random Forest classifier (params: e.g. the result of a search)."""
+    return train_classifier(X_train, y_train, DEFAULT_BACKEND, random_state, params)
+
+def train_out_of_core(csv_path, backend=DEFAULT_BACKEND, sample_per_class=None, shards=1, chunk_rows=None):
+    """Train from CSV chunks without loading the catalog (see out_of_core.py)."""
+    from out_of_core import train_from_csv
+    
+    print(f"\n🌊 Training out of core (chunks of {chunk_rows or chunk_rows_default()} rows, {shards} shard(s))...")
+    header = pd.read_csv(csv_path, comment='#', nrows=0).columns
+    feature_names = [col for col in FEATURE_COLUMNS if col in header]
+    
+    trainer, model, classes, medians = train_from_csv(
+        csv_path, feature_names, 'koi_disposition', get_backend(backend), capacity=sample_per_class,
+        n_shards=shards, rows=chunk_rows, comment='#', **FOREST_OVERRIDES
+    )
+    print(trainer.summary())
+    print(f"   Feature medians: {dict(zip(feature_names, np.round(medians, 4)))}")
+    if tree_count(model) is not None:
+        print(f"   Number of trees: {tree_count(model)}")
+    
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = classes
+    X_test, y_test = trainer.test_set()
+    return model, trainer.scaler, label_encoder, X_test, y_test, feature_names
 
 def evaluate_model(model, X_test, y_test, label_encoder):
     """Evaluate the trained model."""
@@ -203,15 +230,16 @@ def evaluate_model(model, X_test, y_test, label_encoder):
     cm = confusion_matrix(y_test, y_pred)
     print(cm)
     
-    # Feature importance
-    print(f"\n⭐ Feature Importance:")
-    feature_importance = model.feature_importances_
-    for i, importance in enumerate(feature_importance):
-        print(f"   Feature {i+1}: {importance:.4f}")
+    # Feature importance (tree ensembles of the forest family only)
+    if hasattr(model, 'feature_importances_'):
+        print(f"\n⭐ Feature Importance:")
+        feature_importance = model.feature_importances_
+        for i, importance in enumerate(feature_importance):
+            print(f"   Feature {i+1}: {importance:.4f}")
     
     return accuracy, y_pred
 
-def save_model_and_artifacts(model, scaler, label_encoder, feature_names, accuracy):
+def save_model_and_artifacts(model, scaler, label_encoder, feature_names, accuracy, backend=DEFAULT_BACKEND):
     """Save the trained model and preprocessing artifacts."""
     print("\n💾 Saving model and artifacts...")
     
@@ -233,15 +261,28 @@ def save_model_and_artifacts(model, scaler, label_encoder, feature_names, accura
     joblib.dump(label_encoder, encoder_path)
     print(f"   Label encoder saved to: {encoder_path}")
     
+    # Save the serving bundle: predict.py scores from it without importing scikit-learn
+    bundle_name = None
+    if get_backend(backend).forest:
+        bundle_name = 'serving_bundle.npz'
+        FlatForest.from_forest(model).save(
+            os.path.join('models', bundle_name),
+            scaler_mean=scaler.mean_, scaler_scale=scaler.scale_,
+            class_names=label_encoder.classes_.astype(str)
+        )
+        print(f"   Serving bundle saved to: models/{bundle_name}")
+    
     # Save model metadata
     metadata = {
-        'model_type': 'RandomForestClassifier',
+        'model_type': type(model).__name__,
+        'backend': backend,
         'accuracy': accuracy,
         'feature_names': feature_names,
         'n_features': len(feature_names),
-        'n_estimators': model.n_estimators,
+        'n_estimators': tree_count(model),
         'max_depth': model.max_depth,
-        'classes': label_encoder.classes_.tolist()
+        'classes': label_encoder.classes_.tolist(),
+        'serving_bundle': bundle_name
     }
     
     import json
@@ -254,6 +295,10 @@ def save_model_and_artifacts(model, scaler, label_encoder, feature_names, accura
 
 def create_visualizations(X, y_encoded, label_encoder, feature_names):
     """Create visualizations of the dataset and model performance."""
+    # Plotting libraries are only needed here; importing them costs seconds
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     print("\n📈 Creating visualizations...")
     
     # Set up the plotting style
@@ -315,6 +360,22 @@ def create_visualizations(X, y_encoded, label_encoder, feature_names):
 
 def main():
     """Main function to run the complete training pipeline."""
+    parser = argparse.ArgumentParser(description='Train the KOI disposition classifier')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='estimator backend (see estimator_backends.py)')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='stream the CSV in chunks and train on a per-class sample (catalogs larger than memory)')
+    parser.add_argument('--sample-per-class', type=int, help='out of core: training rows kept per class')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='out of core: sub-forests fitted in parallel on disjoint chunks, then merged')
+    parser.add_argument('--chunk-rows', type=int, help='out of core: rows per chunk')
+    add_search_arguments(parser)
+    args = parser.parse_args()
+    if args.search and args.backend != DEFAULT_BACKEND:
+        parser.error(f'--search tunes the {DEFAULT_BACKEND} backend')
+    if args.search and args.out_of_core:
+        parser.error('--search needs the catalog in memory; it cannot be combined with --out-of-core')
+    
     print("🌟 NASA Exoplanet AI - Model Training Pipeline")
     print("=" * 50)
     
@@ -322,29 +383,39 @@ def main():
     csv_path = 'cumulative_2025.10.04_03.33.35.csv'
     
     try:
-        # Step 1: Load and explore data
-        df = load_and_explore_data(csv_path)
-        
-        # Step 2: Prepare features and target
-        X, y, feature_names = prepare_features_and_target(df)
-        
-        # Step 3: Encode target labels
-        y_encoded, label_encoder = encode_target(y)
-        
-        # Step 4: Split and scale data
-        X_train, X_test, y_train, y_test, scaler = split_and_scale_data(X, y_encoded)
-        
-        # Step 5: Train Random Forest
-        model = train_random_forest(X_train, y_train)
+        if args.out_of_core:
+            # Steps 1-5 on a stream of chunks: the catalog is never loaded whole
+            model, scaler, label_encoder, X_test, y_test, feature_names = train_out_of_core(
+                csv_path, args.backend, args.sample_per_class, args.shards, args.chunk_rows
+            )
+        else:
+            # Step 1: Load and explore data
+            df = load_and_explore_data(csv_path)
+            
+            # Step 2: Prepare features and target
+            X, y, feature_names = prepare_features_and_target(df)
+            
+            # Step 3: Encode target labels
+            y_encoded, label_encoder = encode_target(y)
+            
+            # Step 4: Split and scale data
+            X_train, X_test, y_train, y_test, scaler = split_and_scale_data(X, y_encoded)
+            
+            # Step 5: Train the classifier (optionally with searched parameters)
+            params = None
+            if args.search:
+                params = search_from_args(args, X_train, y_train, base_params=FOREST_OVERRIDES)
+            model = train_classifier(X_train, y_train, args.backend, params=params)
         
         # Step 6: Evaluate model
         accuracy, y_pred = evaluate_model(model, X_test, y_test, label_encoder)
         
         # Step 7: Save model and artifacts
-        save_model_and_artifacts(model, scaler, label_encoder, feature_names, accuracy)
+        save_model_and_artifacts(model, scaler, label_encoder, feature_names, accuracy, args.backend)
         
-        # Step 8: Create visualizations
-        create_visualizations(X, y_encoded, label_encoder, feature_names)
+        # Step 8: Create visualizations (of the whole catalog, so not out of core)
+        if not args.out_of_core:
+            create_visualizations(X, y_encoded, label_encoder, feature_names)
         
         print("\n🎉 Training pipeline completed successfully!")
         print(f"   Final accuracy: {accuracy:.4f} ({accuracy*100:.2f}%)")
@@ -1,21 +1,16 @@
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report
 import joblib
 import json
 import os
+from estimator_backends import get_backend
 
 class ExoplanetClassifier:
-    def __init__(self):
-        self.model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            class_weight='balanced'
-        )
+    def __init__(self, backend=None):
+        self.model = get_backend(backend).build(random_state=42, class_weight='balanced')
         self.scaler = StandardScaler()
         self.is_trained = False
         
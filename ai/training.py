@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Shared random forest settings and hyperparameter search.
+
+Every trainer builds its forest with make_forest(), so the defaults live
+in one place (FOREST_PARAMS) and all of them fit trees on every core.
+A parameter set chosen by a search can be applied to all of them by
+pointing EXOPLANET_FOREST_PARAMS at the JSON file written by
+--write-params.
+
+search() cross-validates candidate parameter sets, either the full grid
+or by successive halving (every candidate on a small stratified sample,
+the best third promoted to three times as many rows, and so on up to the
+full data). (candidate, fold) fits are spread over all cores with joblib;
+each fit is single-threaded. Candidates are scheduled in waves and no new
+wave starts once the next one would overrun the wall-clock budget.
+
+Fold splits and the float32 fold matrices the trees train on are built
+once per (data, cv, seed, rows) and shared by every candidate. For each
+candidate the search also measures single-row and batch predict latency
+on the serving engine (FlatForest) and the pickled model size, so a
+configuration can be chosen against a serving budget, not just accuracy.
+
+Usage:
+    python training.py [--csv training_data.csv] [--method halving] [--budget 300]
+                       [--max-latency-ms 1.0] [--max-size-mb 20] [--write-params models/forest_params.json]
+"""
+
+import hashlib
+import itertools
+import json
+import math
+import os
+import pickle
+import time
+
+import numpy as np
+
+FOREST_PARAMS = {'n_estimators': 100, 'max_depth': 10}
+
+# Parameters a search explores by default: 36 candidates
+DEFAULT_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [6, 10, 16, None],
+    'min_samples_leaf': [1, 2, 5]
+}
+
+DEFAULT_CV = 3
+DEFAULT_TIME_BUDGET = 300.0
+HALVING_FACTOR = 3
+# Successive halving never trains on fewer rows than this per round
+MIN_HALVING_ROWS = 500
+
+# Latency probes run against a fitted fold model
+LATENCY_REPEATS = 50
+LATENCY_BATCH_ROWS = 1000
+
+PARAMS_ENV = 'EXOPLANET_FOREST_PARAMS'
+
+_fold_caches = {}
+
+
+def selected_params():
+    """Parameters chosen by a search (EXOPLANET_FOREST_PARAMS), or {}"""
+    path = os.environ.get(PARAMS_ENV)
+    if not path:
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)['params']
+
+
+def forest_params(random_state=42, n_jobs=-1, **overrides):
+    """Forest parameters: defaults, then caller overrides, then a selected search result"""
+    params = dict(FOREST_PARAMS, **overrides)
+    params.update(selected_params())
+    params.update(random_state=random_state, n_jobs=n_jobs)
+    return params
+
+
+def make_forest(random_state=42, n_jobs=-1, **overrides):
+    """RandomForestClassifier with the shared defaults; see forest_params"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    return RandomForestClassifier(**forest_params(random_state, n_jobs, **overrides))
+
+
+def candidate_grid(grid):
+    """Every combination of a {param: [values]} grid, in a stable order"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+class FoldCache:
+    """Stratified fold splits of one dataset, built once per row count.
+
+    Each entry holds C-contiguous float32 train/validation matrices, the
+    layout sklearn trees convert their input to, so candidates do not
+    each pay for the conversion.
+    """
+
+    def __init__(self, X, y, cv=DEFAULT_CV, random_state=42):
+        self.X = np.asarray(X)
+        self.y = np.asarray(y)
+        self.cv = cv
+        self.random_state = random_state
+        self._folds = {}
+
+    @property
+    def n_rows(self):
+        return len(self.y)
+
+    def folds(self, n_rows=None):
+        """[(X_train, y_train, X_val, y_val)] on a stratified sample of n_rows rows"""
+        n_rows = self.n_rows if n_rows is None else min(n_rows, self.n_rows)
+        if n_rows not in self._folds:
+            self._folds[n_rows] = self._build(n_rows)
+        return self._folds[n_rows]
+
+    def _build(self, n_rows):
+        from sklearn.model_selection import StratifiedKFold, train_test_split
+
+        positions = np.arange(self.n_rows)
+        if n_rows < self.n_rows:
+            positions, _ = train_test_split(positions, train_size=n_rows, random_state=self.random_state,
+                                            stratify=self.y)
+            positions = np.sort(positions)
+
+        X = np.ascontiguousarray(self.X[positions], dtype=np.float32)
+        y = self.y[positions]
+        splitter = StratifiedKFold(n_splits=self.cv, shuffle=True, random_state=self.random_state)
+        return [
+            (X[train], y[train], X[val], y[val])
+            for train, val in splitter.split(X, y)
+        ]
+
+
+def fold_cache(X, y, cv=DEFAULT_CV, random_state=42):
+    """FoldCache for (X, y), reused across searches on the same data in this process"""
+    digest = hashlib.sha256()
+    for array in (np.ascontiguousarray(X), np.ascontiguousarray(y)):
+        digest.update(str((array.shape, array.dtype.str)).encode('utf-8'))
+        digest.update(array.data)
+    key = (digest.hexdigest(), cv, random_state)
+    if key not in _fold_caches:
+        _fold_caches[key] = FoldCache(X, y, cv, random_state)
+    return _fold_caches[key]
+
+
+def _fit_fold(params, fold_index, fold, keep_model, random_state):
+    """Fit and score one candidate on one fold (runs in a joblib worker)"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    X_train, y_train, X_val, y_val = fold
+    # Not make_forest: a selected parameter file must not override the candidate
+    model = RandomForestClassifier(**dict(FOREST_PARAMS, **params, random_state=random_state, n_jobs=1))
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    accuracy = float(np.mean(model.predict(X_val) == y_val))
+    return fold_index, accuracy, fit_seconds, model if keep_model else None
+
+
+def measure_model(model, X):
+    """Serving cost of a fitted forest: FlatForest latency, pickled size and node count"""
+    from forest_engine import FlatForest
+
+    engine = FlatForest.from_forest(model)
+    row = np.ascontiguousarray(X[:1])
+    batch = np.ascontiguousarray(X[np.arange(LATENCY_BATCH_ROWS) % len(X)])
+
+    engine.predict_with_proba(row)
+    samples = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        engine.predict_with_proba(row)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+
+    start = time.perf_counter()
+    engine.predict_with_proba(batch)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'latency_ms': samples[len(samples) // 2] * 1000,
+        'latency_p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000,
+        'batch_us_per_row': batch_seconds / len(batch) * 1e6,
+        'model_mb': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1e6,
+        'n_nodes': int(sum(estimator.tree_.node_count for estimator in model.estimators_))
+    }
+
+
+def _evaluate(parallel, candidates, folds, base_params, n_rows, round_index, random_state):
+    """Cross-validate candidates on folds; one result dict per candidate"""
+    from joblib import delayed
+
+    tasks = [
+        delayed(_fit_fold)(dict(base_params, **params), fold_index, fold, fold_index == 0, random_state)
+        for params in candidates
+        for fold_index, fold in enumerate(folds)
+    ]
+    outcomes = parallel(tasks)
+
+    results = []
+    n_folds = len(folds)
+    for position, params in enumerate(candidates):
+        per_fold = outcomes[position * n_folds:(position + 1) * n_folds]
+        scores = [accuracy for _, accuracy, _, _ in per_fold]
+        result = {
+            'params': params,
+            'rows': n_rows,
+            'round': round_index,
+            'status': 'evaluated',
+            'mean_accuracy': float(np.mean(scores)),
+            'std_accuracy': float(np.std(scores)),
+            'fit_seconds': float(np.mean([seconds for _, _, seconds, _ in per_fold]))
+        }
+        # Workers are idle between waves, so latency is measured without contention
+        result.update(measure_model(per_fold[0][3], folds[0][2]))
+        results.append(result)
+    return results
+
+
+def _run_waves(parallel, candidates, folds, base_params, n_rows, round_index, wave_size, deadline,
+               random_state):
+    """Evaluate candidates a wave at a time until done or out of budget"""
+    results = []
+    wave_seconds = 0.0
+    for start in range(0, len(candidates), wave_size):
+        if deadline is not None and results and time.monotonic() + wave_seconds > deadline:
+            break
+        began = time.monotonic()
+        results.extend(_evaluate(parallel, candidates[start:start + wave_size], folds, base_params,
+                                 n_rows, round_index, random_state))
+        wave_seconds = time.monotonic() - began
+    return results
+
+
+def halving_schedule(n_candidates, n_rows, factor=HALVING_FACTOR, min_rows=MIN_HALVING_ROWS):
+    """Rows per successive halving round, ending with all rows"""
+    rounds = max(1, math.ceil(math.log(max(n_candidates, 1), factor)) + 1)
+    schedule = [n_rows]
+    while len(schedule) < rounds and schedule[0] // factor >= min_rows:
+        schedule.insert(0, schedule[0] // factor)
+    return schedule
+
+
+def search(X, y, grid=None, method='halving', cv=DEFAULT_CV, time_budget=DEFAULT_TIME_BUDGET,
+           n_jobs=-1, base_params=None, random_state=42):
+    """Cross-validated search over a {param: [values]} grid.
+
+    method is 'grid' (every candidate on all rows) or 'halving'.
+    base_params are fixed forest parameters shared by all candidates (for
+    example class_weight). Returns a report dict; report['results'] has
+    one entry per candidate, from its last round, with accuracy, fit time,
+    predict latency and model size. Candidates the budget did not reach
+    have status 'skipped'.
+    """
+    from joblib import Parallel, effective_n_jobs
+
+    if method not in ('grid', 'halving'):
+        raise ValueError(f"Unknown search method: {method}")
+
+    candidates = candidate_grid(DEFAULT_GRID if grid is None else grid)
+    base_params = dict(base_params or {})
+    cache = fold_cache(X, y, cv, random_state)
+    workers = effective_n_jobs(n_jobs)
+    # Enough (candidate, fold) tasks per wave to keep every worker busy
+    wave_size = max(1, math.ceil(workers / cv))
+
+    started = time.monotonic()
+    deadline = None if time_budget is None else started + time_budget
+    if method == 'grid':
+        schedule = [cache.n_rows]
+    else:
+        schedule = halving_schedule(len(candidates), cache.n_rows)
+
+    latest = {}
+    survivors = candidates
+    exhausted = False
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for round_index, n_rows in enumerate(schedule):
+            results = _run_waves(parallel, survivors, cache.folds(n_rows), base_params, n_rows,
+                                 round_index, wave_size, deadline, random_state)
+            for result in results:
+                latest[_key(result['params'])] = result
+            if len(results) < len(survivors):
+                exhausted = True
+                break
+            if round_index < len(schedule) - 1:
+                ranked = sorted(results, key=lambda result: -result['mean_accuracy'])
+                survivors = [result['params'] for result in ranked[:math.ceil(len(ranked) / HALVING_FACTOR)]]
+
+    report_results = [
+        latest.get(_key(params), {'params': params, 'status': 'skipped'})
+        for params in candidates
+    ]
+    _rank(report_results)
+    return {
+        'method': method,
+        'cv': cv,
+        'n_jobs': workers,
+        'schedule': schedule,
+        'time_budget': time_budget,
+        'elapsed': time.monotonic() - started,
+        'budget_exhausted': exhausted,
+        'n_rows': cache.n_rows,
+        'base_params': base_params,
+        'results': report_results
+    }
+
+
+def _key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def _rank(results):
+    """Rank evaluated candidates: most rows first, then accuracy, then latency"""
+    evaluated = [result for result in results if result['status'] == 'evaluated']
+    evaluated.sort(key=lambda result: (-result['rows'], -result['mean_accuracy'], result['latency_ms']))
+    for rank, result in enumerate(evaluated, 1):
+        result['rank'] = rank
+
+
+def select_best(report, max_latency_ms=None, max_size_mb=None):
+    """Most accurate candidate trained on the most rows that fits the serving budget, or None"""
+    evaluated = [result for result in report['results'] if result['status'] == 'evaluated']
+    if not evaluated:
+        return None
+    most_rows = max(result['rows'] for result in evaluated)
+    eligible = [
+        result for result in evaluated
+        if result['rows'] == most_rows
+        and (max_latency_ms is None or result['latency_ms'] <= max_latency_ms)
+        and (max_size_mb is None or result['model_mb'] <= max_size_mb)
+    ]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda result: result['rank'])
+
+
+def print_search_report(report, best=None):
+    """Print one line per candidate, best ranked first"""
+    columns = ['rank', 'rows', 'mean_accuracy', 'std_accuracy', 'fit_seconds', 'latency_ms',
+               'batch_us_per_row', 'model_mb', 'params']
+    results = sorted(report['results'], key=lambda result: result.get('rank', len(report['results']) + 1))
+    rows = [[_format_cell(result.get(column)) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+
+    print(f"\nHyperparameter search ({report['method']}, {report['cv']}-fold, {report['n_jobs']} workers, "
+          f"rows per round {report['schedule']}): {report['elapsed']:.1f}s")
+    if report['budget_exhausted']:
+        skipped = sum(result['status'] == 'skipped' for result in report['results'])
+        print(f"   Time budget of {report['time_budget']:.0f}s reached; {skipped} candidates not evaluated")
+    print('  '.join(column.rjust(width) for column, width in zip(columns[:-1], widths)) + '  params')
+    for row in rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row[:-1], widths)) + '  ' + row[-1])
+
+    if best is not None:
+        print(f"Selected: {_format_cell(best['params'])} (accuracy {best['mean_accuracy']:.4f}, "
+              f"latency {best['latency_ms']:.3f} ms, size {best['model_mb']:.2f} MB)")
+
+
+def _format_cell(value):
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True)
+    if isinstance(value, float):
+        return f'{value:.4g}'
+    return '-' if value is None else str(value)
+
+
+def write_params(path, report, best):
+    """Save a selected candidate where EXOPLANET_FOREST_PARAMS can point at it"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    payload = {
+        'params': best['params'],
+        'mean_accuracy': best['mean_accuracy'],
+        'latency_ms': best['latency_ms'],
+        'model_mb': best['model_mb'],
+        'method': report['method'],
+        'rows': best['rows'],
+        'searched_at': time.time()
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    print(f"Selected parameters saved to {path} (use with {PARAMS_ENV}={path})")
+
+
+def add_search_arguments(parser, optional=True):
+    """Command line options shared by the trainers that can run a search"""
+    group = parser.add_argument_group('hyperparameter search')
+    if optional:
+        group.add_argument('--search', action='store_true', help='cross-validate candidate forests before training')
+    group.add_argument('--method', choices=['halving', 'grid'], default='halving')
+    group.add_argument('--budget', type=float, default=DEFAULT_TIME_BUDGET, help='wall-clock budget in seconds')
+    group.add_argument('--cv', type=int, default=DEFAULT_CV)
+    group.add_argument('--jobs', type=int, default=-1, help='parallel workers (-1: all cores)')
+    group.add_argument('--max-latency-ms', type=float, help='single-row predict latency budget')
+    group.add_argument('--max-size-mb', type=float, help='pickled model size budget')
+    group.add_argument('--write-params', help='save the selected parameters to this JSON file')
+    group.add_argument('--report', help='save the full search report to this JSON file')
+    return parser
+
+
+def search_from_args(args, X, y, base_params=None):
+    """Run the search the options describe; return the selected parameters or None"""
+    report = search(X, y, method=args.method, cv=args.cv, time_budget=args.budget, n_jobs=args.jobs,
+                    base_params=base_params)
+    best = select_best(report, args.max_latency_ms, args.max_size_mb)
+    print_search_report(report, best)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(dict(report, best=best), f, indent=2)
+    if best is None:
+        print("No candidate fits the latency/size budget; keeping the default parameters")
+        return None
+    if args.write_params:
+        write_params(args.write_params, report, best)
+    return best['params']
+
+
+def main():
+    import argparse
+
+    from artifact_store import DEFAULT_CSV_PATH
+
+    parser = argparse.ArgumentParser(description='Hyperparameter search for the catalog classifier')
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help='training CSV (as used by the analysis handler)')
+    add_search_arguments(parser, optional=False)
+    args = parser.parse_args()
+
+    from new_exoplanet_system import ExoplanetDataHandler
+
+    handler = ExoplanetDataHandler(csv_path=args.csv)
+    if not handler.load_data():
+        return 1
+    X = handler.df[handler.feature_columns].to_numpy(dtype=handler.feature_dtype)
+    y = handler.df[handler.target_column].astype(str).to_numpy()
+    search_from_args(args, X, y, base_params={'class_weight': 'balanced'})
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+"""
+Cross-process single-flight lock for training a fingerprint's model.
+
+When several processes start on the same data, the first one takes the
+lock and trains. The others wait and then load the artifacts it saved,
+instead of training the same model concurrently.
+
+The lock is an OS file lock (flock on POSIX, msvcrt on Windows) on
+models/<fingerprint>/.training.lock. The kernel drops it when the holder
+exits or crashes, so a dead trainer never leaves a stale lock. The file
+holds the holder's pid and start time, for diagnostics only. A holder
+that hangs is bounded by the wait timeout
+(EXOPLANET_TRAIN_LOCK_TIMEOUT, seconds); after it a waiter trains
+itself.
+"""
+
+import json
+import os
+import time
+
+LOCK_NAME = '.training.lock'
+POLL_SECONDS = 0.25
+
+
+def lock_timeout():
+    return float(os.environ.get('EXOPLANET_TRAIN_LOCK_TIMEOUT', '600'))
+
+
+try:
+    import fcntl
+
+    def _try_lock(fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+except ImportError:
+    import msvcrt
+
+    def _try_lock(fd):
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class TrainingLock:
+    def __init__(self, directory, timeout=None):
+        self.path = os.path.join(directory, LOCK_NAME)
+        self.timeout = lock_timeout() if timeout is None else timeout
+        self.acquired = False
+        # Whether another process held the lock when acquire() first tried it
+        self.contended = False
+        self.waited = 0.0
+        self._fd = None
+
+    def acquire(self):
+        """Wait up to timeout seconds for the lock; return whether it was taken"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        start = time.monotonic()
+        announced = False
+        while not _try_lock(self._fd):
+            self.contended = True
+            self.waited = time.monotonic() - start
+            if self.waited >= self.timeout:
+                os.close(self._fd)
+                self._fd = None
+                return False
+            if not announced:
+                print(f"Waiting for training in progress ({self.describe_holder()})")
+                announced = True
+            time.sleep(POLL_SECONDS)
+
+        self.waited = time.monotonic() - start
+        self.acquired = True
+        self._write_holder()
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if self.acquired:
+                _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self.acquired = False
+
+    def holder(self):
+        """Pid and start time written by the current (or last) holder"""
+        try:
+            with open(self.path, 'r') as f:
+                return json.loads(f.read() or '{}')
+        except (OSError, ValueError):
+            return {}
+
+    def describe_holder(self):
+        holder = self.holder()
+        if not holder:
+            return 'holder unknown'
+        return f"pid {holder.get('pid')}, started {time.time() - holder.get('acquired_at', time.time()):.0f}s ago"
+
+    def _write_holder(self):
+        # Overwritten in place (never unlinked) so the locked inode stays the shared one
+        payload = json.dumps({'pid': os.getpid(), 'acquired_at': time.time()}).encode('utf-8')
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, payload)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -192,17 +192,14 @@ app.post('/api/upload-csv', upload.single('file'), async (req, res) => {
       .on('data', (data) => results.push(data))
       .on('end', async () => {
         try {
-          // Process each row with AI model
-          const predictions = [];
-          for (const row of results) {
-            const prediction = await runAIModel(row);
-            predictions.push({
-              ...row,
-              prediction: prediction.classification,
-              confidence: prediction.confidence,
-              timestamp: new Date()
-            });
-          }
+          // Score all rows with a single batch run of the AI model
+          const batchPredictions = await runAIModelBatch(filePath, results.length);
+          const predictions = results.map((row, i) => ({
+            ...row,
+            prediction: batchPredictions[i].classification,
+            confidence: batchPredictions[i].confidence,
+            timestamp: new Date()
+          }));
 
           // Save to database (if available)
           let savedData = predictions;
@@ -231,7 +228,7 @@ app.post('/api/upload-csv', upload.single('file'), async (req, res) => {
 // Submit single data point with new system
 app.post('/api/submit-data', async (req, res) => {
   try {
-    const { userInputs, selectedColumns } = req.body;
+    const { userInputs, selectedColumns, timings } = req.body;
 
     if (!userInputs || !selectedColumns || selectedColumns.length === 0) {
       return res.status(400).json({ error: 'Missing userInputs or selectedColumns' });
@@ -242,6 +239,10 @@ app.post('/api/submit-data', async (req, res) => {
       user_inputs: userInputs,
       selected_columns: selectedColumns
     };
+    if (timings) {
+      // Per-stage timings in the analysis result
+      inputData.timings = true;
+    }
 
     const options = {
       mode: 'text',
@@ -351,6 +352,48 @@ async function runAIModel(data) {
   });
 }
 
+// Run AI model over a whole CSV file, one prediction per row in order
+async function runAIModelBatch(filePath, rowCount) {
+  const fallback = {
+    classification: 'Planetary Candidate',
+    confidence: 0.75
+  };
+
+  return new Promise((resolve) => {
+    const options = {
+      mode: 'text',
+      pythonPath: 'python',
+      pythonOptions: ['-u'],
+      scriptPath: path.join(__dirname, '../ai'),
+      args: ['--batch', path.resolve(filePath), '--format', 'csv']
+    };
+
+    PythonShell.run('predict.py', options, (err, results) => {
+      if (err) {
+        console.error('Python batch script error:', err);
+        return resolve(Array.from({ length: rowCount }, () => fallback));
+      }
+
+      const predictions = [];
+      for (const line of results || []) {
+        try {
+          predictions.push(JSON.parse(line));
+        } catch (parseError) {
+          console.error('Error parsing AI batch prediction:', parseError);
+          predictions.push(fallback);
+        }
+      }
+
+      // Keep rows aligned with the parsed upload even if the batch came back short
+      if (predictions.length !== rowCount) {
+        console.error(`AI batch returned ${predictions.length} predictions for ${rowCount} rows`);
+        return resolve(Array.from({ length: rowCount }, (_, i) => predictions[i] || fallback));
+      }
+      resolve(predictions);
+    });
+  });
+}
+
 // Error handling middleware
 app.use((error, req, res, next) => {
   if (error instanceof multer.MulterError) {